@@ -0,0 +1,231 @@
+"""
+Analytics Aggregation
+Cached time-series and breakdown aggregates for the analytics dashboard
+"""
+
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+from typing import Callable, Dict, List, Mapping, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Avg, Count, F, Q, Sum
+from django.db.models.functions import TruncMonth, TruncYear
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import AidProject, Country, Donor, FinancialTransaction, Sector
+from .portfolio_summary import is_suspended
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_TIMEOUT = 60 * 60
+VERSION_KEY = 'analytics:version'
+TREND_DAYS = 365
+
+# Query string parameter -> AidProject lookup it filters on
+FILTERS = {
+    'donor': 'donor_id',
+    'country': 'recipient_country_id',
+    'sector': 'sector_id',
+    'status': 'activity_status',
+}
+ID_FILTERS = {'donor', 'country', 'sector'}
+
+
+def _cache():
+    return caches[getattr(settings, 'ANALYTICS_CACHE', 'default')]
+
+
+def _timeout() -> int:
+    return getattr(settings, 'ANALYTICS_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT)
+
+
+def parse_filters(params: Mapping) -> Dict:
+    """The supported filters present in a query string; unknown names and malformed ids are dropped"""
+    filters = {}
+    for name in FILTERS:
+        value = (params.get(name) or '').strip()
+        if not value:
+            continue
+        if name in ID_FILTERS:
+            if not value.isdigit():
+                continue
+            value = int(value)
+        filters[name] = value
+    return filters
+
+
+def _projects(filters: Dict):
+    return AidProject.objects.filter(**{FILTERS[name]: value for name, value in filters.items()}).order_by()
+
+
+def _transactions(filters: Dict):
+    return FinancialTransaction.objects.filter(
+        **{f'project__{FILTERS[name]}': value for name, value in filters.items()}
+    ).order_by()
+
+
+def _ascending(field: str):
+    # NULL sorts first on SQLite and last on PostgreSQL unless told otherwise
+    return F(field).asc(nulls_first=True)
+
+
+def projects_by_year(filters: Dict) -> List[Dict]:
+    rows = (_projects(filters)
+            .annotate(period=TruncYear('start_date_planned'))
+            .values('period')
+            .annotate(count=Count('id'), total_funding=Sum('funding_amount'))
+            .order_by(_ascending('period')))
+    return [{'year': str(row['period'].year) if row['period'] else None,
+             'count': row['count'], 'total_funding': row['total_funding']} for row in rows]
+
+
+def monthly_trends(filters: Dict) -> List[Dict]:
+    since = timezone.localdate() - timedelta(days=TREND_DAYS)
+    rows = (_projects(filters)
+            .filter(submitted_at__date__gte=since)
+            .annotate(period=TruncMonth('submitted_at'))
+            .values('period')
+            .annotate(count=Count('id'), total_funding=Sum('funding_amount'))
+            .order_by('period'))
+    return [{'month': row['period'].strftime('%Y-%m'),
+             'count': row['count'], 'total_funding': row['total_funding']} for row in rows]
+
+
+def funding_by_sector(filters: Dict) -> List[Dict]:
+    return list(_projects(filters)
+                .values('sector__name')
+                .annotate(total_funding=Sum('funding_amount'))
+                .order_by(F('total_funding').desc(nulls_last=True)))
+
+
+def projects_by_status(filters: Dict) -> List[Dict]:
+    return list(_projects(filters)
+                .values('activity_status')
+                .annotate(count=Count('id'))
+                .order_by('activity_status'))
+
+
+def geographic_data(filters: Dict) -> List[Dict]:
+    return list(_projects(filters)
+                .values('recipient_country__name', 'recipient_country__region')
+                .annotate(count=Count('id'), total_funding=Sum('funding_amount'))
+                .order_by(F('total_funding').desc(nulls_last=True)))
+
+
+def donor_analysis(filters: Dict) -> List[Dict]:
+    return list(_projects(filters)
+                .values('donor__name', 'donor__donor_type')
+                .annotate(project_count=Count('id'), total_funding=Sum('funding_amount'),
+                          avg_funding=Avg('funding_amount'))
+                .order_by(F('total_funding').desc(nulls_last=True)))
+
+
+def transactions_by_year(filters: Dict) -> List[Dict]:
+    rows = (_transactions(filters)
+            .annotate(period=TruncYear('transaction_date'))
+            .values('period')
+            .annotate(
+                count=Count('id'),
+                incoming_funds=Sum('amount', filter=Q(transaction_type='incoming_funds')),
+                disbursements=Sum('amount', filter=Q(transaction_type='disbursement')),
+                expenditures=Sum('amount', filter=Q(transaction_type='expenditure')),
+            )
+            .order_by('period'))
+    return [{'year': str(row.pop('period').year), **row} for row in rows]
+
+
+# Context name -> function computing it; the dashboard renders all of them
+DIMENSIONS: Dict[str, Callable[[Dict], List[Dict]]] = {
+    'projects_by_year': projects_by_year,
+    'funding_by_sector': funding_by_sector,
+    'projects_by_status': projects_by_status,
+    'geographic_data': geographic_data,
+    'donor_analysis': donor_analysis,
+    'monthly_trends': monthly_trends,
+    'transactions_by_year': transactions_by_year,
+}
+# Series whose window moves with the calendar, so their key changes daily
+DATED_DIMENSIONS = {'monthly_trends'}
+
+
+def data_version() -> int:
+    """
+    Current analytics data version; cached results are keyed on it.
+
+    A missing counter (first use, or evicted) starts from the clock rather
+    than from 1, so keys written under an earlier counter are never reused.
+    """
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY, 0)
+    return version
+
+
+def invalidate_analytics():
+    """Move to a new data version; results cached under the old one are never read again"""
+    cache = _cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def _key(version: int, dimension: str, filters: Dict) -> str:
+    filter_set = dict(filters)
+    if dimension in DATED_DIMENSIONS:
+        filter_set['_date'] = timezone.localdate().isoformat()
+    digest = hashlib.sha256(json.dumps(filter_set, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return f'analytics:{version}:{dimension}:{digest}'
+
+
+def analytics_series(dimensions: Optional[List[str]] = None, filters: Optional[Dict] = None) -> Dict[str, List[Dict]]:
+    """
+    Aggregates for the given dimensions (default: all) and filter set.
+
+    Cached entries are fetched with one get_many; only the missing ones are
+    computed, then stored together. Entries are keyed on the data version,
+    which changes whenever projects, transactions or the names they are
+    grouped by change, so a stale result is never served. Use a shared cache
+    backend when running more than one process, so they agree on the version.
+    """
+    dimensions = list(dimensions or DIMENSIONS)
+    filters = filters or {}
+    unknown = set(dimensions) - set(DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown analytics dimensions: {', '.join(sorted(unknown))}")
+
+    cache = _cache()
+    version = data_version()
+    keys = {dimension: _key(version, dimension, filters) for dimension in dimensions}
+    cached = cache.get_many(keys.values())
+
+    results = {}
+    missing = {}
+    for dimension, key in keys.items():
+        if key in cached:
+            results[dimension] = cached[key]
+        else:
+            results[dimension] = missing[key] = DIMENSIONS[dimension](filters)
+    if missing:
+        cache.set_many(missing, _timeout())
+        logger.debug(f"Computed {len(missing)} analytics series for {filters or 'all projects'}")
+    return results
+
+
+def _invalidate_on_commit(**kwargs):
+    # Bulk imports and rollbacks invalidate once when they finish instead
+    if not kwargs.get('raw') and not is_suspended():
+        transaction.on_commit(invalidate_analytics)
+
+
+for _model in (AidProject, FinancialTransaction, Donor, Country, Sector):
+    post_save.connect(_invalidate_on_commit, sender=_model, dispatch_uid=f'analytics_save_{_model.__name__}')
+    post_delete.connect(_invalidate_on_commit, sender=_model, dispatch_uid=f'analytics_delete_{_model.__name__}')
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ProjectsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'projects'
+
+    def ready(self):
+        # Connects the signal handlers that keep PortfolioSummary and the
+        # analytics cache current
+        from . import analytics, portfolio_summary  # noqa: F401
@@ -0,0 +1,193 @@
+"""
+Dashboard Queries
+Single-pass statistics and keyset pagination for the project dashboard
+"""
+
+import base64
+import binascii
+import json
+from functools import cached_property
+from typing import Dict, List, Optional, Tuple
+
+from django.core.exceptions import FieldError, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Avg, Count, F, Field, Func, Q, QuerySet, Sum, Value
+from django.db.models.lookups import GreaterThan, LessThan
+
+DEFAULT_SORT = '-submitted_at'
+PAGE_SIZE = 20
+
+# Columns the dashboard may be sorted by; each has an index on (column, id)
+SORT_FIELDS = ['submitted_at', 'title', 'start_date_planned', 'funding_amount', 'activity_status']
+
+
+def parse_sort(sort_by: Optional[str], queryset: Optional[QuerySet] = None) -> str:
+    """
+    The requested sort if it is one of SORT_FIELDS (optionally descending), else DEFAULT_SORT.
+
+    Given a queryset, any ordering it accepts is allowed instead (e.g.
+    `donor__name`), for page-number pagination which needs no index.
+    """
+    if not sort_by:
+        return DEFAULT_SORT
+    if queryset is None:
+        return sort_by if sort_by.lstrip('-') in SORT_FIELDS else DEFAULT_SORT
+    try:
+        queryset.order_by(sort_by)
+    except FieldError:
+        return DEFAULT_SORT
+    return sort_by
+
+
+def project_statistics(projects: QuerySet) -> Dict:
+    """Count, total and average funding of a filtered queryset in one aggregate query"""
+    stats = projects.order_by().aggregate(
+        count=Count('id'),
+        total_funding=Sum('funding_amount'),
+        avg_funding=Avg('funding_amount'),
+    )
+    return {
+        'count': stats['count'],
+        'total_funding': stats['total_funding'] or 0,
+        'avg_funding': stats['avg_funding'] or 0,
+    }
+
+
+class CountedPaginator(Paginator):
+    """Paginator that takes a count already known to the caller instead of running its own COUNT"""
+
+    def __init__(self, object_list, per_page, count: int, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._known_count = count
+
+    @cached_property
+    def count(self):
+        return self._known_count
+
+
+class KeysetPage:
+    """
+    One page of keyset pagination.
+
+    Iterates like a Paginator page; instead of page numbers it carries opaque
+    next_cursor / previous_cursor tokens for the neighbouring pages.
+    """
+
+    def __init__(self, object_list: List, next_cursor: Optional[str], previous_cursor: Optional[str]):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class RowValue(Func):
+    """Row constructor, e.g. (submitted_at, id), for comparing a sort key as one index range condition"""
+
+    template = '(%(expressions)s)'
+    output_field = Field()
+
+
+class KeysetPaginator:
+    """
+    Page through a queryset by seeking past the last row shown (keyset / cursor pagination).
+
+    Rows are ordered by the sort column with the primary key as tie-breaker,
+    NULLs last in both directions. The non-NULL rows and the NULL rows are
+    queried as separate segments: the first is fetched with WHERE column IS
+    NOT NULL AND (column, id) > (last column value, last id) ORDER BY column,
+    id LIMIT page_size + 1, the second is seeked on the id alone, and the
+    NULL segment is only read once the other runs out. Each is a range scan
+    of the (column, id) index, forwards or backwards, so a deep page costs
+    the same as the first one. Cursors are base64-encoded JSON naming the
+    sort they belong to; a cursor for another sort, or one that does not
+    decode, is ignored and the first page returned.
+    """
+
+    def __init__(self, queryset: QuerySet, sort_by: str, per_page: int = PAGE_SIZE):
+        self.queryset = queryset
+        self.sort_by = parse_sort(sort_by)
+        self.field = self.sort_by.lstrip('-')
+        self.descending = self.sort_by.startswith('-')
+        self.per_page = per_page
+        self._model_field = queryset.model._meta.get_field(self.field)
+
+    def _encode(self, obj, direction: str) -> str:
+        value = getattr(obj, self.field)
+        if value is not None and not isinstance(value, (str, int)):
+            value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        data = json.dumps({'sort': self.sort_by, 'value': value, 'pk': obj.pk, 'dir': direction})
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def _decode(self, cursor: Optional[str]) -> Optional[Dict]:
+        if not cursor:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            if data['sort'] != self.sort_by or data['dir'] not in ('next', 'prev'):
+                return None
+            data['pk'] = int(data['pk'])
+            if data['value'] is not None:
+                data['value'] = self._model_field.to_python(data['value'])
+            return data
+        except (binascii.Error, ValueError, TypeError, KeyError, ValidationError):
+            return None
+
+    def _segments(self, position: Optional[Dict], forward: bool) -> List[Tuple[List, List]]:
+        """(filters, ordering) of each segment left in the direction of travel, starting after `position`"""
+        # Going back means walking the same order in reverse, NULLs first
+        descending = self.descending != (not forward)
+        pk_order = '-pk' if descending else 'pk'
+        values = [Q(**{f'{self.field}__isnull': False})]
+        nulls = [Q(**{f'{self.field}__isnull': True})]
+        if position is not None and position['value'] is None:
+            nulls.append(Q(**{f"pk__{'lt' if descending else 'gt'}": position['pk']}))
+        elif position is not None:
+            beyond = LessThan if descending else GreaterThan
+            values.append(beyond(
+                RowValue(F(self.field), F('pk')),
+                RowValue(Value(position['value'], output_field=self._model_field), Value(position['pk'])),
+            ))
+
+        segments = {
+            'values': (values, [F(self.field).desc() if descending else F(self.field).asc(), pk_order]),
+            'nulls': (nulls, [pk_order]),
+        }
+        order = ['values', 'nulls'] if forward else ['nulls', 'values']
+        if position is not None:
+            # The segment the cursor is in comes first; the ones before it are done
+            order = order[order.index('nulls' if position['value'] is None else 'values'):]
+        return [segments[name] for name in order]
+
+    def page(self, cursor: Optional[str] = None) -> KeysetPage:
+        position = self._decode(cursor)
+        forward = position is None or position['dir'] == 'next'
+        rows = []
+        for filters, ordering in self._segments(position, forward):
+            rows += self.queryset.filter(*filters).order_by(*ordering)[:self.per_page + 1 - len(rows)]
+            if len(rows) > self.per_page:
+                break
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage([], None, None)
+        has_next = more if forward else True
+        has_previous = position is not None if forward else more
+        return KeysetPage(
+            rows,
+            self._encode(rows[-1], 'next') if has_next else None,
+            self._encode(rows[0], 'prev') if has_previous else None,
+        )
@@ -0,0 +1,454 @@
+"""
+HTTP Response Cache
+Disk-backed cache for the GET requests made to the IATI Registry and Datastore
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from django.conf import settings
+
+from .http_client import (DEFAULT_FAILURE_THRESHOLD, DEFAULT_MAX_RETRIES, DEFAULT_POOL_SIZE,
+                          DEFAULT_RESET_TIMEOUT, ResilientSession)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+DEFAULT_TTL = 60 * 60
+# Largest body a stream closed before its end is still downloaded in full for caching
+DEFAULT_DRAIN_MAX_BYTES = 50 * 1024 * 1024
+DRAIN_CHUNK_SIZE = 64 * 1024
+
+# (URL fragment, seconds a response stays fresh); the first matching rule wins.
+# Registry searches change as publishers add datasets, organisation files and
+# datastore records far less often.
+DEFAULT_TTLS: List[Tuple[str, int]] = [
+    ('/action/package_search', 60 * 60),
+    ('api.iatistandard.org/organisations', 6 * 60 * 60),
+    ('.xml', 24 * 60 * 60),
+]
+
+
+class CacheEntry:
+    """A stored response: metadata plus the path of its body on disk"""
+
+    def __init__(self, meta: Dict, body_path: str):
+        self.meta = meta
+        self.body_path = body_path
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.meta['expires_at']
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        """Conditional request headers for revalidating this entry"""
+        headers = {}
+        if self.meta.get('etag'):
+            headers['If-None-Match'] = self.meta['etag']
+        if self.meta.get('last_modified'):
+            headers['If-Modified-Since'] = self.meta['last_modified']
+        return headers
+
+    def to_response(self, request=None) -> requests.Response:
+        response = requests.Response()
+        response.status_code = self.meta['status']
+        response.headers = CaseInsensitiveDict(self.meta['headers'])
+        response.url = self.meta['url']
+        response.encoding = self.meta.get('encoding')
+        response.request = request
+        with open(self.body_path, 'rb') as f:
+            response._content = f.read()
+        response.from_cache = True
+        return response
+
+
+class ResponseCache:
+    """
+    Responses stored as a JSON metadata file and a body file per request URL.
+
+    Each hit refreshes the metadata file's modification time, which doubles
+    as the LRU clock: when the cache grows past `max_bytes` the least
+    recently used entries are removed until it is back under 90% of it.
+    Files are written to a temporary name and renamed, so concurrent workers
+    never read a half-written entry.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.directory, key)
+        return f'{base}.json', f'{base}.body'
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(body_path):
+            return None
+        return CacheEntry(meta, body_path)
+
+    def store(self, key: str, response: requests.Response, ttl: int) -> CacheEntry:
+        self._write(self._paths(key)[1], response.content)
+        return self._commit(key, response, ttl)
+
+    def store_file(self, key: str, response: requests.Response, path: str, ttl: int) -> CacheEntry:
+        """Store a response whose body has already been written to `path` inside the cache directory"""
+        os.replace(path, self._paths(key)[1])
+        return self._commit(key, response, ttl)
+
+    def _commit(self, key: str, response: requests.Response, ttl: int) -> CacheEntry:
+        meta_path, body_path = self._paths(key)
+        meta = {
+            'url': response.url,
+            'status': response.status_code,
+            'headers': dict(response.headers),
+            'encoding': response.encoding,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'stored_at': time.time(),
+            'expires_at': time.time() + ttl,
+        }
+        self._write(meta_path, json.dumps(meta).encode('utf-8'))
+        self.evict()
+        return CacheEntry(meta, body_path)
+
+    def refresh(self, entry: CacheEntry, ttl: int):
+        """Extend a revalidated entry"""
+        entry.meta['expires_at'] = time.time() + ttl
+        meta_path = entry.body_path[:-len('.body')] + '.json'
+        self._write(meta_path, json.dumps(entry.meta).encode('utf-8'))
+
+    def _write(self, path: str, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def evict(self):
+        """Remove least recently used entries while the cache is over its size limit"""
+        with self._lock:
+            entries = {}
+            total = 0
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    key, ext = os.path.splitext(item.name)
+                    if ext not in ('.json', '.body'):
+                        continue
+                    stat = item.stat()
+                    total += stat.st_size
+                    last_used, size = entries.get(key, (0, 0))
+                    entries[key] = (max(last_used, stat.st_mtime) if ext == '.json' else last_used,
+                                    size + stat.st_size)
+            if total <= self.max_bytes:
+                return
+
+            target = self.max_bytes * 0.9
+            for key, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+                if total <= target:
+                    break
+                for path in self._paths(key):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+            logger.info(f"Evicted IATI response cache entries down to {total} bytes")
+
+
+class TeeReader(io.RawIOBase):
+    """
+    Readable stream over a response body that copies what it reads to a file.
+
+    The copy is handed to `on_complete` once the body has been read to the
+    end. A stream closed early (e.g. once a parser has found what it needed)
+    keeps downloading the rest of the body into the copy on a background
+    thread, so the file is still cached; bodies larger than `drain_max_bytes`
+    are discarded instead. Drain threads are added to `drains`.
+    """
+
+    def __init__(self, response: requests.Response, directory: str, on_complete: Callable[[str], None],
+                 drain_max_bytes: int = DEFAULT_DRAIN_MAX_BYTES, drains: Optional[List[threading.Thread]] = None):
+        self.response = response
+        self.on_complete = on_complete
+        self.drain_max_bytes = drain_max_bytes
+        self.drains = drains
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        self.copy = os.fdopen(fd, 'wb')
+        self.size = 0
+        self.finished = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.response.raw.read(len(buffer), decode_content=True)
+        if not data:
+            self._finish()
+            return 0
+        self.copy.write(data)
+        self.size += len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+    def _finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.copy.close()
+        try:
+            self.on_complete(self.path)
+        except OSError as e:
+            logger.warning(f"Could not cache streamed IATI response: {str(e)}")
+
+    def _drainable(self) -> bool:
+        try:
+            length = int(self.response.headers.get('Content-Length', ''))
+        except ValueError:
+            return self.size < self.drain_max_bytes
+        return length <= self.drain_max_bytes
+
+    def _drain(self):
+        """Read the rest of the body into the copy and cache it, giving up past drain_max_bytes"""
+        try:
+            while self.size <= self.drain_max_bytes:
+                data = self.response.raw.read(DRAIN_CHUNK_SIZE, decode_content=True)
+                if not data:
+                    self._finish()
+                    return
+                self.copy.write(data)
+                self.size += len(data)
+            logger.info(f"Not caching {self.response.url}: larger than {self.drain_max_bytes} bytes")
+        except Exception as e:
+            logger.warning(f"Could not finish caching {self.response.url}: {str(e)}")
+        finally:
+            self._discard()
+
+    def _discard(self):
+        self.response.close()
+        if not self.finished:
+            self.copy.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        if not self.closed:
+            if not self.finished and self._drainable():
+                drain = threading.Thread(target=self._drain, name='iati-cache-drain', daemon=True)
+                if self.drains is not None:
+                    self.drains.append(drain)
+                drain.start()
+            else:
+                self._discard()
+        super().close()
+
+
+class CachingSession(ResilientSession):
+    """
+    ResilientSession that serves GET requests from a ResponseCache.
+
+    Fresh entries are returned without a request, so cache hits never touch
+    the pool or the circuit breakers. Stale entries are revalidated with
+    If-None-Match / If-Modified-Since, and a 304 extends them; while the
+    upstream is failing (or its circuit is open) the stale entry is served
+    instead of an error. Only 200 responses are stored, and never ones marked
+    no-store. Responses served from the cache have `from_cache = True`.
+    `stats` counts hits, revalidated and stale entries, and misses.
+    """
+
+    def __init__(self, cache: Optional[ResponseCache], ttls: List[Tuple[str, int]] = None,
+                 default_ttl: int = DEFAULT_TTL, drain_max_bytes: int = DEFAULT_DRAIN_MAX_BYTES,
+                 **session_kwargs):
+        super().__init__(**session_kwargs)
+        self.cache = cache
+        self.ttls = ttls if ttls is not None else DEFAULT_TTLS
+        self.default_ttl = default_ttl
+        self.drain_max_bytes = drain_max_bytes
+        self.stats = Counter()
+        # Background downloads finishing the cache copy of streams closed early
+        self.drains: List[threading.Thread] = []
+
+    def wait_for_drains(self, timeout: Optional[float] = None):
+        """Wait until streams closed early have finished downloading into the cache"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.drains:
+            drain = self.drains.pop()
+            drain.join(None if deadline is None else max(0, deadline - time.monotonic()))
+
+    def ttl_for(self, url: str) -> int:
+        for fragment, ttl in self.ttls:
+            if fragment in url:
+                return ttl
+        return self.default_ttl
+
+    def request(self, method, url, *args, **kwargs):
+        # Streamed bodies are cached through `open`
+        if self.cache is None or method.upper() != 'GET' or kwargs.get('stream'):
+            return super().request(method, url, *args, **kwargs)
+
+        prepared = requests.Request('GET', url, params=kwargs.get('params')).prepare()
+        key = self.cache.key(prepared.url)
+        ttl = self.ttl_for(prepared.url)
+        entry = self.cache.get(key)
+        if entry is not None and entry.fresh:
+            logger.debug(f"IATI cache hit: {prepared.url}")
+            self.stats['hits'] += 1
+            return entry.to_response(prepared)
+
+        if entry is not None:
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), **entry.validators}
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.exceptions.RequestException as e:
+            if entry is None:
+                raise
+            logger.warning(f"Serving stale IATI cache entry for {prepared.url}: {str(e)}")
+            self.stats['stale'] += 1
+            return entry.to_response(prepared)
+
+        if entry is not None and response.status_code >= 500:
+            logger.warning(f"Serving stale IATI cache entry for {prepared.url}: HTTP {response.status_code}")
+            self.stats['stale'] += 1
+            response.close()
+            return entry.to_response(prepared)
+
+        if entry is not None and response.status_code == 304:
+            logger.debug(f"IATI cache revalidated: {prepared.url}")
+            self.stats['revalidated'] += 1
+            self.cache.refresh(entry, ttl)
+            return entry.to_response(prepared)
+
+        if response.status_code == 200 and 'no-store' not in response.headers.get('Cache-Control', ''):
+            try:
+                self.cache.store(key, response, ttl)
+            except OSError as e:
+                logger.warning(f"Could not cache IATI response for {prepared.url}: {str(e)}")
+        self.stats['misses'] += 1
+        response.from_cache = False
+        return response
+
+    def open(self, url: str, **kwargs) -> BinaryIO:
+        """
+        Readable binary stream of a GET response body.
+
+        Cached bodies are read straight from disk; otherwise the body is
+        streamed from the network and stored once it has been read in full,
+        by the caller or, if the stream is closed early, in the background.
+        Raises requests.HTTPError for non-200 responses.
+        """
+        kwargs['stream'] = True
+        if self.cache is None:
+            response = super().request('GET', url, **kwargs)
+            response.raise_for_status()
+            response.raw.decode_content = True
+            return response.raw
+
+        prepared = requests.Request('GET', url, params=kwargs.get('params')).prepare()
+        key = self.cache.key(prepared.url)
+        ttl = self.ttl_for(prepared.url)
+        entry = self.cache.get(key)
+        if entry is not None and entry.fresh:
+            logger.debug(f"IATI cache hit: {prepared.url}")
+            self.stats['hits'] += 1
+            return open(entry.body_path, 'rb')
+
+        if entry is not None:
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), **entry.validators}
+        try:
+            response = super().request('GET', url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            if entry is None:
+                raise
+            logger.warning(f"Serving stale IATI cache entry for {prepared.url}: {str(e)}")
+            self.stats['stale'] += 1
+            return open(entry.body_path, 'rb')
+        if entry is not None and response.status_code >= 500:
+            logger.warning(f"Serving stale IATI cache entry for {prepared.url}: HTTP {response.status_code}")
+            self.stats['stale'] += 1
+            response.close()
+            return open(entry.body_path, 'rb')
+        if entry is not None and response.status_code == 304:
+            response.close()
+            self.stats['revalidated'] += 1
+            self.cache.refresh(entry, ttl)
+            return open(entry.body_path, 'rb')
+
+        self.stats['misses'] += 1
+        response.raise_for_status()
+        if 'no-store' in response.headers.get('Cache-Control', ''):
+            response.raw.decode_content = True
+            return response.raw
+        return io.BufferedReader(TeeReader(response, self.cache.directory,
+                                           lambda path: self.cache.store_file(key, response, path, ttl),
+                                           drain_max_bytes=self.drain_max_bytes, drains=self.drains))
+
+
+_response_cache = None
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide IATI response cache, or None when IATI_CACHE_ENABLED is False"""
+    global _response_cache
+    if not getattr(settings, 'IATI_CACHE_ENABLED', True):
+        return None
+    if _response_cache is None:
+        _response_cache = ResponseCache(
+            getattr(settings, 'IATI_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'aims_iati_cache')),
+            getattr(settings, 'IATI_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES)
+        )
+    return _response_cache
+
+
+def get_iati_session() -> CachingSession:
+    """
+    Process-wide session for IATI requests.
+
+    Sharing one session keeps connections alive across lookups, bounds the
+    number of concurrent connections per host (IATI_HTTP_POOL_SIZE) and
+    gives every caller the same view of each host's circuit breaker.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = CachingSession(
+                get_response_cache(),
+                ttls=getattr(settings, 'IATI_CACHE_TTLS', DEFAULT_TTLS),
+                pool_size=getattr(settings, 'IATI_HTTP_POOL_SIZE', DEFAULT_POOL_SIZE),
+                max_retries=getattr(settings, 'IATI_HTTP_MAX_RETRIES', DEFAULT_MAX_RETRIES),
+                failure_threshold=getattr(settings, 'IATI_CIRCUIT_FAILURE_THRESHOLD', DEFAULT_FAILURE_THRESHOLD),
+                reset_timeout=getattr(settings, 'IATI_CIRCUIT_RESET_TIMEOUT', DEFAULT_RESET_TIMEOUT),
+            )
+            _session.headers.update({
+                'User-Agent': 'AIMS-IATI-Client/1.0'
+            })
+        return _session
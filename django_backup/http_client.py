@@ -0,0 +1,172 @@
+"""
+HTTP Client
+Pooled session with jittered retries and per-host circuit breakers for upstream APIs
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_CAP = 8
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30
+
+# Responses worth retrying: the upstream is overloaded or briefly unavailable
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request to a host whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Fail fast while a host keeps failing.
+
+    The circuit opens after `failure_threshold` consecutive failures and
+    rejects requests for `reset_timeout` seconds. It then lets a single trial
+    request through (half-open): success closes it, failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, host: str, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.total_failures = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request to the host may be sent now"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return
+            if self.state != self.CLOSED:
+                self.rejected += 1
+                raise CircuitOpenError(f"Circuit open for {self.host}, not sending request")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit for {self.host} closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.total_failures += 1
+            self.trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit for {self.host} opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def status(self) -> Dict:
+        with self._lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+            return {
+                'host': self.host,
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'total_failures': self.total_failures,
+                'rejected_requests': self.rejected,
+                'retry_in': retry_in,
+            }
+
+
+class ResilientSession(requests.Session):
+    """
+    requests.Session for calls to flaky upstream APIs.
+
+    Connections are kept alive in a pool of `pool_size` per host; once every
+    pooled connection is busy further requests wait for one, which bounds
+    concurrency per host. Idempotent requests that time out, fail to connect
+    or get a 429/5xx are retried with full-jitter exponential backoff. Every
+    host has its own CircuitBreaker, which counts each failed attempt.
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_base: float = DEFAULT_BACKOFF_BASE, backoff_cap: float = DEFAULT_BACKOFF_CAP,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD, reset_timeout: float = DEFAULT_RESET_TIMEOUT):
+        super().__init__()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        host = urlsplit(url).netloc
+        with self._breakers_lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(host, self.failure_threshold, self.reset_timeout)
+            return self.breakers[host]
+
+    def breaker_states(self) -> List[Dict]:
+        with self._breakers_lock:
+            breakers = list(self.breakers.values())
+        return [breaker.status() for breaker in breakers]
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: a random delay up to the exponential backoff for this attempt"""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def request(self, method, url, *args, **kwargs):
+        breaker = self.breaker(url)
+        retries = self.max_retries if method.upper() in IDEMPOTENT_METHODS else 0
+
+        for attempt in range(retries + 1):
+            breaker.before_request()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                breaker.record_failure()
+                if attempt == retries:
+                    raise
+                logger.warning(f"{method} {url} failed ({type(e).__name__}), retrying")
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                if attempt == retries:
+                    return response
+                logger.warning(f"{method} {url} returned {response.status_code}, retrying")
+                response.close()
+            time.sleep(self.backoff(attempt))
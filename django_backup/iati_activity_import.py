@@ -0,0 +1,492 @@
+"""
+IATI Activity XML Import
+Stream iati-activity elements into projects, transactions, commitments, budgets and locations
+"""
+
+import logging
+import re
+import xml.etree.ElementTree as ET
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from .iati_xml import ExtractionPlan, code, collect, element_text, first, local_name, narrative
+from .import_engine import BaseImportEngine, OrganizationResolver
+from .models import (
+    AidProject, Country, Donor, FinancialCommitment, FinancialTransaction, ImplementingOrganization,
+    Organization, ProjectBudget, ProjectLocation, Sector
+)
+from .portfolio_summary import donors_added
+
+logger = logging.getLogger(__name__)
+
+# Activities per chunk; each activity brings its transactions, budgets and
+# locations along, so chunks are smaller than for flat CSV rows
+ACTIVITY_CHUNK_SIZE = 500
+
+# IATI ActivityStatus codes
+ACTIVITY_STATUS_CODES = {
+    '1': 'pipeline', '2': 'implementation', '3': 'completion', '4': 'completion',
+    '5': 'cancelled', '6': 'suspended',
+}
+
+# IATI ActivityDateType codes
+ACTIVITY_DATE_FIELDS = {
+    '1': 'start_date_planned', '2': 'start_date_actual', '3': 'end_date_planned', '4': 'end_date_actual',
+}
+
+# IATI TransactionType codes; outgoing commitments become FinancialCommitment rows
+TRANSACTION_TYPE_CODES = {
+    '1': 'incoming_funds', '3': 'disbursement', '4': 'expenditure', '5': 'interest_payment', '6': 'loan_repayment',
+}
+COMMITMENT_TYPE_CODES = {'2', 'commitment', 'outgoing_commitment'}
+
+FLOW_TYPE_CODES = {'10': 'oda', '20': 'oof', '30': 'private', '35': 'private'}
+FINANCE_TYPE_CODES = {'110': 'grant', '410': 'loan', '421': 'loan', '510': 'equity', '1100': 'guarantee'}
+AID_TYPE_CODES = {
+    'A01': 'budget_support', 'A02': 'budget_support', 'C01': 'project_intervention',
+    'D01': 'technical_assistance', 'D02': 'technical_assistance', 'E01': 'scholarship', 'F01': 'debt_relief',
+}
+TIED_STATUS_CODES = {'3': 'partially_tied', '4': 'tied', '5': 'untied'}
+
+BUDGET_TYPES = {'1': 'Original budget', '2': 'Revised budget'}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y')
+
+
+def parse_date(value: str) -> Optional[date]:
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_amount(value: str) -> Optional[Decimal]:
+    """Decimal of a value element's text, ignoring currency symbols and thousands separators"""
+    try:
+        return Decimal(re.sub(r'[^\d.\-]', '', value))
+    except InvalidOperation:
+        return None
+
+
+def org_reference(element) -> Optional[Tuple[str, str]]:
+    """(ref, name) of a provider-org or receiver-org element"""
+    ref, name = (element.get('ref') or '').strip(), narrative(element)
+    return (ref, name) if ref or name else None
+
+
+def _value(record, element):
+    record['value'] = element.text or ''
+    record['currency'] = element.get('currency') or ''
+
+
+def _activity_date(record, element):
+    field = ACTIVITY_DATE_FIELDS.get(element.get('type', ''))
+    if field:
+        record[field] = parse_date(element.get('iso-date', ''))
+
+
+def _participating_org(record, element):
+    if element.get('role') == '4' and not record['implementing_org_name']:
+        record['implementing_org_name'] = narrative(element)
+
+
+TRANSACTION_PLAN = ExtractionPlan({
+    'transaction-type': first('type', code),
+    'transaction-date': first('date', lambda element: element.get('iso-date', '')),
+    'value': _value,
+    'description': first('description', narrative),
+    'provider-org': first('provider', org_reference),
+    'receiver-org': first('receiver', org_reference),
+    'aid-type': first('aid_type', code),
+    'flow-type': first('flow_type', code),
+    'tied-status': first('tied_status', code),
+}, factory=lambda element: {'reference': (element.get('ref') or '')[:100], 'date': None, 'value': None,
+                            'currency': '', 'description': '', 'provider': None, 'receiver': None})
+
+BUDGET_PLAN = ExtractionPlan({
+    'period-start': first('start', lambda element: element.get('iso-date', '')),
+    'period-end': first('end', lambda element: element.get('iso-date', '')),
+    'value': _value,
+}, factory=lambda element: {'type': element.get('type', '1'), 'value': None, 'currency': ''})
+
+POINT_PLAN = ExtractionPlan({'pos': first('pos', element_text)})
+
+LOCATION_PLAN = ExtractionPlan({
+    'name': first('name', narrative),
+    'description': first('notes', narrative),
+    'point': lambda record, element: record.update(POINT_PLAN.extract(element)),
+})
+
+ACTIVITY_PLAN = ExtractionPlan({
+    'iati-identifier': first('iati_identifier', element_text),
+    'title': first('title', narrative),
+    'description': first('description', narrative),
+    'activity-status': first('activity_status', lambda element: ACTIVITY_STATUS_CODES.get(code(element))),
+    'activity-date': _activity_date,
+    'reporting-org': first('donor_name', narrative),
+    'participating-org': _participating_org,
+    'recipient-country': first('country_code', lambda element: element.get('code', '').upper()),
+    'sector': first('sector_code', code),
+    'default-flow-type': first('default_flow_type', lambda element: FLOW_TYPE_CODES.get(code(element))),
+    'default-finance-type': first('default_finance_type', lambda element: FINANCE_TYPE_CODES.get(code(element))),
+    'default-aid-type': first('default_aid_type', lambda element: AID_TYPE_CODES.get(code(element))),
+    'default-tied-status': first('default_tied_status', lambda element: TIED_STATUS_CODES.get(code(element))),
+    'transaction': collect('transactions', TRANSACTION_PLAN.extract),
+    'budget': collect('budgets', BUDGET_PLAN.extract),
+    'location': collect('locations', LOCATION_PLAN.extract),
+}, factory=lambda element: {
+    'iati_identifier': '', 'title': '', 'description': '', 'activity_status': None,
+    'currency': (element.get('default-currency') or 'USD').upper(),
+    'donor_name': '', 'implementing_org_name': '', 'country_code': '', 'sector_code': '',
+    'default_flow_type': None, 'default_finance_type': None, 'default_aid_type': None,
+    'default_tied_status': None, 'transactions': [], 'budgets': [], 'locations': [],
+})
+
+
+def iter_activities(source: BinaryIO) -> Iterator[Dict]:
+    """
+    Parse iati-activity elements one at a time from a readable XML stream.
+
+    Each element is converted to a plain dict as soon as it closes and then
+    cleared from the tree, so memory stays flat however large the file is.
+    """
+    root = None
+    for event, element in ET.iterparse(source, events=('start', 'end')):
+        if root is None:
+            root = element
+        if event == 'end' and local_name(element.tag) == 'iati-activity':
+            activity = parse_activity(element)
+            root.clear()
+            yield activity
+
+
+def parse_activity(element) -> Dict:
+    """Plain dict of the activity fields, transactions, budgets and locations the import writes"""
+    activity = ACTIVITY_PLAN.extract(element)
+    currency = activity['currency']
+    activity['transactions'] = [
+        check_transaction(transaction, number, currency)
+        for number, transaction in enumerate(activity['transactions'], 1)
+    ]
+
+    budgets = []
+    for budget in activity['budgets']:
+        amount = parse_amount(budget['value']) if budget['value'] is not None else None
+        if amount is None:
+            continue
+        budgets.append({
+            'type': budget['type'],
+            'category': BUDGET_TYPES.get(budget['type'], 'Budget'),
+            'description': ' to '.join(budget[key] for key in ('start', 'end') if budget.get(key)),
+            'amount': amount,
+            'currency': (budget['currency'] or currency).upper(),
+        })
+    activity['budgets'] = budgets
+
+    locations = []
+    for location in activity['locations']:
+        latitude = longitude = None
+        position = location.get('pos', '').split()
+        if len(position) == 2:
+            latitude, longitude = parse_amount(position[0]), parse_amount(position[1])
+        locations.append({
+            'name': location.get('name', '')[:200],
+            'notes': location.get('notes', ''),
+            'latitude': latitude,
+            'longitude': longitude,
+        })
+    activity['locations'] = locations
+    return activity
+
+
+def check_transaction(record: Dict, number: int, default_currency: str) -> Dict:
+    """Convert an extracted transaction and attach the first problem found in it, if any"""
+    type_code = record.get('type', '')
+    normalized_type = type_code.lower().replace(' ', '_')
+
+    transaction = {
+        'number': number,
+        'kind': 'commitment' if normalized_type in COMMITMENT_TYPE_CODES else 'transaction',
+        'transaction_type': TRANSACTION_TYPE_CODES.get(normalized_type, normalized_type),
+        'amount': parse_amount(record['value']) if record['value'] is not None else None,
+        'currency': (record['currency'] or default_currency).upper(),
+        'transaction_date': parse_date(record['date']) if record['date'] is not None else None,
+        'description': record['description'],
+        'reference': record['reference'],
+        'provider': record['provider'],
+        'receiver': record['receiver'],
+        'aid_type': record.get('aid_type', '')[:50],
+        'flow_type': record.get('flow_type', '')[:50],
+        'tied_status': record.get('tied_status', '')[:50],
+        'error': None,
+    }
+
+    if transaction['kind'] == 'transaction' and transaction['transaction_type'] not in dict(
+            FinancialTransaction.TRANSACTION_TYPE_CHOICES):
+        transaction['error'] = ('transaction_type', f"Unsupported transaction type '{type_code}'", type_code)
+    elif record['date'] is None:
+        transaction['error'] = ('transaction_date', "Transaction date is required", None)
+    elif transaction['transaction_date'] is None:
+        transaction['error'] = ('transaction_date', "Transaction date is not a valid date", record['date'])
+    elif transaction['amount'] is None:
+        transaction['error'] = ('amount', "Transaction value is required", record['value'])
+    elif transaction['currency'] not in dict(FinancialTransaction.CURRENCY_CHOICES):
+        transaction['error'] = ('currency', f"Unsupported currency '{transaction['currency']}'",
+                                transaction['currency'])
+    return transaction
+
+
+class BaseIATIImportEngine(BaseImportEngine):
+    """
+    Chunked import of a streamed IATI activity file.
+
+    Chunks are lists of parsed activities rather than spreadsheet rows, and
+    errors report the activity's position in the file as their row. The
+    transactions, commitments, budgets and locations of a chunk are written
+    with one `bulk_create` per model.
+    """
+
+    def __init__(self, user, chunk_size: int = ACTIVITY_CHUNK_SIZE, **kwargs):
+        super().__init__(user, {}, chunk_size, **kwargs)
+        self.organizations = self.add_resolver(Organization, lambda name: {
+            'organization_type': 'other',
+            'created_by': self.user,
+            'import_batch': self.batch_id
+        }, resolver_class=OrganizationResolver)
+        self.counts = {'transactions': 0, 'commitments': 0, 'budgets': 0, 'locations': 0}
+
+    def run(self, source: BinaryIO, **kwargs) -> Dict:
+        results = super().run(iter_activities(source), **kwargs)
+        results.update(self.counts)
+        results['organizationMatches'] = list(self.organizations.matches.values())
+        return results
+
+    def _snapshot(self):
+        return super()._snapshot(), dict(self.counts)
+
+    def _restore(self, state):
+        state, counts = state
+        super()._restore(state)
+        self.counts.update(counts)
+
+    def record_error(self, idx: int, message: str, field: str = 'general', value=None):
+        self.results['failed'] += 1
+        self.results['errors'].append({
+            'row': idx + 1,  # position of the activity in the file
+            'field': field,
+            'message': message,
+            'value': value
+        })
+        logger.error(f"Error importing IATI activity {idx + 1}: {message}")
+
+    def resolve_organizations(self, activities: List[Dict]) -> Dict[Tuple[str, str], Optional[int]]:
+        """
+        Organization ids for every provider/receiver of a chunk.
+
+        References are matched on IATI identifier with one query; the rest go
+        through the name resolver, which creates organizations it cannot match
+        and leaves ambiguous names at None.
+        """
+        references = {
+            reference for activity in activities for transaction in activity['transactions']
+            for reference in (transaction['provider'], transaction['receiver']) if reference
+        }
+        by_identifier = dict(Organization.objects.filter(
+            iati_identifier__in={ref for ref, _ in references if ref}
+        ).values_list('iati_identifier', 'id'))
+        by_name = self.organizations.resolve(
+            name or ref for ref, name in references if ref not in by_identifier
+        )
+        return {
+            (ref, name): by_identifier.get(ref) or by_name.get(name or ref)
+            for ref, name in references
+        }
+
+    def organization_id(self, organizations: Dict[Tuple[str, str], Optional[int]],
+                        reference: Optional[Tuple[str, str]]) -> Optional[int]:
+        """Id resolved for a provider/receiver reference; raises ValueError if its name is ambiguous"""
+        if not reference:
+            return None
+        ref, name = reference
+        return organizations.get(reference) or self.organizations.get(name or ref)
+
+    def write_children(self, chunk: List[Tuple[int, Dict]], project_ids: Dict[str, int]):
+        """Insert the transactions, commitments, budgets and locations of the activities in `project_ids`"""
+        activities = [activity for _, activity in chunk if activity['iati_identifier'] in project_ids]
+        organizations = self.resolve_organizations(activities)
+
+        transactions, commitments = [], []
+        for idx, activity in chunk:
+            project_id = project_ids.get(activity['iati_identifier'])
+            if project_id is None:
+                continue
+            for data in activity['transactions']:
+                if data['error']:
+                    field, message, value = data['error']
+                    self.record_error(idx, f"Transaction {data['number']} of '{activity['iati_identifier']}': "
+                                           f"{message}", field, value)
+                    continue
+                try:
+                    provider_id = self.organization_id(organizations, data['provider'])
+                    receiver_id = self.organization_id(organizations, data['receiver'])
+                except ValueError as e:
+                    self.record_error(idx, f"Transaction {data['number']} of '{activity['iati_identifier']}': "
+                                           f"{str(e)}", 'organization')
+                    continue
+                fields = dict(
+                    project_id=project_id,
+                    amount=data['amount'],
+                    currency=data['currency'],
+                    provider_organization_id=provider_id,
+                    receiver_organization_id=receiver_id,
+                    description=data['description'],
+                    reference=data['reference'],
+                    iati_identifier=activity['iati_identifier'],
+                    aid_type=data['aid_type'],
+                    flow_type=data['flow_type'],
+                    tied_status=data['tied_status'],
+                    created_by=self.user,
+                    import_batch=self.batch_id
+                )
+                if data['kind'] == 'commitment':
+                    commitments.append((idx, FinancialCommitment(commitment_date=data['transaction_date'], **fields)))
+                else:
+                    transactions.append((idx, FinancialTransaction(transaction_type=data['transaction_type'],
+                                                                   transaction_date=data['transaction_date'],
+                                                                   **fields)))
+
+        FinancialTransaction.objects.bulk_create([obj for _, obj in transactions])
+        FinancialCommitment.objects.bulk_create([obj for _, obj in commitments])
+        self.counts['transactions'] += len(transactions)
+        self.counts['commitments'] += len(commitments)
+        return transactions + commitments
+
+
+class IATIActivityImportEngine(BaseIATIImportEngine):
+    """Create projects, with their transactions, budgets and locations, from IATI activity XML"""
+
+    entity_label = 'activity'
+    updates_portfolio_summary = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.donors = self.add_resolver(Donor, lambda name: {
+            'code': name[:20].upper().replace(' ', '_')
+        }, on_create=donors_added)
+        self.implementing_orgs = self.add_resolver(ImplementingOrganization, lambda name: {
+            'org_type': 'other'
+        })
+        # Activities of this import by identifier, to report duplicates within the file
+        self.seen_identifiers: Dict[str, int] = {}
+
+    def _snapshot(self):
+        return super()._snapshot(), len(self.seen_identifiers)
+
+    def _restore(self, state):
+        state, seen_identifiers = state
+        super()._restore(state)
+        # Activities of a rolled back chunk are seen again when it is replayed
+        while len(self.seen_identifiers) > seen_identifiers:
+            self.seen_identifiers.popitem()
+
+    def process_chunk(self, chunk: List[Tuple[int, Dict]]):
+        identifiers = {activity['iati_identifier'] for _, activity in chunk if activity['iati_identifier']}
+        existing = set(AidProject.objects.filter(iati_identifier__in=identifiers).values_list(
+            'iati_identifier', flat=True))
+        countries = dict(Country.objects.filter(
+            iso_code__in={activity['country_code'] for _, activity in chunk}).values_list('iso_code', 'id'))
+        sectors = dict(Sector.objects.filter(
+            code__in={activity['sector_code'] for _, activity in chunk}).values_list('code', 'id'))
+        donors = self.donors.resolve(activity['donor_name'] for _, activity in chunk)
+        implementing_orgs = self.implementing_orgs.resolve(activity['implementing_org_name'] for _, activity in chunk)
+
+        pending = []
+        for idx, data in chunk:
+            identifier = data['iati_identifier']
+            if not identifier:
+                self.record_error(idx, "iati-identifier is required", 'iati_identifier')
+                continue
+            if not data['title']:
+                self.record_error(idx, f"Activity '{identifier}' has no title", 'title', identifier)
+                continue
+            if identifier in existing:
+                self.record_error(idx, f"Activity '{identifier}' already exists", 'iati_identifier', identifier)
+                continue
+            if identifier in self.seen_identifiers:
+                self.record_error(idx, f"Duplicate activity '{identifier}', already imported as activity "
+                                       f"{self.seen_identifiers[identifier] + 1}", 'iati_identifier', identifier)
+                continue
+            self.seen_identifiers[identifier] = idx
+
+            budgets = [budget for budget in data['budgets'] if budget['type'] == '1'] or data['budgets']
+            donor = donors.get(data['donor_name'])
+            implementing_org = implementing_orgs.get(data['implementing_org_name'])
+            activity = AidProject(
+                iati_identifier=identifier,
+                title=data['title'][:300],
+                description=data['description'],
+                donor_id=donor.id if donor else None,
+                implementing_org_id=implementing_org.id if implementing_org else None,
+                activity_status=data['activity_status'],
+                start_date_planned=data.get('start_date_planned'),
+                end_date_planned=data.get('end_date_planned'),
+                start_date_actual=data.get('start_date_actual'),
+                end_date_actual=data.get('end_date_actual'),
+                recipient_country_id=countries.get(data['country_code']),
+                sector_id=sectors.get(data['sector_code']),
+                total_budget=sum(budget['amount'] for budget in budgets) if budgets else None,
+                currency=data['currency'][:10],
+                default_flow_type=data['default_flow_type'],
+                default_finance_type=data['default_finance_type'],
+                default_aid_type=data['default_aid_type'],
+                default_tied_status=data['default_tied_status'],
+                created_by=self.user,
+                import_batch=self.batch_id
+            )
+            # bulk_create bypasses AidProject.save()
+            activity.default_modality = activity.calculate_modality()
+            pending.append((idx, activity))
+
+        self.save_objects(AidProject, pending)
+        project_ids = {activity.iati_identifier: activity.pk for _, activity in pending if activity.pk}
+        self.write_children(chunk, project_ids)
+
+        budgets, locations = [], []
+        for _, data in chunk:
+            project_id = project_ids.get(data['iati_identifier'])
+            if project_id is None:
+                continue
+            budgets.extend(ProjectBudget(
+                project_id=project_id, category=budget['category'], description=budget['description'][:300],
+                planned_amount=budget['amount'], currency=budget['currency'][:10], import_batch=self.batch_id
+            ) for budget in data['budgets'])
+            locations.extend(ProjectLocation(
+                project_id=project_id, location_type='implementation', import_batch=self.batch_id, **location
+            ) for location in data['locations'])
+        ProjectBudget.objects.bulk_create(budgets)
+        ProjectLocation.objects.bulk_create(locations)
+        self.counts['budgets'] += len(budgets)
+        self.counts['locations'] += len(locations)
+
+
+class IATITransactionImportEngine(BaseIATIImportEngine):
+    """Add transactions and commitments from IATI activity XML to projects that already exist"""
+
+    entity_label = 'transaction'
+
+    def process_chunk(self, chunk: List[Tuple[int, Dict]]):
+        project_ids = dict(AidProject.objects.filter(
+            iati_identifier__in={activity['iati_identifier'] for _, activity in chunk}
+        ).values_list('iati_identifier', 'id'))
+
+        for idx, activity in chunk:
+            if activity['iati_identifier'] not in project_ids:
+                for data in activity['transactions']:
+                    self.record_error(idx, f"Activity '{activity['iati_identifier']}' not found",
+                                      'iati_identifier', activity['iati_identifier'])
+
+        for _, obj in self.write_children(chunk, project_ids):
+            self.record_success(obj)
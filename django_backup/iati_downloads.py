@@ -0,0 +1,300 @@
+"""
+IATI Resource Downloads
+Resumable, parallel download of publisher XML files into a content-addressed store on disk
+"""
+
+import hashlib
+import io
+import json
+import logging
+import mmap
+import os
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import requests
+
+from django.conf import settings
+
+from .http_cache import get_iati_session
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DOWNLOAD_WORKERS = 4
+DOWNLOAD_TIMEOUT = 120
+CHUNK_SIZE = 256 * 1024
+
+
+class ResourceStore:
+    """
+    Downloaded resource files, stored once per distinct content.
+
+    objects/<sha256[:2]>/<sha256>.xml holds each file body; refs/<key>.json
+    points a resource URL at its object and keeps the ETag / Last-Modified
+    used to revalidate it; partial/<key>.part holds an interrupted download
+    until it is resumed. Publishers that mirror the same file share one
+    object, and each ref is written on its own, so a refresh can stop at any
+    point and pick up where it left off.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        for name in ('objects', 'refs', 'partial'):
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def ref_path(self, url: str) -> str:
+        return os.path.join(self.directory, 'refs', f'{self.key(url)}.json')
+
+    def partial_path(self, url: str) -> str:
+        return os.path.join(self.directory, 'partial', f'{self.key(url)}.part')
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.directory, 'objects', sha256[:2], f'{sha256}.xml')
+
+    def ref(self, url: str) -> Optional[Dict]:
+        try:
+            with open(self.ref_path(url)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def refs(self) -> Iterator[Dict]:
+        directory = os.path.join(self.directory, 'refs')
+        for name in sorted(os.listdir(directory)):
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    yield json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    def path_for(self, url: str) -> Optional[str]:
+        """Local copy of a resource URL, or None when it has not been downloaded"""
+        ref = self.ref(url)
+        if ref is None:
+            return None
+        path = self.object_path(ref['sha256'])
+        return path if os.path.exists(path) else None
+
+    def _write_json(self, path: str, data: Dict):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def save_ref(self, url: str, ref: Dict):
+        self._write_json(self.ref_path(url), ref)
+
+    def partial_meta(self, url: str) -> Dict:
+        try:
+            with open(self.partial_path(url) + '.json') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def start_partial(self, url: str, validators: Dict):
+        self._write_json(self.partial_path(url) + '.json', validators)
+
+    def discard_partial(self, url: str):
+        for path in (self.partial_path(url), self.partial_path(url) + '.json'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def commit_partial(self, url: str) -> Dict:
+        """Move a completed download into the object store and point the URL's ref at it"""
+        part_path = self.partial_path(url)
+        digest = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        object_path = self.object_path(sha256)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        size = os.path.getsize(part_path)
+        if os.path.exists(object_path):
+            os.remove(part_path)
+        else:
+            os.replace(part_path, object_path)
+
+        validators = self.partial_meta(url)
+        ref = {
+            'url': url,
+            'sha256': sha256,
+            'size': size,
+            'etag': validators.get('etag'),
+            'last_modified': validators.get('last_modified'),
+            'fetched_at': time.time(),
+        }
+        self.save_ref(url, ref)
+        self.discard_partial(url)
+        return ref
+
+    @contextmanager
+    def open_object(self, sha256: str):
+        """Memory-mapped, file-like view of a stored object"""
+        with open(self.object_path(sha256), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield io.BytesIO(b'')
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+
+class ResourceDownloader:
+    """
+    Fetch resource URLs into a ResourceStore with bounded parallelism.
+
+    Known resources are revalidated with If-None-Match / If-Modified-Since
+    and left alone on a 304. An interrupted download is resumed with a Range
+    request, guarded by If-Range so a file that changed in the meantime is
+    fetched again from the start.
+    """
+
+    def __init__(self, store: ResourceStore, session: Optional[requests.Session] = None,
+                 max_workers: int = DEFAULT_DOWNLOAD_WORKERS, timeout: float = DOWNLOAD_TIMEOUT):
+        self.store = store
+        self.session = session or get_iati_session()
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+    def download(self, url: str) -> Dict:
+        """
+        Bring one resource up to date.
+
+        Returns {'url', 'status', 'sha256', 'bytes', 'error'}, where status is
+        'downloaded', 'resumed', 'unchanged' or 'failed' and bytes counts what
+        was transferred this time.
+        """
+        result = {'url': url, 'status': 'failed', 'sha256': None, 'bytes': 0, 'error': None}
+        try:
+            return self._download(url, result)
+        except (OSError, requests.exceptions.RequestException) as e:
+            # The partial file stays behind, so the next run resumes it
+            logger.warning(f"Download of {url} failed: {str(e)}")
+            result['error'] = str(e)
+            return result
+
+    def _download(self, url: str, result: Dict, allow_resume: bool = True) -> Dict:
+        store = self.store
+        part_path = store.partial_path(url)
+        offset = os.path.getsize(part_path) if allow_resume and os.path.exists(part_path) else 0
+        partial = store.partial_meta(url)
+        if_range = partial.get('etag') or partial.get('last_modified')
+        if offset and not if_range:
+            # Without a validator we cannot tell whether the file changed since
+            offset = 0
+
+        # Range offsets count bytes as sent; a compressed body would not line
+        # up with the decoded bytes written to the partial file
+        headers = {'Accept-Encoding': 'identity'}
+        ref = store.ref(url)
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+            headers['If-Range'] = if_range
+        elif ref is not None:
+            if ref.get('etag'):
+                headers['If-None-Match'] = ref['etag']
+            if ref.get('last_modified'):
+                headers['If-Modified-Since'] = ref['last_modified']
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304 and ref is not None and not offset:
+                ref['fetched_at'] = time.time()
+                store.save_ref(url, ref)
+                result.update(status='unchanged', sha256=ref['sha256'])
+                return result
+            if response.status_code == 416 and offset:
+                # Range not satisfiable: the partial file is unusable, start over
+                response.close()
+                store.discard_partial(url)
+                return self._download(url, result, allow_resume=False)
+            response.raise_for_status()
+
+            encoded = response.headers.get('Content-Encoding', 'identity').lower() != 'identity'
+            if response.status_code == 206 and (encoded or self._range_start(response) != offset):
+                response.close()
+                store.discard_partial(url)
+                return self._download(url, result, allow_resume=False)
+            resumed = response.status_code == 206
+            if not resumed:
+                offset = 0
+                store.discard_partial(url)
+                # An encoded body is stored decoded, so it is saved without
+                # validators and an interrupted download starts over
+                store.start_partial(url, {} if encoded else {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                })
+            expected = None if encoded else self._total_size(response)
+            with open(part_path, 'ab' if resumed else 'wb') as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    result['bytes'] += len(chunk)
+
+        size = os.path.getsize(part_path)
+        if expected is not None and size != expected:
+            if size > expected:
+                store.discard_partial(url)
+            raise OSError(f"Incomplete download: {size} of {expected} bytes")
+        ref = store.commit_partial(url)
+        result.update(status='resumed' if resumed else 'downloaded', sha256=ref['sha256'])
+        return result
+
+    @staticmethod
+    def _range_start(response: requests.Response) -> Optional[int]:
+        # Content-Range: bytes 1000-1999/2000
+        content_range = response.headers.get('Content-Range', '')
+        try:
+            return int(content_range.split()[1].split('-')[0])
+        except (IndexError, ValueError):
+            return None
+
+    @staticmethod
+    def _total_size(response: requests.Response) -> Optional[int]:
+        """Size of the whole file: the Content-Range total of a 206, else Content-Length"""
+        if response.status_code == 206:
+            total = response.headers.get('Content-Range', '').rpartition('/')[2]
+        else:
+            total = response.headers.get('Content-Length', '')
+        return int(total) if total.isdigit() else None
+
+    def download_all(self, urls: Iterable[str], on_result: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Download every URL, at most max_workers at a time, and count the outcomes"""
+        urls = list(dict.fromkeys(urls))
+        totals = Counter()
+        results = []
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(urls) or 1))) as executor:
+            futures = [executor.submit(self.download, url) for url in urls]
+            for future in as_completed(futures):
+                result = future.result()
+                totals[result['status']] += 1
+                totals['bytes'] += result['bytes']
+                results.append(result)
+                if on_result:
+                    on_result(result)
+        return {'totals': dict(totals), 'results': results}
+
+
+_resource_store = None
+
+
+def get_resource_store() -> ResourceStore:
+    """Process-wide store for downloaded IATI resources (IATI_RESOURCE_DIR)"""
+    global _resource_store
+    if _resource_store is None:
+        _resource_store = ResourceStore(
+            getattr(settings, 'IATI_RESOURCE_DIR', os.path.join(tempfile.gettempdir(), 'aims_iati_resources'))
+        )
+    return _resource_store
+
+
+def tracked_urls(store: ResourceStore) -> List[str]:
+    """Every resource URL the store has downloaded before"""
+    return [ref['url'] for ref in store.refs()]
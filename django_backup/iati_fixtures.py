@@ -0,0 +1,339 @@
+"""
+IATI Fixture Server
+Local record/replay stand-in for the IATI Registry, Datastore and organisation XML files
+
+Point IATIRegistryService at a running server (its registry_url and
+datastore_url, or the IATI_REGISTRY_BASE_URL / IATI_DATASTORE_BASE_URL
+settings) to exercise lookups without network access. In record mode requests
+the store cannot answer are forwarded upstream and kept; in replay mode they
+get a 404. Latency and failures can be injected, reproducibly with a seed.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+from .http_cache import CachingSession, ResponseCache
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_PREFIX = '/registry'
+DATASTORE_PREFIX = '/datastore'
+RESOURCE_PREFIX = '/resources/'
+UPSTREAM_TIMEOUT = 60
+
+
+class FixtureStore:
+    """
+    Captured responses in a directory: a JSON metadata file and a body file per request.
+
+    Requests are keyed on their path and sorted query string. Organisation
+    XML files are stored under the hash of their original URL, which
+    resources.json maps back to the URL for recording.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.resources_path = os.path.join(directory, 'resources.json')
+        self._lock = threading.Lock()
+        try:
+            with open(self.resources_path) as f:
+                self.resources = json.load(f)
+        except (OSError, ValueError):
+            self.resources = {}
+
+    @staticmethod
+    def key(path: str, query: str = '') -> str:
+        canonical = path + '?' + urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[Dict, bytes]]:
+        base = os.path.join(self.directory, key)
+        try:
+            with open(f'{base}.json') as f:
+                meta = json.load(f)
+            with open(f'{base}.body', 'rb') as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, meta: Dict, body: bytes):
+        base = os.path.join(self.directory, key)
+        with open(f'{base}.body', 'wb') as f:
+            f.write(body)
+        with open(f'{base}.json', 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    def resource_key(self, url: str, remember: bool = False) -> str:
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        if remember and key not in self.resources:
+            with self._lock:
+                self.resources[key] = url
+                with open(self.resources_path, 'w') as f:
+                    json.dump(self.resources, f, indent=2)
+        return key
+
+    def xml_paths(self) -> List[str]:
+        """Body files of the captured organisation XML files"""
+        paths = []
+        for key in sorted(self.resources):
+            path = os.path.join(self.directory, self.key(RESOURCE_PREFIX + key) + '.body')
+            if os.path.exists(path):
+                paths.append(path)
+        return paths
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    fixture_server = None
+
+    def do_GET(self):
+        status, content_type, body = self.fixture_server.respond(self.path)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"IATI fixture server: {format % args}")
+
+
+class _FixtureHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hang up mid-response, e.g. once a streamed XML file has matched
+        logger.debug(f"IATI fixture server connection from {client_address[0]} dropped", exc_info=True)
+
+
+class FixtureServer:
+    """
+    Threaded HTTP server answering from a FixtureStore.
+
+    Routes mirror the services it stands in for: /registry/... for the
+    Registry API, /datastore/... for the Datastore and /resources/<key> for
+    organisation XML files. Resource URLs in package_search results are
+    rewritten to the /resources/ route, so the XML is fetched from the server
+    too. Every request waits `latency` plus up to `jitter` seconds, and a
+    `failure_rate` share of them get `failure_status` instead of a response.
+    Use it as a context manager, or call start() and stop().
+    """
+
+    def __init__(self, directory: str, record: bool = False, latency: float = 0.0, jitter: float = 0.0,
+                 failure_rate: float = 0.0, failure_status: int = 503, seed: Optional[int] = None,
+                 host: str = '127.0.0.1', port: int = 0,
+                 registry_upstream: str = 'https://iatiregistry.org/api/3',
+                 datastore_upstream: str = 'https://api.iatistandard.org'):
+        self.store = FixtureStore(directory)
+        self.record = record
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.upstreams = {REGISTRY_PREFIX: registry_upstream.rstrip('/'),
+                          DATASTORE_PREFIX: datastore_upstream.rstrip('/')}
+        self.stats = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        handler = type('FixtureHandler', (_FixtureHandler,), {'fixture_server': self})
+        self.httpd = _FixtureHTTPServer((host, port), handler)
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def registry_url(self) -> str:
+        return self.base_url + REGISTRY_PREFIX
+
+    @property
+    def datastore_url(self) -> str:
+        return self.base_url + DATASTORE_PREFIX
+
+    def start(self) -> 'FixtureServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"IATI fixture server {'recording' if self.record else 'replaying'} on {self.base_url}")
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _injected(self) -> Tuple[float, bool]:
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            return delay, self._random.random() < self.failure_rate
+
+    def respond(self, target: str) -> Tuple[int, str, bytes]:
+        """(status, content type, body) for a request target such as '/registry/action/package_search?q=x'"""
+        delay, fail = self._injected()
+        if delay:
+            time.sleep(delay)
+        self.stats['requests'] += 1
+        if fail:
+            self.stats['injected_failures'] += 1
+            return self.failure_status, 'text/plain', b'Injected failure'
+
+        parts = urlsplit(target)
+        key = self.store.key(parts.path, parts.query)
+        captured = self.store.get(key)
+        if captured is None and self.record:
+            captured = self._record(key, parts.path, parts.query)
+        if captured is None:
+            self.stats['misses'] += 1
+            return 404, 'text/plain', b'No fixture for this request'
+
+        self.stats['replayed'] += 1
+        meta, body = captured
+        if parts.path.endswith('/action/package_search') and meta['status'] == 200:
+            body = self._rewrite_resources(body)
+        return meta['status'], meta['content_type'], body
+
+    def _upstream_url(self, path: str, query: str) -> Optional[str]:
+        if path.startswith(RESOURCE_PREFIX):
+            return self.store.resources.get(path[len(RESOURCE_PREFIX):])
+        for prefix, upstream in self.upstreams.items():
+            if path.startswith(prefix + '/'):
+                return upstream + path[len(prefix):] + (f'?{query}' if query else '')
+        return None
+
+    def _record(self, key: str, path: str, query: str) -> Optional[Tuple[Dict, bytes]]:
+        url = self._upstream_url(path, query)
+        if url is None:
+            return None
+        try:
+            response = requests.get(url, timeout=UPSTREAM_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Could not record {url}: {str(e)}")
+            return None
+        meta = {
+            'url': url,
+            'status': response.status_code,
+            'content_type': response.headers.get('Content-Type', 'application/octet-stream'),
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        }
+        # Server errors are not worth replaying; a 404 is a real answer
+        if response.status_code >= 500:
+            return meta, response.content
+        self.store.put(key, meta, response.content)
+        self.stats['recorded'] += 1
+        return meta, response.content
+
+    def _rewrite_resources(self, body: bytes) -> bytes:
+        try:
+            data = json.loads(body)
+            datasets = data['result']['results']
+        except (ValueError, KeyError, TypeError):
+            return body
+        for dataset in datasets:
+            for resource in dataset.get('resources') or []:
+                url = resource.get('url')
+                if url and not url.startswith(self.base_url):
+                    key = self.store.resource_key(url, remember=self.record)
+                    resource['url'] = f'{self.base_url}{RESOURCE_PREFIX}{key}'
+        return json.dumps(data).encode('utf-8')
+
+
+def _timed(call) -> float:
+    started = time.perf_counter()
+    call()
+    return time.perf_counter() - started
+
+
+def run_lookup_benchmark(server: FixtureServer, identifiers: List[str], timeout: float = 20) -> Dict:
+    """
+    Time organisation lookups against a running fixture server.
+
+    Lookups go straight to the network path of IATIRegistryService, skipping
+    the database mirror: once sequentially with an empty cache, again with
+    the cache warm (after every file of the first run has finished caching),
+    and once with all identifiers in flight at the same time.
+    Parse throughput is measured over the captured organisation XML files.
+    """
+    from .iati_service import IATIRegistryService
+
+    def service(cache_dir: str) -> IATIRegistryService:
+        return IATIRegistryService(timeout=timeout, registry_url=server.registry_url,
+                                   datastore_url=server.datastore_url,
+                                   session=CachingSession(ResponseCache(cache_dir)))
+
+    results = {}
+    with tempfile.TemporaryDirectory() as cold_dir, tempfile.TemporaryDirectory() as concurrent_dir:
+        sequential = service(cold_dir)
+        for phase in ('cold', 'warm'):
+            requests_before = server.stats['requests']
+            sequential.session.stats.clear()
+            found = 0
+
+            def lookup_all():
+                nonlocal found
+                found = sum(1 for identifier in identifiers if sequential._lookup_organization(identifier))
+
+            wall_time = _timed(lookup_all)
+            session_stats = sequential.session.stats
+            cached = session_stats['hits'] + session_stats['revalidated']
+            results[phase] = {
+                'lookups': len(identifiers),
+                'found': found,
+                'wallTime': round(wall_time, 3),
+                'msPerLookup': round(wall_time * 1000 / len(identifiers), 1) if identifiers else None,
+                'upstreamRequests': server.stats['requests'] - requests_before,
+                'cacheHitRate': round(cached / (cached + session_stats['misses']), 3)
+                if cached + session_stats['misses'] else None,
+            }
+            # Files whose lookups stopped at the first match finish caching in the background
+            sequential.session.wait_for_drains(timeout)
+
+        concurrent = service(concurrent_dir)
+        calls = [lambda identifier=identifier: concurrent._lookup_organization(identifier) for identifier in identifiers]
+        wall_time = _timed(lambda: list(concurrent._fan_out(calls, time.monotonic() + timeout * len(identifiers))))
+        concurrent.session.wait_for_drains(timeout)
+        results['concurrent'] = {
+            'lookups': len(identifiers),
+            'wallTime': round(wall_time, 3),
+            'speedup': round(results['cold']['wallTime'] / wall_time, 2) if wall_time else None,
+        }
+
+    parser = IATIRegistryService(timeout=timeout)
+    organisations = size = 0
+    started = time.perf_counter()
+    for path in server.store.xml_paths():
+        size += os.path.getsize(path)
+        with open(path, 'rb') as f:
+            organisations += sum(1 for _ in parser.iter_organization_xml(f))
+    wall_time = time.perf_counter() - started
+    results['parse'] = {
+        'files': len(server.store.xml_paths()),
+        'organisations': organisations,
+        'megabytes': round(size / 1024 / 1024, 2),
+        'wallTime': round(wall_time, 3),
+        'organisationsPerSec': round(organisations / wall_time, 1) if wall_time else None,
+        'megabytesPerSec': round(size / 1024 / 1024 / wall_time, 2) if wall_time else None,
+    }
+    results['server'] = dict(server.stats)
+    return results
@@ -0,0 +1,155 @@
+"""
+IATI Organisation Mirror
+Bulk loading and indexed lookup of the local IATIOrganization table
+"""
+
+import logging
+import os
+from datetime import timedelta
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import IATIOrganization
+from .organization_index import acronym, normalize_name
+
+logger = logging.getLogger(__name__)
+
+LOAD_CHUNK_SIZE = 1000
+AUTOCOMPLETE_LIMIT = 10
+# Records fetched longer ago than this (IATI_MIRROR_TTL, in seconds) are looked up again
+DEFAULT_MIRROR_TTL = 30 * 24 * 60 * 60
+
+MIRROR_FIELDS = ['name', 'search_name', 'acronym', 'organization_type', 'website', 'contact_email',
+                 'contact_phone', 'address', 'country', 'description', 'source', 'fetched_at']
+
+
+def is_fresh(record: IATIOrganization) -> bool:
+    """Whether a mirror record was fetched within IATI_MIRROR_TTL"""
+    ttl = timedelta(seconds=getattr(settings, 'IATI_MIRROR_TTL', DEFAULT_MIRROR_TTL))
+    return record.fetched_at >= timezone.now() - ttl
+
+
+def prefix_range(prefix: str) -> Dict[str, str]:
+    """
+    gte/lt bounds matching every string that starts with `prefix`.
+
+    Unlike LIKE 'prefix%', a range comparison is answered from the B-tree
+    index on every database backend.
+    """
+    return {'gte': prefix, 'lt': prefix + '\uffff'}
+
+
+def build_mirror_record(org_data: Dict, source: str = '') -> Optional[IATIOrganization]:
+    """Unsaved IATIOrganization for an organisation dict, or None without an identifier and name"""
+    identifier = (org_data.get('iati_identifier') or '').strip()
+    name = (org_data.get('name') or '').strip()
+    if not identifier or not name:
+        return None
+    search_name = normalize_name(name)
+    return IATIOrganization(
+        iati_identifier=identifier,
+        name=name[:500],
+        search_name=search_name[:500],
+        acronym=acronym(search_name)[:50],
+        organization_type=org_data.get('organization_type') or '',
+        website=(org_data.get('website') or '')[:500],
+        contact_email=(org_data.get('contact_email') or '')[:254],
+        contact_phone=(org_data.get('contact_phone') or '')[:50],
+        address=org_data.get('address') or '',
+        country=(org_data.get('country') or '')[:100],
+        description=org_data.get('description') or '',
+        source=source[:500],
+        fetched_at=timezone.now(),
+    )
+
+
+def load_organizations(organizations: Iterable[Dict], source: str = '',
+                       chunk_size: int = LOAD_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Insert or update mirror records in chunks of one statement each.
+
+    Records are keyed on the IATI identifier; when an identifier appears more
+    than once the last record wins.
+    """
+    loaded = skipped = 0
+    iterator = iter(organizations)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            break
+        records = {}
+        for org_data in chunk:
+            record = build_mirror_record(org_data, source)
+            if record is None:
+                skipped += 1
+                continue
+            records[record.iati_identifier] = record
+        IATIOrganization.objects.bulk_create(
+            records.values(), update_conflicts=True,
+            unique_fields=['iati_identifier'], update_fields=MIRROR_FIELDS + ['updated_at']
+        )
+        loaded += len(records)
+    logger.info(f"Loaded {loaded} IATI organizations from {source or 'input'} ({skipped} skipped)")
+    return {'loaded': loaded, 'skipped': skipped}
+
+
+def remember_organization(org_data: Dict, source: str = 'lookup'):
+    """Keep an organisation found over the network so the next lookup is local"""
+    record = build_mirror_record(org_data, source)
+    if record is None:
+        return
+    defaults = {field: getattr(record, field) for field in MIRROR_FIELDS}
+    IATIOrganization.objects.update_or_create(iati_identifier=record.iati_identifier, defaults=defaults)
+
+
+def find_organization(org_identifier: str) -> Optional[IATIOrganization]:
+    """Mirror record for an identifier, trying it as given and upper-cased"""
+    identifier = org_identifier.strip()
+    candidates = {identifier, identifier.upper()}
+    return IATIOrganization.objects.filter(iati_identifier__in=candidates).first()
+
+
+def find_organizations(org_identifiers: Iterable[str]) -> Dict[str, IATIOrganization]:
+    """Mirror records for many identifiers in one query, keyed by the identifier as given"""
+    identifiers = {org_identifier: org_identifier.strip() for org_identifier in org_identifiers}
+    candidates = set(identifiers.values()) | {identifier.upper() for identifier in identifiers.values()}
+    records = {record.iati_identifier: record
+               for record in IATIOrganization.objects.filter(iati_identifier__in=candidates)}
+    found = {}
+    for org_identifier, identifier in identifiers.items():
+        record = records.get(identifier) or records.get(identifier.upper())
+        if record is not None:
+            found[org_identifier] = record
+    return found
+
+
+def autocomplete(query: str, limit: int = AUTOCOMPLETE_LIMIT) -> List[IATIOrganization]:
+    """Organisations whose name, identifier or acronym starts with the query"""
+    search_name = normalize_name(query)
+    identifier = query.strip().upper()
+    if not search_name and not identifier:
+        return []
+
+    bounds = prefix_range(identifier)
+    condition = Q(iati_identifier__gte=bounds['gte'], iati_identifier__lt=bounds['lt'])
+    if search_name:
+        bounds = prefix_range(search_name)
+        condition |= Q(search_name__gte=bounds['gte'], search_name__lt=bounds['lt'])
+        condition |= Q(acronym=search_name.replace(' ', ''))
+    return list(IATIOrganization.objects.filter(condition).order_by('search_name')[:limit])
+
+
+def iter_xml_paths(paths: Iterable[str]) -> Iterator[str]:
+    """Expand directories (e.g. an unpacked registry dump) into the XML files they contain"""
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, files in sorted(os.walk(path)):
+                for file_name in sorted(files):
+                    if file_name.lower().endswith('.xml'):
+                        yield os.path.join(directory, file_name)
+        else:
+            yield path
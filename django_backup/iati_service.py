@@ -4,126 +4,224 @@ Handles interactions with the IATI Registry API to fetch organization data
 """
 
 import requests
+import time
 import xml.etree.ElementTree as ET
-from typing import Dict, Optional, List
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional, List, Tuple
 import logging
 from django.conf import settings
 
+from .http_cache import get_iati_session
+from .iati_downloads import get_resource_store
+from .iati_mirror import find_organization, find_organizations, is_fresh, load_organizations, remember_organization
+from .iati_xml import ORGANISATION_PLAN, local_name
+from .models import Organization
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Last-resort answers for common donors when neither the mirror nor the network has them
+WELL_KNOWN_ORGS = {
+    '44000': {
+        'iati_identifier': '44000',
+        'name': 'World Bank',
+        'organization_type': 'multilateral',
+        'website': 'https://www.worldbank.org',
+        'contact_email': '',
+        'contact_phone': '',
+        'address': '1818 H Street NW, Washington, DC 20433, USA',
+        'country': 'United States',
+        'description': 'The World Bank is an international financial institution that provides loans and grants to the governments of low- and middle-income countries for the purpose of pursuing capital projects.'
+    },
+    'GB-GOV-1': {
+        'iati_identifier': 'GB-GOV-1',
+        'name': 'Department for International Development',
+        'organization_type': 'government',
+        'website': 'https://www.gov.uk/government/organisations/department-for-international-development',
+        'contact_email': '',
+        'contact_phone': '',
+        'address': 'London, United Kingdom',
+        'country': 'United Kingdom',
+        'description': 'UK Department for International Development'
+    },
+    'US-GOV-1': {
+        'iati_identifier': 'US-GOV-1',
+        'name': 'United States Agency for International Development',
+        'organization_type': 'government',
+        'website': 'https://www.usaid.gov',
+        'contact_email': '',
+        'contact_phone': '',
+        'address': 'Washington, DC, United States',
+        'country': 'United States',
+        'description': 'United States Agency for International Development'
+    }
+}
+
 class IATIRegistryService:
     """Service class for interacting with IATI Registry API"""
     
     IATI_REGISTRY_BASE_URL = "https://iatiregistry.org/api/3"
     IATI_DATASTORE_BASE_URL = "https://api.iatistandard.org"
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'AIMS-IATI-Client/1.0'
-        })
+    # Longest any single request may take
+    REQUEST_TIMEOUT = 30
+    # Overall budget for one get_organization_info lookup, across every request it makes
+    DEFAULT_LOOKUP_TIMEOUT = 20
+    # Most requests a single fan-out runs at once
+    MAX_CONCURRENT_REQUESTS = 6
+    # Overall budget for resolving one batch of identifiers
+    DEFAULT_BATCH_TIMEOUT = 60
+    # Most identifiers accepted by resolve_organizations
+    MAX_BATCH_SIZE = 500
+    
+    def __init__(self, timeout: Optional[float] = None, registry_url: Optional[str] = None,
+                 datastore_url: Optional[str] = None, session: Optional[requests.Session] = None):
+        # Registry searches, datastore records and organisation files are
+        # cached on disk, and every service instance shares one pooled
+        # session with retries and per-host circuit breakers
+        self.session = session or get_iati_session()
+        # Publisher files fetched by download_iati_resources are read from disk
+        self.resources = get_resource_store()
+        # Overridable so lookups can run against a local fixture server (see iati_fixtures)
+        self.registry_url = (registry_url or getattr(settings, 'IATI_REGISTRY_BASE_URL', None)
+                             or self.IATI_REGISTRY_BASE_URL).rstrip('/')
+        self.datastore_url = (datastore_url or getattr(settings, 'IATI_DATASTORE_BASE_URL', None)
+                              or self.IATI_DATASTORE_BASE_URL).rstrip('/')
+        self.timeout = timeout or getattr(settings, 'IATI_LOOKUP_TIMEOUT', self.DEFAULT_LOOKUP_TIMEOUT)
+    
+    def _deadline(self, deadline: Optional[float]) -> float:
+        return deadline if deadline is not None else time.monotonic() + self.timeout
     
-    def search_organization_datasets(self, org_identifier: str) -> List[Dict]:
+    def _request_timeout(self, deadline: float) -> float:
+        """Per-request timeout that does not outlive the overall deadline"""
+        return max(0.1, min(self.REQUEST_TIMEOUT, deadline - time.monotonic()))
+    
+    def _fan_out(self, calls: List[Callable[[], Any]], deadline: float) -> Iterator[Tuple[int, Any]]:
         """
-        Search for organization datasets in IATI Registry
+        Run calls concurrently and yield (index, result) as each one finishes.
+        
+        Stops at the deadline, or when the caller stops iterating, without
+        waiting for the calls still in flight. Calls that raise are logged
+        and skipped.
         """
+        if not calls:
+            return
+        executor = ThreadPoolExecutor(max_workers=min(len(calls), self.MAX_CONCURRENT_REQUESTS))
+        futures = {executor.submit(call): index for index, call in enumerate(calls)}
         try:
-            logger.info(f"Searching for organization datasets with identifier: {org_identifier}")
-            
-            # Try multiple search strategies
-            search_queries = [
-                org_identifier,  # Exact match
-                f"*{org_identifier}*",  # Wildcard search
-                f"organisation_identifier:{org_identifier}",  # Field-specific search
-            ]
-            
-            all_datasets = []
-            
-            for query in search_queries:
-                url = f"{self.IATI_REGISTRY_BASE_URL}/action/package_search"
-                params = {
-                    'q': query,
-                    'fq': 'dataset_type:organisation',
-                    'rows': 50
-                }
-                
-                logger.info(f"Searching with query: {query}")
-                response = self.session.get(url, params=params, timeout=30)
-                response.raise_for_status()
-                
-                data = response.json()
-                if data.get('success'):
-                    datasets = data.get('result', {}).get('results', [])
-                    logger.info(f"Found {len(datasets)} datasets for query: {query}")
-                    all_datasets.extend(datasets)
-                    
-                    # If we found datasets, break early
-                    if datasets:
-                        break
-                else:
-                    logger.warning(f"Search failed for query: {query}")
-            
-            # Remove duplicates based on id
-            unique_datasets = []
-            seen_ids = set()
-            for dataset in all_datasets:
+            for future in as_completed(futures, timeout=max(0, deadline - time.monotonic())):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning(f"IATI request failed: {str(e)}")
+                    continue
+                yield futures[future], result
+        except FuturesTimeoutError:
+            pending = sum(1 for future in futures if not future.done())
+            logger.warning(f"IATI lookup deadline reached with {pending} requests still pending")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def search_organization_datasets(self, org_identifier: str, deadline: Optional[float] = None) -> List[Dict]:
+        """
+        Search for organization datasets in IATI Registry
+        
+        The search strategies run concurrently. As soon as the exact match
+        returns datasets they are used alone and the broader searches still
+        in flight are dropped; otherwise the results of the others are merged
+        and de-duplicated, ordered by strategy.
+        """
+        deadline = self._deadline(deadline)
+        logger.info(f"Searching for organization datasets with identifier: {org_identifier}")
+        
+        # Try multiple search strategies
+        search_queries = [
+            org_identifier,  # Exact match
+            f"*{org_identifier}*",  # Wildcard search
+            f"organisation_identifier:{org_identifier}",  # Field-specific search
+        ]
+        
+        results_by_query = {}
+        calls = [lambda query=query: self._search_registry(query, deadline) for query in search_queries]
+        for index, datasets in self._fan_out(calls, deadline):
+            logger.info(f"Found {len(datasets)} datasets for query: {search_queries[index]}")
+            if index == 0 and datasets:
+                # Leaving the fan-out cancels the wildcard and field searches
+                results_by_query = {index: datasets}
+                break
+            results_by_query[index] = datasets
+        
+        # Remove duplicates based on id
+        unique_datasets = []
+        seen_ids = set()
+        for index in sorted(results_by_query):
+            for dataset in results_by_query[index]:
                 if dataset.get('id') not in seen_ids:
                     unique_datasets.append(dataset)
                     seen_ids.add(dataset.get('id'))
-            
-            logger.info(f"Total unique datasets found: {len(unique_datasets)}")
-            return unique_datasets
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error searching organization datasets: {str(e)}")
-            return []
-        except Exception as e:
-            logger.error(f"Unexpected error searching organization datasets: {str(e)}")
+        
+        logger.info(f"Total unique datasets found: {len(unique_datasets)}")
+        return unique_datasets
+    
+    def _search_registry(self, query: str, deadline: float) -> List[Dict]:
+        url = f"{self.registry_url}/action/package_search"
+        params = {
+            'q': query,
+            'fq': 'dataset_type:organisation',
+            'rows': 50
+        }
+        
+        logger.info(f"Searching with query: {query}")
+        response = self.session.get(url, params=params, timeout=self._request_timeout(deadline))
+        response.raise_for_status()
+        
+        data = response.json()
+        if not data.get('success'):
+            logger.warning(f"Search failed for query: {query}")
             return []
+        return data.get('result', {}).get('results', [])
     
-    def get_organization_data_from_datastore(self, org_identifier: str) -> Optional[Dict]:
+    def get_organization_data_from_datastore(self, org_identifier: str, deadline: Optional[float] = None) -> Optional[Dict]:
         """
         Get organization data from IATI Datastore API
+        
+        Both endpoints are queried concurrently and the first successful
+        response is returned.
         """
-        try:
-            logger.info(f"Fetching organization data from datastore for: {org_identifier}")
-            
-            # Try different datastore endpoints
-            endpoints = [
-                f"{self.IATI_DATASTORE_BASE_URL}/organisations/{org_identifier}",
-                f"{self.IATI_DATASTORE_BASE_URL}/organisations?organisation_identifier={org_identifier}",
-            ]
-            
-            for endpoint in endpoints:
-                logger.info(f"Trying datastore endpoint: {endpoint}")
-                response = self.session.get(endpoint, timeout=30)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    logger.info(f"Successfully fetched data from datastore")
-                    return data
-                else:
-                    logger.info(f"Datastore endpoint returned status: {response.status_code}")
-            
-            logger.info("No data found in datastore")
-            return None
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching from datastore: {str(e)}")
-            return None
-        except Exception as e:
-            logger.error(f"Unexpected error fetching from datastore: {str(e)}")
+        deadline = self._deadline(deadline)
+        logger.info(f"Fetching organization data from datastore for: {org_identifier}")
+        
+        # Try different datastore endpoints
+        endpoints = [
+            f"{self.datastore_url}/organisations/{org_identifier}",
+            f"{self.datastore_url}/organisations?organisation_identifier={org_identifier}",
+        ]
+        
+        calls = [lambda endpoint=endpoint: self._fetch_datastore(endpoint, deadline) for endpoint in endpoints]
+        for _, data in self._fan_out(calls, deadline):
+            if data is not None:
+                logger.info(f"Successfully fetched data from datastore")
+                return data
+        
+        logger.info("No data found in datastore")
+        return None
+    
+    def _fetch_datastore(self, endpoint: str, deadline: float) -> Optional[Dict]:
+        logger.info(f"Trying datastore endpoint: {endpoint}")
+        response = self.session.get(endpoint, timeout=self._request_timeout(deadline))
+        if response.status_code != 200:
+            logger.info(f"Datastore endpoint returned status: {response.status_code}")
             return None
+        return response.json()
     
-    def fetch_organization_xml(self, dataset_url: str) -> Optional[str]:
+    def fetch_organization_xml(self, dataset_url: str, deadline: Optional[float] = None) -> Optional[str]:
         """
         Fetch organization XML data from a dataset URL
         """
         try:
             logger.info(f"Fetching XML from: {dataset_url}")
-            response = self.session.get(dataset_url, timeout=30)
+            response = self.session.get(dataset_url, timeout=self._request_timeout(self._deadline(deadline)))
             response.raise_for_status()
             logger.info("Successfully fetched XML data")
             return response.text
@@ -141,25 +239,9 @@ class IATIRegistryService:
             logger.info("Parsing organization XML")
             root = ET.fromstring(xml_content)
             
-            # Handle different XML namespaces
-            namespaces = {
-                'iati': 'http://iatistandard.org/202',
-                'iati201': 'http://iatistandard.org/201',
-                'iati203': 'http://iatistandard.org/203'
-            }
-            
-            # Try to find organization elements with different namespaces
-            org_elements = []
-            for ns_prefix, ns_uri in namespaces.items():
-                elements = root.findall(f'.//{{{ns_uri}}}iati-organisation')
-                if elements:
-                    org_elements.extend(elements)
-                    logger.info(f"Found {len(elements)} organization elements with namespace {ns_prefix}")
-            
-            # If no namespaced elements found, try without namespace
-            if not org_elements:
-                org_elements = root.findall('.//iati-organisation')
-                logger.info(f"Found {len(org_elements)} organization elements without namespace")
+            # One pass over the tree, matching the element in any IATI namespace
+            org_elements = [element for element in root.iter() if local_name(element.tag) == 'iati-organisation']
+            logger.info(f"Found {len(org_elements)} organization elements")
             
             for org_element in org_elements:
                 org_data = self._extract_organization_data(org_element)
@@ -180,118 +262,23 @@ class IATIRegistryService:
         Extract organization data from an XML element
         """
         try:
-            # Get organization identifier
-            org_identifier = org_element.get('organisation-identifier', '')
-            
-            # Get organization name
-            name_element = org_element.find('.//name')
-            org_name = ''
-            if name_element is not None:
-                narrative = name_element.find('.//narrative')
-                if narrative is not None:
-                    org_name = narrative.text or ''
-                else:
-                    org_name = name_element.text or ''
-            
-            # Get organization type
-            org_type_element = org_element.find('.//organisation-type')
-            org_type = ''
-            if org_type_element is not None:
-                org_type = org_type_element.get('code', '')
-            
-            # Get website
-            website = ''
-            website_element = org_element.find('.//website')
-            if website_element is not None:
-                website = website_element.text or ''
-            
-            # Get contact information
-            contact_info = self._extract_contact_info(org_element)
-            
-            # Get address information
-            address_info = self._extract_address_info(org_element)
-            
+            record = ORGANISATION_PLAN.extract(org_element)
             return {
-                'iati_identifier': org_identifier,
-                'name': org_name.strip(),
-                'organization_type': self._map_iati_org_type(org_type),
-                'website': website.strip(),
-                'contact_email': contact_info.get('email', ''),
-                'contact_phone': contact_info.get('phone', ''),
-                'address': address_info.get('address', ''),
-                'country': address_info.get('country', ''),
-                'description': self._extract_description(org_element)
+                'iati_identifier': record['iati_identifier'],
+                'name': record['name'],
+                'organization_type': self._map_iati_org_type(record['type_code'] or record['reporting_org_type']),
+                'website': record['website'],
+                'contact_email': record['email'],
+                'contact_phone': record['phone'],
+                'address': record['address'],
+                'country': record['country'],
+                'description': record['description']
             }
             
         except Exception as e:
             logger.error(f"Error extracting organization data: {str(e)}")
             return None
     
-    def _extract_contact_info(self, org_element) -> Dict[str, str]:
-        """Extract contact information from organization element"""
-        contact_info = {'email': '', 'phone': ''}
-        
-        try:
-            # Look for contact-info elements
-            contact_elements = org_element.findall('.//contact-info')
-            for contact in contact_elements:
-                # Email
-                email_element = contact.find('.//email')
-                if email_element is not None and not contact_info['email']:
-                    contact_info['email'] = email_element.text or ''
-                
-                # Phone
-                phone_element = contact.find('.//telephone')
-                if phone_element is not None and not contact_info['phone']:
-                    contact_info['phone'] = phone_element.text or ''
-        except Exception as e:
-            logger.error(f"Error extracting contact info: {str(e)}")
-        
-        return contact_info
-    
-    def _extract_address_info(self, org_element) -> Dict[str, str]:
-        """Extract address information from organization element"""
-        address_info = {'address': '', 'country': ''}
-        
-        try:
-            # Look for address elements
-            address_elements = org_element.findall('.//address')
-            for address in address_elements:
-                # Full address
-                address_lines = []
-                for line in address.findall('.//address-line'):
-                    if line.text:
-                        address_lines.append(line.text.strip())
-                
-                if address_lines and not address_info['address']:
-                    address_info['address'] = '\n'.join(address_lines)
-                
-                # Country
-                country_element = address.find('.//country')
-                if country_element is not None and not address_info['country']:
-                    country_code = country_element.get('code', '')
-                    country_name = country_element.text or ''
-                    address_info['country'] = country_name or country_code
-        except Exception as e:
-            logger.error(f"Error extracting address info: {str(e)}")
-        
-        return address_info
-    
-    def _extract_description(self, org_element) -> str:
-        """Extract organization description"""
-        try:
-            # Look for description or narrative elements
-            desc_element = org_element.find('.//description')
-            if desc_element is not None:
-                narrative = desc_element.find('.//narrative')
-                if narrative is not None:
-                    return narrative.text or ''
-                return desc_element.text or ''
-        except Exception as e:
-            logger.error(f"Error extracting description: {str(e)}")
-        
-        return ''
-    
     def _map_iati_org_type(self, iati_type_code: str) -> str:
         """Map IATI organization type codes to our system's organization types"""
         mapping = {
@@ -320,100 +307,285 @@ class IATIRegistryService:
         # Clean and normalize the identifier
         org_identifier = org_identifier.strip()
         
-        # First, try to get data from datastore
-        logger.info("Attempting to fetch from IATI Datastore...")
-        org_data = self.get_organization_data_from_datastore(org_identifier)
+        # Organisations loaded into the local mirror (or found by an earlier
+        # lookup) are answered without the network until they expire
+        mirrored = find_organization(org_identifier)
+        if mirrored is not None and is_fresh(mirrored):
+            logger.info(f"Found {org_identifier} in the local IATI organization mirror")
+            return mirrored.to_org_info()
+        
+        org_info = self._lookup_organization(org_identifier)
+        if org_info is not None:
+            remember_organization(org_info)
+            return org_info
+        
+        if mirrored is not None:
+            logger.info(f"Could not refresh {org_identifier}, using the expired mirror record")
+            return mirrored.to_org_info()
+        
+        # If still no match, try a broader search for well-known organizations
+        logger.info("Trying well-known organization mappings...")
+        if org_identifier in WELL_KNOWN_ORGS:
+            logger.info(f"Found well-known organization mapping for: {org_identifier}")
+            return WELL_KNOWN_ORGS[org_identifier]
+        
+        logger.warning(f"No organization data found for identifier: {org_identifier}")
+        return None
+    
+    def resolve_organizations(self, org_identifiers: List[str], timeout: Optional[float] = None) -> Dict[str, Dict]:
+        """
+        Resolve many organisation identifiers at once.
+        
+        Identifiers are de-duplicated, then looked up in the Organization
+        table and the local mirror with one query each. Only the misses go to
+        the network, concurrently and under one overall deadline; expired
+        mirror records go too, and are used only when that fails. Returns a
+        map of identifier to {'status', 'elapsed_ms', 'organization'}, where
+        status is one of 'local', 'mirror', 'registry', 'well_known',
+        'not_found', 'error' or 'timeout'.
+        """
+        identifiers = list(dict.fromkeys(
+            identifier.strip() for identifier in org_identifiers if identifier and identifier.strip()
+        ))
+        if len(identifiers) > self.MAX_BATCH_SIZE:
+            raise ValueError(f"At most {self.MAX_BATCH_SIZE} identifiers can be resolved at once")
+        batch_timeout = timeout or getattr(settings, 'IATI_BATCH_LOOKUP_TIMEOUT', self.DEFAULT_BATCH_TIMEOUT)
+        deadline = time.monotonic() + batch_timeout
+        results = {}
+        
+        def record(identifier, status, started, organization=None):
+            results[identifier] = {
+                'status': status,
+                'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+                'organization': organization,
+            }
+        
+        # Organisations already in the directory, matched as given or upper-cased
+        started = time.monotonic()
+        candidates = set(identifiers) | {identifier.upper() for identifier in identifiers}
+        local = {org.iati_identifier: org for org in
+                 Organization.objects.filter(iati_identifier__in=candidates).select_related('country')}
+        for identifier in identifiers:
+            org = local.get(identifier) or local.get(identifier.upper())
+            if org is not None:
+                record(identifier, 'local', started, self._organization_info(org))
+        
+        # Organisations in the local IATI mirror
+        started = time.monotonic()
+        misses = [identifier for identifier in identifiers if identifier not in results]
+        expired = {}
+        for identifier, mirrored in find_organizations(misses).items():
+            if is_fresh(mirrored):
+                record(identifier, 'mirror', started, mirrored.to_org_info())
+            else:
+                expired[identifier] = mirrored
+        
+        started = time.monotonic()
+        misses = [identifier for identifier in identifiers if identifier not in results]
+        if misses:
+            logger.info(f"Resolving {len(misses)} of {len(identifiers)} organizations against IATI")
+        calls = [lambda identifier=identifier: self._timed_lookup(identifier, deadline) for identifier in misses]
+        found = []
+        for index, (status, org_info, elapsed) in self._fan_out(calls, deadline):
+            results[misses[index]] = {'status': status, 'elapsed_ms': elapsed, 'organization': org_info}
+            if status == 'registry':
+                found.append(org_info)
+        # Workers do not touch the database; keep what they found in one statement
+        if found:
+            load_organizations(found, source='lookup')
+        
+        for identifier, mirrored in expired.items():
+            if results.get(identifier, {}).get('status') != 'registry':
+                record(identifier, 'mirror', started, mirrored.to_org_info())
+        for identifier in misses:
+            if identifier not in results:
+                record(identifier, 'timeout', started)
+        return {identifier: results[identifier] for identifier in identifiers}
+    
+    def _timed_lookup(self, org_identifier: str, batch_deadline: float) -> Tuple[str, Optional[Dict], float]:
+        """(status, organisation, elapsed_ms) of one network lookup for resolve_organizations"""
+        started = time.monotonic()
+        try:
+            org_info = self._lookup_organization(org_identifier, min(batch_deadline, started + self.timeout))
+        except Exception as e:
+            logger.warning(f"IATI lookup for {org_identifier} failed: {str(e)}")
+            status, org_info = 'error', None
+        else:
+            if org_info is not None:
+                status = 'registry'
+            elif org_identifier in WELL_KNOWN_ORGS:
+                status, org_info = 'well_known', WELL_KNOWN_ORGS[org_identifier]
+            else:
+                status = 'not_found'
+        return status, org_info, round((time.monotonic() - started) * 1000, 1)
+    
+    @staticmethod
+    def _organization_info(org: Organization) -> Dict:
+        """get_organization_info-style dict for an organisation already in the directory"""
+        return {
+            'organization_id': org.id,
+            'iati_identifier': org.iati_identifier,
+            'name': org.name,
+            'organization_type': org.organization_type,
+            'website': org.website,
+            'contact_email': org.contact_email,
+            'contact_phone': org.contact_phone,
+            'address': org.address,
+            'country': org.country.name if org.country else '',
+            'description': org.description,
+        }
+    
+    def _lookup_organization(self, org_identifier: str, deadline: Optional[float] = None) -> Optional[Dict]:
+        """Search the IATI Datastore and Registry for an organisation"""
+        # The datastore and registry are searched at the same time under one
+        # deadline; datastore data wins when both answer
+        deadline = self._deadline(deadline)
+        logger.info("Querying IATI Datastore and IATI Registry...")
+        lookups = {}
+        for index, result in self._fan_out([
+            lambda: self.get_organization_data_from_datastore(org_identifier, deadline),
+            lambda: self.search_organization_datasets(org_identifier, deadline),
+        ], deadline):
+            lookups[index] = result
+            if index == 0 and result:
+                break
+        
+        org_data = lookups.get(0)
         if org_data:
             logger.info("Successfully found data in IATI Datastore")
             return self._process_datastore_org_data(org_data)
         
-        # If datastore doesn't have the data, search registry for datasets
-        logger.info("Datastore search unsuccessful, trying IATI Registry...")
-        datasets = self.search_organization_datasets(org_identifier)
+        datasets = lookups.get(1) or []
+        logger.info(f"Datastore search unsuccessful, found {len(datasets)} datasets in registry")
         
-        logger.info(f"Found {len(datasets)} datasets in registry")
+        resource_urls = self.organization_resource_urls(datasets)
         
+        # Fetch and parse the XML files concurrently. An exact identifier match
+        # is returned as soon as any file finds it; looser matches are only
+        # used once every file is read, taken in dataset order (datasets found
+        # by the exact query first) so the answer does not depend on timing
+        calls = [lambda url=url: self._fetch_and_match(url, org_identifier, deadline) for url in resource_urls]
+        loose = {}
+        for index, org in self._fan_out(calls, deadline):
+            if not org:
+                continue
+            if org.get('iati_identifier') == org_identifier:
+                logger.info(f"Found matching organization: {org.get('name')}")
+                return org
+            loose[index] = org
+        
+        if loose:
+            org = loose[min(loose)]
+            logger.info(f"Found partially matching organization: {org.get('name')} ({org.get('iati_identifier')})")
+            return org
+        return None
+    
+    @staticmethod
+    def organization_resource_urls(datasets: List[Dict]) -> List[str]:
+        """XML resource URLs of the organisation datasets among registry search results"""
+        resource_urls = []
         for dataset in datasets:
             logger.info(f"Processing dataset: {dataset.get('name', 'Unknown')}")
             
             # Look for organization datasets
             if dataset.get('type') == 'organisation' or 'organisation' in dataset.get('name', '').lower():
-                resources = dataset.get('resources', [])
-                logger.info(f"Dataset has {len(resources)} resources")
-                
-                for resource in resources:
-                    resource_format = resource.get('format', '').lower()
+                for resource in dataset.get('resources', []):
                     resource_url = resource.get('url', '')
-                    
-                    logger.info(f"Processing resource: {resource.get('name', 'Unknown')} (format: {resource_format})")
-                    
-                    if resource_format == 'xml' and resource_url:
-                        xml_content = self.fetch_organization_xml(resource_url)
-                        if xml_content:
-                            organizations = self.parse_organization_xml(xml_content)
-                            logger.info(f"Parsed {len(organizations)} organizations from XML")
-                            
-                            # Find the specific organization
-                            for org in organizations:
-                                org_id = org.get('iati_identifier', '')
-                                org_name = org.get('name', '')
-                                
-                                logger.info(f"Checking organization: {org_name} (ID: {org_id})")
-                                
-                                # Try different matching strategies
-                                if (org_id == org_identifier or 
-                                    org_identifier in org_id or 
-                                    org_id.endswith(org_identifier) or
-                                    org_identifier.lower() in org_name.lower()):
-                                    
-                                    logger.info(f"Found matching organization: {org_name}")
-                                    return org
-        
-        # If still no match, try a broader search for well-known organizations
-        logger.info("Trying well-known organization mappings...")
-        well_known_orgs = {
-            '44000': {
-                'iati_identifier': '44000',
-                'name': 'World Bank',
-                'organization_type': 'multilateral',
-                'website': 'https://www.worldbank.org',
-                'contact_email': '',
-                'contact_phone': '',
-                'address': '1818 H Street NW, Washington, DC 20433, USA',
-                'country': 'United States',
-                'description': 'The World Bank is an international financial institution that provides loans and grants to the governments of low- and middle-income countries for the purpose of pursuing capital projects.'
-            },
-            'GB-GOV-1': {
-                'iati_identifier': 'GB-GOV-1',
-                'name': 'Department for International Development',
-                'organization_type': 'government',
-                'website': 'https://www.gov.uk/government/organisations/department-for-international-development',
-                'contact_email': '',
-                'contact_phone': '',
-                'address': 'London, United Kingdom',
-                'country': 'United Kingdom',
-                'description': 'UK Department for International Development'
-            },
-            'US-GOV-1': {
-                'iati_identifier': 'US-GOV-1',
-                'name': 'United States Agency for International Development',
-                'organization_type': 'government',
-                'website': 'https://www.usaid.gov',
-                'contact_email': '',
-                'contact_phone': '',
-                'address': 'Washington, DC, United States',
-                'country': 'United States',
-                'description': 'United States Agency for International Development'
-            }
-        }
-        
-        if org_identifier in well_known_orgs:
-            logger.info(f"Found well-known organization mapping for: {org_identifier}")
-            return well_known_orgs[org_identifier]
-        
-        logger.warning(f"No organization data found for identifier: {org_identifier}")
+                    if resource.get('format', '').lower() == 'xml' and resource_url and resource_url not in resource_urls:
+                        resource_urls.append(resource_url)
+        return resource_urls
+    
+    def list_organization_resources(self, page_size: int = 1000) -> List[str]:
+        """XML resource URLs of every organisation dataset in the registry, page by page"""
+        url = f"{self.registry_url}/action/package_search"
+        resource_urls = []
+        start = 0
+        while True:
+            params = {'q': '*:*', 'fq': 'dataset_type:organisation', 'rows': page_size, 'start': start}
+            response = self.session.get(url, params=params, timeout=self.REQUEST_TIMEOUT)
+            response.raise_for_status()
+            datasets = response.json().get('result', {}).get('results', [])
+            resource_urls.extend(resource_url for resource_url in self.organization_resource_urls(datasets)
+                                 if resource_url not in resource_urls)
+            if len(datasets) < page_size:
+                return resource_urls
+            start += page_size
+    
+    def _fetch_and_match(self, resource_url: str, org_identifier: str, deadline: float) -> Optional[Dict]:
+        """
+        Stream one organisation XML file and return the organisation matching the identifier.
+
+        A copy downloaded into the resource store is read from disk through a
+        memory map. Otherwise the file is parsed while it downloads and the
+        download stops at an exact identifier match, so large publisher files
+        are neither held in memory nor read past the organisation we are
+        looking for. Without an exact match the first looser match is returned.
+        """
+        ref = self.resources.ref(resource_url)
+        if ref is not None:
+            try:
+                with self.resources.open_object(ref['sha256']) as source:
+                    logger.info(f"Reading downloaded copy of: {resource_url}")
+                    return self._match_in(source, org_identifier, deadline)
+            except OSError as e:
+                logger.warning(f"Downloaded copy of {resource_url} unreadable: {str(e)}")
+        try:
+            logger.info(f"Streaming XML from: {resource_url}")
+            with self.session.open(resource_url, timeout=self._request_timeout(deadline)) as source:
+                return self._match_in(source, org_identifier, deadline)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error fetching organization XML: {str(e)}")
         return None
     
+    def _match_in(self, source: BinaryIO, org_identifier: str, deadline: float) -> Optional[Dict]:
+        """The organisation whose identifier equals `org_identifier`, else the first looser match"""
+        loose = None
+        for org in self.iter_organization_xml(source, deadline):
+            if org.get('iati_identifier') == org_identifier:
+                return org
+            if loose is None and self._matches_organization(org, org_identifier):
+                loose = org
+        return loose
+
+    def iter_organization_xml(self, source: BinaryIO, deadline: Optional[float] = None) -> Iterator[Dict]:
+        """
+        Yield organisations from a readable XML stream as each element closes.
+
+        Processed elements are cleared from the tree, so memory stays flat no
+        matter how many organisations the file holds. Parsing stops quietly at
+        the deadline or on malformed XML, keeping what was read so far.
+        """
+        count = 0
+        try:
+            root = None
+            for event, element in ET.iterparse(source, events=('start', 'end')):
+                if root is None:
+                    root = element
+                if event != 'end' or local_name(element.tag) != 'iati-organisation':
+                    continue
+                org_data = self._extract_organization_data(element)
+                root.clear()
+                if org_data:
+                    count += 1
+                    yield org_data
+                if deadline is not None and time.monotonic() >= deadline:
+                    logger.warning(f"IATI lookup deadline reached after {count} organizations")
+                    return
+        except ET.ParseError as e:
+            logger.error(f"Error parsing organization XML: {str(e)}")
+        logger.info(f"Total organizations extracted: {count}")
+
+    @staticmethod
+    def _matches_organization(org: Dict, org_identifier: str) -> bool:
+        org_id = org.get('iati_identifier', '')
+        org_name = org.get('name', '')
+
+        # Try different matching strategies
+        return (org_id == org_identifier or
+                org_identifier in org_id or
+                org_id.endswith(org_identifier) or
+                org_identifier.lower() in org_name.lower())
+    
     def _process_datastore_org_data(self, org_data: Dict) -> Dict:
         """Process organization data from IATI datastore format"""
         try:
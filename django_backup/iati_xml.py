@@ -0,0 +1,147 @@
+"""
+IATI XML Extraction
+Single-pass, namespace-agnostic extraction of organisation and activity elements
+
+Publishers use the 2.01, 2.02 and 2.03 namespaces or none at all, so elements
+are matched on their local name only. An ExtractionPlan maps the local names
+of an element's children to handlers and visits each child once, instead of
+running a `.//` search per field.
+"""
+
+from typing import Callable, Dict, Optional
+
+_local_names: Dict[str, str] = {}
+
+
+def local_name(tag) -> str:
+    """Tag without its namespace, e.g. '{http://iatistandard.org/203}name' -> 'name'"""
+    try:
+        return _local_names[tag]
+    except KeyError:
+        # Comments and processing instructions have non-string tags
+        name = tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+        _local_names[tag] = name
+        return name
+
+
+def element_text(element) -> str:
+    if element is None:
+        return ''
+    return (element.text or '').strip()
+
+
+def narrative(element) -> str:
+    """Text of an element's first narrative child, or of the element itself"""
+    if element is None:
+        return ''
+    for child in element:
+        if local_name(child.tag) == 'narrative':
+            return element_text(child)
+    return element_text(element)
+
+
+def code(element) -> str:
+    """The code attribute of a codelist element, or its text"""
+    if element is None:
+        return ''
+    return (element.get('code') or element.text or '').strip()
+
+
+def first(field: str, value: Callable) -> Callable[[Dict, object], None]:
+    """Handler keeping the value of the first matching child only"""
+    def handler(record, child):
+        if not record.get(field):
+            record[field] = value(child)
+    return handler
+
+
+def collect(field: str, value: Callable) -> Callable[[Dict, object], None]:
+    """Handler appending the value of every matching child to a list"""
+    def handler(record, child):
+        record[field].append(value(child))
+    return handler
+
+
+class ExtractionPlan:
+    """
+    Build a record from an element by dispatching on its children's local names.
+
+    `factory(element)` creates the record, so defaults can come from the
+    element's own attributes; each handler is called as `handler(record, child)`.
+    Children without a handler are skipped, and nothing below a child is
+    visited unless its handler runs a nested plan.
+    """
+
+    def __init__(self, handlers: Dict[str, Callable[[Dict, object], None]],
+                 factory: Optional[Callable[[object], Dict]] = None):
+        self.handlers = handlers
+        self.factory = factory or (lambda element: {})
+
+    def extract(self, element) -> Dict:
+        record = self.factory(element)
+        handlers = self.handlers
+        for child in element:
+            handler = handlers.get(local_name(child.tag))
+            if handler is not None:
+                handler(record, child)
+        return record
+
+    def __call__(self, element) -> Dict:
+        return self.extract(element)
+
+
+CONTACT_PLAN = ExtractionPlan({
+    'email': first('email', element_text),
+    'telephone': first('phone', element_text),
+    'website': first('website', element_text),
+    'mailing-address': first('address', narrative),
+})
+
+ADDRESS_PLAN = ExtractionPlan({
+    'address-line': collect('lines', element_text),
+    'country': first('country', lambda element: element_text(element) or element.get('code', '')),
+}, factory=lambda element: {'lines': []})
+
+
+def _merge_contact(record, child):
+    for field, value in CONTACT_PLAN.extract(child).items():
+        if value and not record.get(field):
+            record[field] = value
+
+
+def _merge_address(record, child):
+    address = ADDRESS_PLAN.extract(child)
+    lines = [line for line in address['lines'] if line]
+    if lines and not record['address']:
+        record['address'] = '\n'.join(lines)
+    if address.get('country') and not record['country']:
+        record['country'] = address['country']
+
+
+def _organisation_record(element) -> Dict:
+    return {
+        # An attribute in older files, a child element since 2.0
+        'iati_identifier': (element.get('organisation-identifier') or '').strip(),
+        'name': '',
+        'type_code': '',
+        'reporting_org_type': '',
+        'website': '',
+        'email': '',
+        'phone': '',
+        'address': '',
+        'country': '',
+        'description': '',
+    }
+
+
+ORGANISATION_PLAN = ExtractionPlan({
+    'organisation-identifier': first('iati_identifier', element_text),
+    'name': first('name', narrative),
+    'organisation-type': first('type_code', code),
+    # Organisation files carry their type on the reporting-org element
+    'reporting-org': first('reporting_org_type', lambda element: element.get('type', '')),
+    'website': first('website', element_text),
+    'contact-info': _merge_contact,
+    'address': _merge_address,
+    'description': first('description', narrative),
+}, factory=_organisation_record)
@@ -0,0 +1,258 @@
+"""
+Bulk Import Benchmarks
+Synthetic import files and a harness that times them through the import endpoints
+"""
+
+import csv
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional
+
+import django
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import resolve
+
+logger = logging.getLogger(__name__)
+
+# Columns of sample_imports/<entity>_template.csv and the system field each maps to
+TEMPLATE_COLUMNS = {
+    'activities': [
+        ('Activity Title', 'title'),
+        ('Donor Organization', 'donor_name'),
+        ('Start Date', 'start_date_planned'),
+        ('End Date', 'end_date_planned'),
+        ('Total Budget', 'total_budget'),
+        ('Recipient Country', 'recipient_country_name'),
+        ('Description', 'description'),
+        ('Implementing Organization', 'implementing_org_name'),
+        ('Activity Status', 'activity_status'),
+        ('Sector', 'sector_name'),
+    ],
+    'organizations': [
+        ('Organization Name', 'name'),
+        ('Organization Type', 'organization_type'),
+        ('IATI ID', 'iati_identifier'),
+        ('Country', 'country_name'),
+        ('Contact Email', 'contact_email'),
+        ('Website', 'website'),
+        ('Short Name', 'short_name'),
+        ('Description', 'description'),
+    ],
+    'transactions': [
+        ('Activity Title', 'project_title'),
+        ('Transaction Date', 'transaction_date'),
+        ('Amount', 'amount'),
+        ('Transaction Type', 'transaction_type'),
+        ('Currency', 'currency'),
+        ('Description', 'description'),
+        ('Provider Organization', 'provider_organization_name'),
+        ('Receiver Organization', 'receiver_organization_name'),
+        ('Reference Number', 'reference'),
+    ],
+}
+
+# Transactions reference activities, so activities are imported first
+ENTITY_ORDER = ['activities', 'organizations', 'transactions']
+
+DONORS = ['UNICEF', 'World Bank', 'Asian Development Bank', 'JICA', 'USAID', 'DFID', 'European Union', 'UNDP']
+COUNTRIES = ['Myanmar', 'Thailand', 'Cambodia', 'Laos', 'Vietnam']
+SECTORS = ['Water and Sanitation', 'Education', 'Health', 'Agriculture', 'Governance', 'Infrastructure']
+ORG_TYPES = ['ngo', 'ingo', 'un', 'government', 'bilateral', 'multilateral', 'private', 'academic']
+STATUSES = ['pipeline', 'implementation', 'completion']
+TRANSACTION_TYPES = ['disbursement', 'expenditure', 'incoming_funds']
+CURRENCIES = ['USD', 'EUR', 'MMK']
+
+
+def parse_size(value: str) -> int:
+    """'10k' -> 10000, '1m' -> 1000000"""
+    value = value.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    return int(value.rstrip('km')) * multiplier
+
+
+def synthetic_rows(entity_type: str, rows: int, tag: str = '') -> Iterator[List[str]]:
+    """
+    Deterministic rows for an entity type, in template column order.
+
+    Names include `tag` so files of different runs can be imported into the
+    same database without colliding; transactions reference the activities
+    generated with the same tag and size.
+    """
+    start = date(2024, 1, 1)
+    for i in range(rows):
+        if entity_type == 'activities':
+            begin = start + timedelta(days=i % 365)
+            yield [
+                f"Synthetic Activity {tag}{i:07d}", DONORS[i % len(DONORS)], begin.isoformat(),
+                (begin + timedelta(days=365 + i % 730)).isoformat(), str(10000 + (i * 37) % 990000),
+                COUNTRIES[i % len(COUNTRIES)], f"Synthetic activity {i} for benchmarking",
+                f"Implementing Partner {i % 200}", STATUSES[i % len(STATUSES)], SECTORS[i % len(SECTORS)],
+            ]
+        elif entity_type == 'organizations':
+            yield [
+                f"Synthetic Organization {tag}{i:07d}", ORG_TYPES[i % len(ORG_TYPES)], f"XX-BENCH-{tag}{i:07d}",
+                COUNTRIES[i % len(COUNTRIES)], f"contact{i}@example.org", f"https://org{i}.example.org",
+                f"SO{i}", f"Synthetic organization {i} for benchmarking",
+            ]
+        else:
+            yield [
+                f"Synthetic Activity {tag}{i:07d}", (start + timedelta(days=i % 700)).isoformat(),
+                str(100 + (i * 13) % 50000),
+                TRANSACTION_TYPES[i % len(TRANSACTION_TYPES)], CURRENCIES[i % len(CURRENCIES)],
+                f"Synthetic transaction {i}", DONORS[i % len(DONORS)], f"Implementing Partner {i % 200}",
+                f"BENCH-{i:07d}",
+            ]
+
+
+def write_synthetic_file(path: str, entity_type: str, rows: int, file_format: str, tag: str = '') -> str:
+    """
+    Write a synthetic import file without holding its rows in memory.
+
+    CSV files match the templates; JSON files are the body the frontend posts
+    (row objects in `data` plus the column mappings).
+    """
+    header = [column for column, _ in TEMPLATE_COLUMNS[entity_type]]
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(synthetic_rows(entity_type, rows, tag))
+        else:
+            f.write('{"fileName": %s, "mappings": %s, "data": [' % (
+                json.dumps(os.path.basename(path)), json.dumps(column_mappings(entity_type))))
+            for i, row in enumerate(synthetic_rows(entity_type, rows, tag)):
+                f.write((',' if i else '') + json.dumps(dict(zip(header, row))))
+            f.write(']}')
+    return path
+
+
+def column_mappings(entity_type: str) -> List[Dict]:
+    """Frontend-style mappings for the template columns"""
+    return [
+        {'systemFieldId': field, 'fileColumnIndex': index}
+        for index, (_, field) in enumerate(TEMPLATE_COLUMNS[entity_type])
+    ]
+
+
+@contextmanager
+def count_queries(counter: Dict[str, int]):
+    """Count queries without recording their SQL, which would skew memory at large sizes"""
+    def wrapper(execute, sql, params, many, context):
+        counter['queries'] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+# Where the projects app is mounted in the root URLconf
+DEFAULT_URL_PREFIX = '/projects'
+
+
+def import_request(user, entity_type: str, path: str, file_format: str, url_prefix: str = DEFAULT_URL_PREFIX):
+    """
+    POST request for one import file whose body is read from disk as the view consumes it.
+
+    The open file is the request's `wsgi.input`, so the harness never holds
+    the payload in memory and peak RSS reflects the import path alone.
+    """
+    url = f'{url_prefix}/api/import/{entity_type}/'
+    body = {'wsgi.input': open(path, 'rb'), 'CONTENT_LENGTH': str(os.path.getsize(path))}
+    if file_format == 'csv':
+        request = RequestFactory().post(f'{url}?fileName={os.path.basename(path)}', content_type='text/csv',
+                                        HTTP_X_IMPORT_MAPPINGS=json.dumps(column_mappings(entity_type)), **body)
+    else:
+        request = RequestFactory().post(url, content_type='application/json', **body)
+    request.user = user
+    return request
+
+
+def run_import(user, entity_type: str, path: str, file_format: str, rows: int,
+               url_prefix: str = DEFAULT_URL_PREFIX) -> Dict:
+    """Stream one file to its import view and measure it"""
+    request = import_request(user, entity_type, path, file_format, url_prefix)
+    view = resolve(request.path_info)
+
+    counter = {'queries': 0}
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    try:
+        with count_queries(counter), override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=None):
+            response = view.func(request, *view.args, **view.kwargs)
+    finally:
+        request.environ['wsgi.input'].close()
+    wall_time = time.perf_counter() - started
+
+    results = json.loads(response.content)
+    if response.status_code != 200:
+        raise RuntimeError(f"{entity_type} import returned {response.status_code}: {results.get('error')}")
+
+    peak = peak_rss_mb()
+    return {
+        'entityType': entity_type,
+        'format': file_format,
+        'rows': rows,
+        'successful': results['successful'],
+        'failed': results['failed'],
+        'wallTime': round(wall_time, 3),
+        'rowsPerSec': round(rows / wall_time, 1) if wall_time else None,
+        'queries': counter['queries'],
+        'queriesPerRow': round(counter['queries'] / rows, 4) if rows else None,
+        'peakRssMb': peak,
+        'peakRssGrowthMb': round(peak - rss_before, 1),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(user, sizes: List[int], entity_types: List[str], formats: List[str],
+                   data_dir: str, url_prefix: str = DEFAULT_URL_PREFIX, on_result=None) -> Dict:
+    """
+    Generate and import every size/entity/format combination, smallest first.
+
+    Peak RSS is process-wide and only grows, so sizes run in ascending order
+    and each result also reports how much the peak grew during that import.
+    """
+    results = []
+    for size in sorted(sizes):
+        for file_format in formats:
+            for entity_type in [entity for entity in ENTITY_ORDER if entity in entity_types]:
+                path = os.path.join(data_dir, f'{entity_type}_{size}.{file_format}')
+                if not os.path.exists(path):
+                    write_synthetic_file(path, entity_type, size, file_format, tag=f'{file_format.upper()}{size} ')
+                result = run_import(user, entity_type, path, file_format, size, url_prefix)
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+    return {
+        'generatedAt': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'gitCommit': git_commit(),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'results': results,
+    }
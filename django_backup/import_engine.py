@@ -0,0 +1,797 @@
+"""
+Bulk Import Engine
+Set-based processing of the spreadsheet imports sent by the frontend
+"""
+
+import hashlib
+import json
+import logging
+import uuid
+from collections import Counter
+from contextlib import nullcontext
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .analytics import invalidate_analytics
+from .import_reports import ErrorReportWriter
+from .import_validation import (
+    ActivityRowValidator, OrganizationRowValidator, RowValidator, TransactionRowValidator, chunked
+)
+from .models import (
+    AidProject, Country, Donor, FinancialTransaction, ImplementingOrganization, Organization, Sector
+)
+from .organization_index import OrganizationIndex, acronym, normalize_name
+from .portfolio_summary import (
+    apply_project_changes, donors_added, project_values, stored_project_values, summary_suspended
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Errors kept in memory (and returned in the response) when the full list is
+# streamed to an error report
+ERROR_PREVIEW_SIZE = 100
+
+# 'insert' always creates new records; 'upsert' updates the record matching
+# the engine's upsert keys and skips rows that have not changed
+IMPORT_MODES = ('insert', 'upsert')
+
+
+def build_field_mapping(mappings: List[Dict]) -> Dict[str, int]:
+    """Turn the frontend column mappings into a {system_field: column_index} dict"""
+    field_mapping = {}
+    for mapping in mappings:
+        if mapping['fileColumnIndex'] is not None:
+            field_mapping[mapping['systemFieldId']] = mapping['fileColumnIndex']
+    return field_mapping
+
+
+def content_hash(data: Dict) -> str:
+    """SHA-256 of a parsed import row, independent of key order"""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def country_defaults(name: str) -> Dict:
+    """Defaults for countries created on the fly by an import"""
+    return {
+        'iso_code': name[:3].upper(),
+        'region': 'Unknown',
+        'income_level': 'low'
+    }
+
+
+class LookupResolver:
+    """
+    Resolve names to model instances for a whole chunk at once.
+
+    Existing rows are fetched with a single `name__in` query, missing ones are
+    inserted with one `bulk_create` and fetched back. Resolved instances are
+    cached for the rest of the import. `on_create` is called with the number
+    of rows inserted, since bulk_create sends no signals.
+    """
+
+    def __init__(self, model, defaults: Callable[[str], Dict], on_create: Optional[Callable[[int], None]] = None):
+        self.model = model
+        self.defaults = defaults
+        self.on_create = on_create
+        self.cache: Dict[str, object] = {}
+
+    def resolve(self, names: Iterable[str]) -> Dict[str, object]:
+        missing = {name for name in names if name and name not in self.cache}
+        if missing:
+            self._load(missing)
+            missing -= self.cache.keys()
+        if missing:
+            self.model.objects.bulk_create(
+                [self.model(name=name, **self.defaults(name)) for name in missing],
+                ignore_conflicts=True
+            )
+            self._load(missing)
+            if self.on_create:
+                self.on_create(len(missing & self.cache.keys()))
+        return self.cache
+
+    def _load(self, names):
+        # Names are not unique on every lookup model, keep the oldest match
+        for obj in self.model.objects.filter(name__in=names).order_by('-pk'):
+            self.cache[obj.name] = obj
+
+    def reset(self):
+        self.cache.clear()
+
+
+class BaseImportEngine:
+    """
+    Chunked import driver shared by the bulk import endpoints.
+
+    Rows are consumed in fixed-size chunks; subclasses implement
+    `process_chunk` and report each row through `record_success` or
+    `record_error` so the per-row results match the legacy endpoints.
+    """
+
+    entity_label = 'row'
+    validator_class = RowValidator
+
+    # (model field, label) pairs that identify an existing record in upsert
+    # mode, tried in order; engines without keys only support inserts
+    upsert_keys: Sequence[Tuple[str, str]] = ()
+    # Model fields overwritten when an upsert updates an existing record
+    upsert_fields: Sequence[str] = ()
+    # Engines writing AidProject rows move PortfolioSummary once per write,
+    # since bulk_create and bulk_update send no signals
+    updates_portfolio_summary = False
+
+    def __init__(self, user, field_mapping: Dict[str, int], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 collect_ids: bool = True, mode: str = 'insert', batch_id: Optional[uuid.UUID] = None,
+                 error_report: Optional[ErrorReportWriter] = None):
+        self.check_mode(mode)
+        self.user = user
+        self.field_mapping = field_mapping
+        self.chunk_size = chunk_size
+        self.collect_ids = collect_ids
+        self.mode = mode
+        # Tags every record created by this import so it can be rolled back
+        self.batch_id = batch_id or uuid.uuid4()
+        # When set, every error is written to the report once its chunk is
+        # committed and only the first ERROR_PREVIEW_SIZE stay in `results`
+        self.error_report = error_report
+        self._reported_errors = 0
+        self.validator = self.build_validator(field_mapping)
+        self.resolvers: List[LookupResolver] = []
+        # Upsert keys already written by this import, with the row that used them
+        self.seen_keys: Dict[Tuple[str, str], int] = {}
+        self.total_rows = 0
+        self.results = {
+            'successful': 0,
+            'failed': 0,
+            'errors': [],
+            'importedIds': []
+        }
+        if mode == 'upsert':
+            self.results.update(created=0, updated=0, unchanged=0)
+
+    def run(self, rows: Iterable, start_row: int = 0,
+            on_chunk: Optional[Callable[['BaseImportEngine'], None]] = None) -> Dict:
+        """
+        Import every row and return the results dict.
+
+        `rows` may be a list or any iterable (e.g. a streamed upload) of dicts
+        or positional lists; only one chunk is held in memory at a time. Every chunk runs in its own
+        `transaction.atomic()` block: a savepoint when the caller holds a
+        transaction, otherwise a commit per chunk. `on_chunk` is called inside
+        that block so progress is recorded together with the rows it covers.
+        The first `start_row` rows are skipped when resuming an import.
+        """
+        if start_row:
+            rows = islice(rows, start_row, None)
+        try:
+            with summary_suspended() if self.updates_portfolio_summary else nullcontext():
+                for chunk in chunked(rows, self.chunk_size, start=start_row):
+                    with transaction.atomic():
+                        self._run_chunk(chunk)
+                        self.total_rows += len(chunk)
+                        if on_chunk:
+                            on_chunk(self)
+                    self.flush_errors()
+        finally:
+            # bulk_create sends no signals; committed chunks count even if a later one failed
+            transaction.on_commit(invalidate_analytics)
+        return self.results
+
+    def flush_errors(self):
+        """Write the errors of committed chunks to the report, keeping only a preview in memory"""
+        if self.error_report is None:
+            return
+        errors = self.results['errors']
+        self.error_report.write(errors[self._reported_errors:])
+        del errors[ERROR_PREVIEW_SIZE:]
+        self._reported_errors = len(errors)
+
+    def resume(self, rows_processed: int, rows_failed: int, created: int = 0, updated: int = 0, unchanged: int = 0):
+        """Carry over the counts of rows committed by an earlier run"""
+        self.total_rows = rows_processed
+        self.results['successful'] = rows_processed - rows_failed
+        self.results['failed'] = rows_failed
+        if self.mode == 'upsert':
+            self.results.update(created=created, updated=updated, unchanged=unchanged)
+
+    def _run_chunk(self, chunk: List[Tuple[int, Dict]]):
+        state = self._snapshot()
+        try:
+            with transaction.atomic():
+                self.process_chunk(chunk)
+            return
+        except DatabaseError as e:
+            logger.warning(f"{self.entity_label.capitalize()} chunk at row {chunk[0][0]} rolled back, retrying per row: {str(e)}")
+            self._restore(state)
+
+        # A database error rolled the whole chunk back; replay it one row per
+        # savepoint so only the offending rows are reported
+        for item in chunk:
+            state = self._snapshot()
+            try:
+                with transaction.atomic():
+                    self.process_chunk([item])
+            except DatabaseError as e:
+                self._restore(state)
+                self.record_error(item[0], str(e))
+
+    def _snapshot(self) -> Tuple[Dict[str, int], int, int, int]:
+        counts = {key: value for key, value in self.results.items() if isinstance(value, int)}
+        return counts, len(self.results['errors']), len(self.results['importedIds']), len(self.seen_keys)
+
+    def _restore(self, state: Tuple[Dict[str, int], int, int, int]):
+        counts, errors, imported_ids, seen_keys = state
+        self.results.update(counts)
+        del self.results['errors'][errors:]
+        del self.results['importedIds'][imported_ids:]
+        while len(self.seen_keys) > seen_keys:
+            self.seen_keys.popitem()
+        # Cached lookups may point at rows that were just rolled back
+        for resolver in self.resolvers:
+            resolver.reset()
+
+    def process_chunk(self, chunk: List[Tuple[int, Dict]]):
+        raise NotImplementedError
+
+    def add_resolver(self, model, defaults: Callable[[str], Dict], resolver_class=None, **options):
+        resolver = (resolver_class or LookupResolver)(model, defaults, **options)
+        self.resolvers.append(resolver)
+        return resolver
+
+    @classmethod
+    def check_mode(cls, mode: str):
+        """Raise ValueError unless this engine supports the import mode"""
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"Unknown import mode '{mode}'")
+        if mode == 'upsert' and not cls.upsert_keys:
+            raise ValueError(f"Upsert mode is not supported for {cls.entity_label} imports")
+
+    @classmethod
+    def build_validator(cls, field_mapping: Dict[str, int]) -> RowValidator:
+        """Database-free row validator, also used on its own for dry runs"""
+        return cls.validator_class(field_mapping)
+
+    def parse_chunk(self, chunk: List[Tuple[int, Dict]]) -> List[Tuple[int, Dict]]:
+        """Validate and convert a chunk, reporting the first problem of each invalid row"""
+        parsed = []
+        for idx, row in chunk:
+            data, errors = self.validator.parse(row)
+            if errors:
+                self.record_error(idx, **errors[0])
+            else:
+                parsed.append((idx, data))
+        return parsed
+
+    def record_success(self, obj, outcome: str = 'created'):
+        self.results['successful'] += 1
+        if outcome in self.results:
+            self.results[outcome] += 1
+        if self.collect_ids:
+            self.results['importedIds'].append(str(obj.id))
+
+    def record_error(self, idx: int, message: str, field: str = 'general', value=None):
+        self.results['failed'] += 1
+        self.results['errors'].append({
+            'row': idx + 2,  # +2 for header row and 0-index
+            'field': field,
+            'message': message,
+            'value': value
+        })
+        logger.error(f"Error importing {self.entity_label} row {idx}: {message}")
+
+    def save_objects(self, model, pending: List[Tuple[int, object]]):
+        """
+        Insert a chunk of unsaved instances with one `bulk_create`.
+
+        If the batch insert fails the chunk is retried row by row inside
+        savepoints so a single bad row is reported instead of failing the chunk.
+        """
+        if not pending:
+            return
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create([obj for _, obj in pending])
+        except DatabaseError as e:
+            logger.warning(f"Bulk insert of {len(pending)} {self.entity_label} rows failed, retrying per row: {str(e)}")
+            saved = []
+            for idx, obj in pending:
+                try:
+                    with transaction.atomic():
+                        obj.save()
+                except DatabaseError as row_error:
+                    self.record_error(idx, str(row_error))
+                else:
+                    self.record_success(obj)
+                    saved.append(obj)
+            self.update_summary(model, added=saved)
+            return
+
+        for _, obj in pending:
+            self.record_success(obj)
+        self.update_summary(model, added=[obj for _, obj in pending])
+
+    def update_summary(self, model, updated: Optional[Dict[int, Dict]] = None, added: Sequence[object] = ()):
+        """
+        Move PortfolioSummary by the AidProject rows just written.
+
+        `updated` holds the stored values of updated rows from before the
+        write; `added` are the instances written, new or updated. Runs in the
+        chunk's transaction, so a rolled back chunk leaves the summary alone.
+        """
+        if not self.updates_portfolio_summary or model is not AidProject:
+            return
+        removed = [updated[obj.pk] for obj in added if updated and obj.pk in updated]
+        apply_project_changes(removed, [project_values(obj) for obj in added])
+
+    def write_objects(self, model, pending: List[Tuple[int, object]]):
+        """Insert a chunk of unsaved instances, or upsert them in upsert mode"""
+        if self.mode == 'upsert':
+            self.upsert_objects(model, pending)
+        else:
+            self.save_objects(model, pending)
+
+    def upsert_objects(self, model, pending: List[Tuple[int, object]]):
+        """
+        Match a chunk of instances to existing records and write only what changed.
+
+        Existing records are looked up with one `IN` query per upsert key.
+        Rows whose `import_hash` matches the stored one are skipped, changed
+        rows are written with `bulk_update` and the rest with `bulk_create`.
+        A key used by an earlier row of the same import is reported as a
+        duplicate instead of silently overwriting that row. Rows without any
+        key, and rows whose keys match several records (say an IATI
+        identifier of one organization and the name of another), are
+        reported as errors since there is no single record to update.
+        """
+        keyed = [(idx, obj, [(field, getattr(obj, field)) for field, _ in self.upsert_keys if getattr(obj, field)])
+                 for idx, obj in pending]
+        existing = {}
+        for field, _ in self.upsert_keys:
+            values = {value for _, _, keys in keyed for key_field, value in keys if key_field == field}
+            if not values:
+                continue
+            matches = model.objects.filter(**{f'{field}__in': values}).values_list(field, 'pk', 'import_hash')
+            for value, pk, import_hash in matches:
+                existing.setdefault((field, value), []).append((pk, import_hash))
+
+        labels = dict(self.upsert_keys)
+        to_create, to_update = [], []
+        for idx, obj, keys in keyed:
+            if not keys:
+                field = self.upsert_keys[0][0]
+                self.record_error(idx, f"{' or '.join(labels.values())} is required in upsert mode", field)
+                continue
+            duplicate = next((key for key in keys if key in self.seen_keys), None)
+            if duplicate:
+                field, value = duplicate
+                self.record_error(idx, f"Duplicate {labels[field]} '{value}', already imported from row "
+                                       f"{self.seen_keys[duplicate] + 2}", field, value)
+                continue
+
+            matched = [key for key in keys if key in existing]
+            if len({pk for key in matched for pk, _ in existing[key]}) > 1:
+                field, value = matched[0]
+                described = ' and '.join(f"{labels[key_field]} '{key_value}'" for key_field, key_value in matched)
+                self.record_error(idx, f"{described[0].upper()}{described[1:]} "
+                                       f"{'match' if len(matched) > 1 else 'matches'} more than one "
+                                       f"{self.entity_label}", field, value)
+                continue
+            for key in keys:
+                self.seen_keys[key] = idx
+
+            if not matched:
+                to_create.append((idx, obj))
+                continue
+            obj.pk, stored_hash = existing[matched[0]][0]
+            if stored_hash == obj.import_hash:
+                self.record_success(obj, 'unchanged')
+            else:
+                to_update.append((idx, obj))
+
+        self.save_objects(model, to_create)
+        self.update_objects(model, to_update)
+
+    def update_objects(self, model, pending: List[Tuple[int, object]]):
+        """`bulk_update` a chunk of changed instances, falling back to per-row saves"""
+        if not pending:
+            return
+        # bulk_update does not apply auto_now, so set those fields here
+        auto_now = [field.name for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)]
+        fields = list(self.upsert_fields) + auto_now
+        now = timezone.now()
+        for _, obj in pending:
+            for name in auto_now:
+                setattr(obj, name, now)
+        before = stored_project_values(obj.pk for _, obj in pending) if model is AidProject else {}
+
+        try:
+            with transaction.atomic():
+                model.objects.bulk_update([obj for _, obj in pending], fields)
+        except DatabaseError as e:
+            logger.warning(f"Bulk update of {len(pending)} {self.entity_label} rows failed, retrying per row: {str(e)}")
+            saved = []
+            for idx, obj in pending:
+                try:
+                    with transaction.atomic():
+                        obj.save(update_fields=fields)
+                except DatabaseError as row_error:
+                    self.record_error(idx, str(row_error))
+                else:
+                    self.record_success(obj, 'updated')
+                    saved.append(obj)
+            self.update_summary(model, before, saved)
+            return
+
+        for _, obj in pending:
+            self.record_success(obj, 'updated')
+        self.update_summary(model, before, [obj for _, obj in pending])
+
+
+class ActivityImportEngine(BaseImportEngine):
+    """Bulk import of AidProject rows"""
+
+    entity_label = 'activity'
+    validator_class = ActivityRowValidator
+    updates_portfolio_summary = True
+    upsert_keys = (('iati_identifier', 'IATI identifier'), ('prism_id', 'PRISM ID'))
+    # default_modality is left alone: it depends only on fields the import does
+    # not write, and may have been overridden by hand
+    upsert_fields = ('title', 'description', 'donor', 'implementing_org', 'activity_status',
+                     'start_date_planned', 'end_date_planned', 'recipient_country', 'sector',
+                     'total_budget', 'iati_identifier', 'prism_id', 'import_hash')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.donors = self.add_resolver(Donor, lambda name: {
+            'code': name[:20].upper().replace(' ', '_')
+        }, on_create=donors_added)
+        self.countries = self.add_resolver(Country, country_defaults)
+        self.implementing_orgs = self.add_resolver(ImplementingOrganization, lambda name: {
+            'org_type': 'other'
+        })
+        self.sectors = self.add_resolver(Sector, lambda name: {
+            'code': name[:10].upper().replace(' ', '_'),
+            'category': 'Other'
+        })
+
+    def process_chunk(self, chunk: List[Tuple[int, Dict]]):
+        parsed = self.parse_chunk(chunk)
+
+        # Find or create related objects for the whole chunk
+        donors = self.donors.resolve(data['donor_name'] for _, data in parsed)
+        countries = self.countries.resolve(data['recipient_country_name'] for _, data in parsed)
+        implementing_orgs = self.implementing_orgs.resolve(data.get('implementing_org_name') for _, data in parsed)
+        sectors = self.sectors.resolve(data.get('sector_name') for _, data in parsed)
+
+        pending = []
+        for idx, activity_data in parsed:
+            donor = donors.get(activity_data['donor_name'])
+            if donor is None:
+                self.record_error(idx, f"Could not create donor '{activity_data['donor_name']}'")
+                continue
+            country = countries.get(activity_data['recipient_country_name'])
+            if country is None:
+                self.record_error(idx, f"Could not create country '{activity_data['recipient_country_name']}'")
+                continue
+
+            impl_org = None
+            if activity_data.get('implementing_org_name'):
+                impl_org = implementing_orgs.get(activity_data['implementing_org_name'])
+
+            sector = None
+            if activity_data.get('sector_name'):
+                sector = sectors.get(activity_data['sector_name'])
+                if sector is None:
+                    self.record_error(idx, f"Could not create sector '{activity_data['sector_name']}'")
+                    continue
+
+            activity = AidProject(
+                iati_identifier=activity_data.get('iati_identifier') or None,
+                prism_id=activity_data.get('prism_id') or None,
+                title=activity_data['title'],
+                description=activity_data.get('description', ''),
+                donor=donor,
+                implementing_org=impl_org,
+                activity_status=activity_data.get('activity_status', 'pipeline'),
+                start_date_planned=activity_data['start_date_planned'],
+                end_date_planned=activity_data['end_date_planned'],
+                recipient_country=country,
+                sector=sector,
+                total_budget=activity_data['total_budget'],
+                currency='USD',
+                created_by=self.user,
+                import_hash=content_hash(activity_data),
+                import_batch=self.batch_id
+            )
+            # bulk_create bypasses AidProject.save()
+            activity.default_modality = activity.calculate_modality()
+            pending.append((idx, activity))
+
+        self.write_objects(AidProject, pending)
+
+
+class OrganizationImportEngine(BaseImportEngine):
+    """Bulk import of Organization rows"""
+
+    entity_label = 'organization'
+    validator_class = OrganizationRowValidator
+    upsert_keys = (('iati_identifier', 'IATI identifier'), ('name', 'name'))
+    upsert_fields = ('name', 'short_name', 'iati_identifier', 'organization_type', 'description', 'website',
+                     'contact_email', 'country', 'import_hash')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.countries = self.add_resolver(Country, country_defaults)
+
+    def process_chunk(self, chunk: List[Tuple[int, Dict]]):
+        parsed = self.parse_chunk(chunk)
+
+        countries = self.countries.resolve(data.get('country_name') for _, data in parsed)
+
+        pending = []
+        for idx, org_data in parsed:
+            country = None
+            if org_data.get('country_name'):
+                country = countries.get(org_data['country_name'])
+                if country is None:
+                    self.record_error(idx, f"Could not create country '{org_data['country_name']}'")
+                    continue
+
+            pending.append((idx, Organization(
+                name=org_data['name'],
+                short_name=org_data.get('short_name', ''),
+                iati_identifier=org_data.get('iati_identifier') if org_data.get('iati_identifier') else None,
+                organization_type=org_data['organization_type'].lower(),
+                description=org_data.get('description', ''),
+                website=org_data.get('website', ''),
+                contact_email=org_data.get('contact_email', ''),
+                country=country,
+                created_by=self.user,
+                import_hash=content_hash(org_data),
+                import_batch=self.batch_id
+            )))
+
+        self.write_objects(Organization, pending)
+
+
+class OrganizationResolver:
+    """
+    Resolve free-text provider/receiver names to organizations, a chunk at a time.
+
+    Names are matched against an OrganizationIndex of every organization's
+    name, short name and IATI identifier, loaded with one query on first use.
+    Only exact and acronym matches are linked, so "UNDP" finds "United
+    Nations Development Programme" and vice versa. Names matching several
+    organizations are left unresolved and `get` raises for them. Every other
+    name creates an organization, with one `bulk_create` per chunk; names of
+    the same chunk that match each other exactly or by acronym create a
+    single one. Fuzzy matches are never linked: they are kept in `matches`
+    as suggestions for the organizations created, next to the ambiguous
+    names, for review.
+    """
+
+    def __init__(self, model, defaults: Callable[[str], Dict]):
+        self.model = model
+        self.defaults = defaults
+        self.index: Optional[OrganizationIndex] = None
+        # None for names left unresolved as ambiguous
+        self.cache: Dict[str, Optional[int]] = {}
+        self.matches: Dict[str, Dict] = {}
+
+    def resolve(self, names: Iterable[str]) -> Dict[str, Optional[int]]:
+        """{name: organization id} covering every name of the chunk"""
+        counts = Counter(name for name in names if name and name not in self.cache)
+        if not counts:
+            return self.cache
+        if self.index is None:
+            self.index = OrganizationIndex.load(self.model.objects.all())
+
+        unresolved = {}
+        for name, (org_id, match_type, candidates) in self.index.resolve(counts).items():
+            if match_type == 'ambiguous':
+                self.ambiguous(name, candidates)
+            elif org_id is None:
+                unresolved[name] = candidates
+            else:
+                self.cache[name] = org_id
+
+        if unresolved:
+            # Full names first, so an acronym joins the name it stands for
+            clusters = self.cluster(sorted(
+                unresolved, key=lambda name: (not acronym(normalize_name(name)), -counts[name], name)))
+            for name in unresolved.keys() - {variant for variants in clusters.values() for variant in variants}:
+                self.ambiguous(name, unresolved[name])
+
+            self.model.objects.bulk_create([
+                self.model(name=name, short_name=self.short_name(name, variants[1:]), **self.defaults(name))
+                for name, variants in clusters.items()
+            ], ignore_conflicts=True)
+            created = self.model.objects.filter(name__in=clusters).values_list(
+                'id', 'name', 'short_name', 'iati_identifier')
+            for org_id, name, short_name, iati_identifier in created:
+                self.index.add(org_id, name, short_name, iati_identifier)
+                for variant in clusters[name]:
+                    self.index.add(org_id, variant)
+                    self.cache[variant] = org_id
+                if unresolved[name]:
+                    self.matches[name] = {'name': name, 'status': 'created', 'organizationId': org_id,
+                                          'candidates': unresolved[name]}
+        return self.cache
+
+    def ambiguous(self, name: str, candidates: List[Dict]):
+        self.cache[name] = None
+        self.matches[name] = {'name': name, 'status': 'ambiguous', 'organizationId': None,
+                              'candidates': candidates}
+
+    def get(self, name: Optional[str]) -> Optional[int]:
+        """Organization id of a name resolved with `resolve`; raises ValueError for an ambiguous name"""
+        if not name:
+            return None
+        org_id = self.cache.get(name)
+        if org_id is None:
+            listed = ', '.join(f"'{candidate['name']}'" for candidate in self.matches.get(name, {}).get('candidates', []))
+            raise ValueError(f"Organization '{name}' matches more than one organization"
+                             + (f": {listed}" if listed else ''))
+        return org_id
+
+    @staticmethod
+    def short_name(name: str, variants: List[str]) -> str:
+        """The variant of a new organization that is its name's acronym, if any"""
+        initials = acronym(normalize_name(name))
+        return next((variant for variant in variants
+                     if initials and normalize_name(variant).replace(' ', '') == initials), '')
+
+    @staticmethod
+    def cluster(names: List[str]) -> Dict[str, List[str]]:
+        """
+        Group names that match each other exactly or by acronym, in order.
+
+        Returns {name to create: [name, variant, ...]}. Each name joins the
+        first earlier name it matches, so "UNDP" becomes a variant of an
+        earlier "United Nations Development Programme". Names matching
+        several earlier names are left out of every group.
+        """
+        index = OrganizationIndex()
+        clusters: Dict[str, List[str]] = {}
+        for position, name in enumerate(names):
+            match, match_type, _ = index.match(name)
+            if match_type in ('exact', 'acronym'):
+                clusters[names[match]].append(name)
+            elif match_type != 'ambiguous':
+                clusters[name] = [name]
+                index.add(position, name)
+        return clusters
+
+    def reset(self):
+        # Organizations created by a rolled back chunk are gone; rebuild the index
+        self.cache.clear()
+        self.index = None
+
+
+class ProjectResolver:
+    """
+    Resolve the activity each transaction row belongs to, a chunk at a time.
+
+    Rows may reference the activity by IATI identifier, PRISM id or title.
+    Each kind of key is resolved with one `IN` query per chunk and cached for
+    the rest of the import. Titles are not unique, so a title shared by
+    several activities is reported as ambiguous instead of raising.
+    """
+
+    # (row field, AidProject field, label used in error messages)
+    KEYS = [
+        ('project_iati_identifier', 'iati_identifier', 'IATI identifier'),
+        ('project_prism_id', 'prism_id', 'PRISM ID'),
+        ('project_title', 'title', 'title'),
+    ]
+
+    AMBIGUOUS = object()
+
+    def __init__(self):
+        # {AidProject field: {value: project id, AMBIGUOUS or None when not found}}
+        self.cache: Dict[str, Dict[str, object]] = {field: {} for _, field, _ in self.KEYS}
+
+    def prefetch(self, rows: Iterable[Dict]):
+        """Load every key referenced by a chunk of parsed rows"""
+        rows = list(rows)
+        for row_field, field, _ in self.KEYS:
+            cache = self.cache[field]
+            values = {row[row_field] for row in rows if row.get(row_field) and row[row_field] not in cache}
+            if not values:
+                continue
+            for value, project_id in AidProject.objects.filter(**{f'{field}__in': values}).values_list(field, 'id'):
+                cache[value] = self.AMBIGUOUS if value in cache else project_id
+            for value in values - cache.keys():
+                cache[value] = None
+
+    def resolve(self, data: Dict) -> int:
+        """Project id for a parsed row; call `prefetch` for its chunk first"""
+        ambiguous = None
+        for row_field, field, label in self.KEYS:
+            value = data.get(row_field)
+            if not value:
+                continue
+            project_id = self.cache[field].get(value)
+            if project_id is self.AMBIGUOUS:
+                ambiguous = ambiguous or f"Activity {label} '{value}' matches more than one activity"
+            elif project_id is not None:
+                return project_id
+
+        if ambiguous:
+            raise ValueError(ambiguous)
+        if data.get('project_iati_identifier') or data.get('project_prism_id'):
+            keys = ', '.join(f"{label} '{data[row_field]}'" for row_field, _, label in self.KEYS if data.get(row_field))
+            raise ValueError(f"Activity with {keys} not found")
+        raise ValueError(f"Activity '{data['project_title']}' not found")
+
+
+class TransactionImportEngine(BaseImportEngine):
+    """Bulk import of FinancialTransaction rows"""
+
+    entity_label = 'transaction'
+    validator_class = TransactionRowValidator
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.projects = ProjectResolver()
+        self.organizations = self.add_resolver(Organization, lambda name: {
+            'organization_type': 'other',
+            'created_by': self.user,
+            'import_batch': self.batch_id
+        }, resolver_class=OrganizationResolver)
+
+    @classmethod
+    def build_validator(cls, field_mapping: Dict[str, int]) -> RowValidator:
+        return cls.validator_class(
+            field_mapping,
+            transaction_types=[code for code, _ in FinancialTransaction.TRANSACTION_TYPE_CHOICES],
+            currencies=[code for code, _ in FinancialTransaction.CURRENCY_CHOICES]
+        )
+
+    def run(self, *args, **kwargs) -> Dict:
+        results = super().run(*args, **kwargs)
+        results['organizationMatches'] = list(self.organizations.matches.values())
+        return results
+
+    def process_chunk(self, chunk: List[Tuple[int, Dict]]):
+        parsed = self.parse_chunk(chunk)
+
+        # Find the projects and organizations for the whole chunk
+        self.projects.prefetch(data for _, data in parsed)
+        self.organizations.resolve(
+            name for _, data in parsed
+            for name in (data.get('provider_organization_name'), data.get('receiver_organization_name'))
+        )
+
+        pending = []
+        for idx, trans_data in parsed:
+            try:
+                pending.append((idx, FinancialTransaction(
+                    project_id=self.projects.resolve(trans_data),
+                    transaction_type=trans_data['transaction_type'],
+                    amount=trans_data['amount'],
+                    currency=trans_data['currency'],
+                    transaction_date=trans_data['transaction_date'],
+                    provider_organization_id=self.organizations.get(trans_data.get('provider_organization_name')),
+                    receiver_organization_id=self.organizations.get(trans_data.get('receiver_organization_name')),
+                    description=trans_data.get('description', ''),
+                    reference=trans_data.get('reference', ''),
+                    created_by=self.user,
+                    import_batch=self.batch_id
+                )))
+            except Exception as e:
+                self.record_error(idx, str(e))
+
+        self.save_objects(FinancialTransaction, pending)
+
+
+IMPORT_ENGINES = {
+    'activities': ActivityImportEngine,
+    'organizations': OrganizationImportEngine,
+    'transactions': TransactionImportEngine,
+}
@@ -0,0 +1,218 @@
+"""
+Background Import Jobs
+Queue bulk imports as files on disk and run them outside the request/response cycle
+"""
+
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from django.utils import timezone
+
+from .import_engine import IMPORT_ENGINES, build_field_mapping
+from .import_reports import ErrorReportWriter, attach_error_report, error_report_url
+from .import_streams import (
+    MULTIPART_CONTENT_TYPE, get_stream_source, is_streaming_request, iter_rows, payload_rows
+)
+from .models import ImportJob, ImportLog
+
+logger = logging.getLogger(__name__)
+
+# A running job whose progress has not moved for this long is assumed to
+# belong to a worker that died, and can be resumed
+STALE_JOB_TIMEOUT = timedelta(minutes=15)
+
+
+def create_import_job(request, entity_type: str) -> ImportJob:
+    """
+    Store the request payload and queue it as an ImportJob.
+
+    Streaming uploads are copied to storage chunk by chunk without being
+    parsed; JSON payloads are re-written as NDJSON so the worker reads every
+    job the same way.
+    """
+    if is_streaming_request(request):
+        source, mappings, file_name, file_format = get_stream_source(request)
+        if request.content_type != MULTIPART_CONTENT_TYPE:
+            source = File(request, name=file_name)
+    else:
+        data = json.loads(request.body)
+        mappings = data.get('mappings', [])
+        file_name = data.get('fileName', 'Unknown')
+        file_format = 'ndjson'
+        source = ContentFile('\n'.join(json.dumps(row) for row in payload_rows(data)))
+
+    import_mode = request.GET.get('mode', 'insert')
+    IMPORT_ENGINES[entity_type].check_mode(import_mode)
+    
+    job = ImportJob(
+        entity_type=entity_type,
+        file_name=file_name,
+        file_format=file_format,
+        import_mode=import_mode,
+        field_mappings=mappings,
+        user=request.user
+    )
+    job.file.save(f"{entity_type}.{file_format}", source, save=False)
+    job.file_hash = hash_file(job.file)
+
+    previous = find_resumable_job(job)
+    if previous:
+        # Same file as an interrupted import: drop the new copy and pick up
+        # the earlier job from its last committed chunk
+        job.file.delete(save=False)
+        ImportJob.objects.filter(pk=previous.pk).update(
+            status='queued',
+            error_message='',
+            finished_at=None,
+            updated_at=timezone.now()
+        )
+        previous.refresh_from_db()
+        logger.info(f"Resuming {entity_type} import job {previous.id} from row {previous.rows_processed}")
+        return previous
+
+    job.save()
+    logger.info(f"Queued {entity_type} import job {job.id} for {file_name}")
+    return job
+
+
+def hash_file(field_file) -> str:
+    """SHA-256 of a stored file, read in chunks"""
+    digest = hashlib.sha256()
+    with field_file.open('rb') as f:
+        for chunk in f.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_resumable_job(job: ImportJob) -> Optional[ImportJob]:
+    """Earlier failed or abandoned job for the same user, entity type, mode and file contents"""
+    stale_before = timezone.now() - STALE_JOB_TIMEOUT
+    return (ImportJob.objects
+            .filter(entity_type=job.entity_type, import_mode=job.import_mode, file_hash=job.file_hash,
+                    user=job.user, rows_processed__gt=0)
+            .filter(Q(status='failed') | Q(status='running', updated_at__lt=stale_before))
+            .order_by('-created_at')
+            .first())
+
+
+def claim_next_job() -> Optional[ImportJob]:
+    """
+    Mark the oldest queued job as running and return it.
+
+    The status check is part of the UPDATE so several workers can poll the
+    same table without picking up the same job.
+    """
+    for job in ImportJob.objects.filter(status='queued').order_by('created_at')[:10]:
+        if claim_job(job):
+            return job
+    return None
+
+
+def claim_job(job: ImportJob) -> bool:
+    """Move a queued job to running; False if another worker got there first"""
+    claimed = ImportJob.objects.filter(pk=job.pk, status='queued').update(
+        status='running',
+        started_at=timezone.now(),
+        updated_at=timezone.now()
+    )
+    if claimed:
+        job.refresh_from_db()
+    return bool(claimed)
+
+
+def run_import_job(job: ImportJob):
+    """
+    Run a claimed job, committing and checkpointing after every chunk.
+
+    Rows before `rows_processed` were committed by an earlier run of the job
+    and are skipped.
+    """
+    engine = IMPORT_ENGINES[job.entity_type](
+        job.user, build_field_mapping(job.field_mappings or []), collect_ids=False, mode=job.import_mode,
+        batch_id=job.batch_id, error_report=open_job_error_report(job)
+    )
+    engine.resume(job.rows_processed, job.rows_failed, created=job.rows_created, updated=job.rows_updated,
+                  unchanged=job.rows_unchanged)
+
+    def record_progress(engine):
+        job.rows_processed = engine.total_rows
+        job.rows_failed = engine.results['failed']
+        job.rows_created = engine.results.get('created', 0)
+        job.rows_updated = engine.results.get('updated', 0)
+        job.rows_unchanged = engine.results.get('unchanged', 0)
+        job.save(update_fields=['rows_processed', 'rows_failed', 'rows_created', 'rows_updated', 'rows_unchanged',
+                                'updated_at'])
+
+    try:
+        with job.file.open('rb') as source:
+            results = engine.run(iter_rows(source, job.file_format), start_row=job.rows_processed,
+                                 on_chunk=record_progress)
+    except Exception as e:
+        logger.error(f"Import job {job.id} failed: {str(e)}", exc_info=True)
+        job.status = 'failed'
+        job.error_message = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error_message', 'finished_at', 'updated_at'])
+        engine.error_report.close()
+        return
+
+    job.import_log = ImportLog.objects.create(
+        entity_type=job.entity_type,
+        file_name=job.file_name,
+        total_rows=engine.total_rows,
+        successful_rows=results['successful'],
+        failed_rows=results['failed'],
+        user=job.user,
+        field_mappings=job.field_mappings,
+        error_log=engine.error_report.preview(100),  # Store first 100 errors, earlier runs included
+        batch_id=job.batch_id
+    )
+    attach_error_report(job.import_log, engine.error_report)
+    job.error_report.delete(save=False)
+    job.status = 'completed'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['import_log', 'error_report', 'status', 'finished_at', 'updated_at'])
+    logger.info(f"Import job {job.id} completed: {results['successful']} imported, {results['failed']} failed")
+
+
+def open_job_error_report(job: ImportJob) -> ErrorReportWriter:
+    """
+    Error report of a job, kept in storage so a resumed run appends to it.
+
+    Errors are appended once their chunk has committed, so rows rolled back
+    by a failed run are not reported twice when the job is resumed.
+    """
+    if not job.error_report:
+        job.error_report.save(f'job_{job.id}_errors.ndjson', ContentFile(b''), save=False)
+        job.save(update_fields=['error_report', 'updated_at'])
+    return ErrorReportWriter(job.error_report.path)
+
+
+def job_status(job: ImportJob) -> Dict:
+    """Progress payload returned to the frontend for polling"""
+    return {
+        'id': job.id,
+        'entityType': job.entity_type,
+        'status': job.status,
+        'fileName': job.file_name,
+        'mode': job.import_mode,
+        'rowsProcessed': job.rows_processed,
+        'rowsFailed': job.rows_failed,
+        'rowsSucceeded': job.rows_processed - job.rows_failed,
+        'rowsCreated': job.rows_created,
+        'rowsUpdated': job.rows_updated,
+        'rowsUnchanged': job.rows_unchanged,
+        'throughput': round(job.throughput, 1),
+        'createdAt': job.created_at.isoformat(),
+        'startedAt': job.started_at.isoformat() if job.started_at else None,
+        'finishedAt': job.finished_at.isoformat() if job.finished_at else None,
+        'importLogId': job.import_log_id,
+        'errorReportUrl': error_report_url(job.import_log),
+        'error': job.error_message or None,
+    }
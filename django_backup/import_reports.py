@@ -0,0 +1,108 @@
+"""
+Import Error Reports
+Stream every per-row import error to a file instead of keeping them in memory
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from django.core.files import File
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+REPORT_COLUMNS = ['row', 'field', 'value', 'message']
+
+
+class ErrorReportWriter:
+    """
+    Append import errors to an NDJSON file as the import runs.
+
+    By default the file is a temporary one created on the first error, so
+    clean imports never touch the disk, and `attach_error_report` stores it
+    on the ImportLog when the import finishes. With `path`, errors are
+    appended to that file instead and flushed after every write, so a
+    background job resumed after a failure carries on the same report.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.file = None
+        self.count = 0
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                self.count = sum(1 for line in f if line.strip())
+
+    def open(self):
+        if self.file is None:
+            self.file = open(self.path, 'a+b') if self.path else tempfile.TemporaryFile()
+        return self.file
+
+    def write(self, errors: List[Dict]):
+        if not errors:
+            return
+        file = self.open()
+        file.write(''.join(json.dumps(error, default=str) + '\n' for error in errors).encode('utf-8'))
+        if self.path:
+            file.flush()
+        self.count += len(errors)
+
+    def preview(self, limit: int) -> List[Dict]:
+        """The first `limit` errors of the report, including those of earlier runs"""
+        if not self.count:
+            return []
+        file = self.open()
+        file.seek(0)
+        errors = [json.loads(line) for line in islice(file, limit) if line.strip()]
+        file.seek(0, os.SEEK_END)
+        return errors
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def attach_error_report(import_log, report: ErrorReportWriter):
+    """Save the report file on the ImportLog, if the import had any errors"""
+    if report is None:
+        return
+    try:
+        if report.count:
+            file = report.open()
+            file.seek(0)
+            import_log.error_report.save(f'import_{import_log.id}_errors.ndjson', File(file))
+    finally:
+        report.close()
+
+
+def error_report_url(import_log) -> Optional[str]:
+    """Download URL of an ImportLog's error report, or None when it has none"""
+    if import_log is None or not import_log.error_report:
+        return None
+    return reverse('import_error_report', args=[import_log.id])
+
+
+def iter_report_csv(lines: Iterable[bytes]) -> Iterator[str]:
+    """Convert a stored NDJSON error report to CSV one line at a time"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=REPORT_COLUMNS, extrasaction='ignore')
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    writer.writeheader()
+    yield flush()
+    for line in lines:
+        if line.strip():
+            writer.writerow(json.loads(line))
+            yield flush()
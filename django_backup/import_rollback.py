@@ -0,0 +1,107 @@
+"""
+Bulk Import Rollback
+Delete the records a bulk import created, using the batch id they were tagged with
+"""
+
+import logging
+from typing import Dict, List, Set, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from .analytics import invalidate_analytics
+from .models import AidProject, FinancialCommitment, FinancialTransaction, ImportLog, Organization
+from .portfolio_summary import apply_project_changes, stored_project_values, summary_suspended
+
+logger = logging.getLogger(__name__)
+
+ROLLBACK_CHUNK_SIZE = 5000
+
+# Dependants first: transactions are removed before the activities and
+# organizations they reference, so only references from outside the batch remain
+ROLLBACK_MODELS = [
+    ('transactions', FinancialTransaction),
+    ('commitments', FinancialCommitment),
+    ('activities', AidProject),
+    ('organizations', Organization),
+]
+
+
+def rollback_import(import_log: ImportLog,
+                    chunk_size: int = ROLLBACK_CHUNK_SIZE) -> Tuple[Dict[str, int], Dict[str, List[int]]]:
+    """
+    Delete every record created by an import and mark its log as rolled back.
+
+    Each chunk of primary keys is deleted in its own transaction, so locks are
+    held briefly and an interrupted rollback can simply be run again. Records
+    that an upsert import only updated are left as they are, since their
+    previous values are not stored. Batch records that something outside the
+    batch now references (a hand-entered budget, a later import's transaction,
+    a user role) are kept, since deleting them would cascade to or unlink that
+    data. Returns the number of rows deleted and the ids kept per entity type.
+    """
+    if import_log.batch_id is None:
+        raise ValueError("This import was not tagged with a batch id and cannot be rolled back")
+    if import_log.rolled_back_at:
+        raise ValueError("This import has already been rolled back")
+
+    deleted, kept = {}, {}
+    # The summary moves once per deleted chunk rather than per deleted activity
+    with summary_suspended():
+        for label, model in ROLLBACK_MODELS:
+            deleted[label], kept[label] = delete_batch(model, import_log.batch_id, chunk_size)
+    transaction.on_commit(invalidate_analytics)
+
+    import_log.rolled_back_at = timezone.now()
+    import_log.save(update_fields=['rolled_back_at'])
+    logger.info(f"Rolled back {import_log.entity_type} import {import_log.id}: {deleted}")
+    if any(kept.values()):
+        logger.warning(f"Kept records of import {import_log.id} referenced outside the batch: {kept}")
+    return deleted, kept
+
+
+def delete_batch(model, batch_id, chunk_size: int = ROLLBACK_CHUNK_SIZE) -> Tuple[int, List[int]]:
+    """
+    Delete the rows of one model created by an import batch, `chunk_size` at a time.
+
+    Returns the number of rows deleted and the ids of the rows kept because
+    records outside the batch reference them.
+    """
+    batch = model.objects.filter(import_batch=batch_id).order_by('pk')
+    total, kept, last_pk = 0, [], None
+    while True:
+        page = batch if last_pk is None else batch.filter(pk__gt=last_pk)
+        pks = list(page.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return total, kept
+        last_pk = pks[-1]
+        with transaction.atomic():
+            referenced = external_references(model, pks, batch_id)
+            deletable = [pk for pk in pks if pk not in referenced]
+            removed = stored_project_values(deletable).values() if model is AidProject else ()
+            model.objects.filter(pk__in=deletable).delete()
+            apply_project_changes(removed=removed)
+        kept.extend(pk for pk in pks if pk in referenced)
+        total += len(deletable)
+
+
+def external_references(model, pks: List[int], batch_id) -> Set[int]:
+    """
+    Which of `pks` are referenced by rows that do not belong to the batch.
+
+    Every foreign key to `model` is checked. Rows of a model with an
+    `import_batch` field belong to the batch when tagged with it; rows of
+    other models (user roles, milestones, documents) never do.
+    """
+    referenced = set()
+    for relation in model._meta.related_objects:
+        if relation.many_to_many:
+            continue
+        related = relation.related_model
+        column = relation.field.name
+        rows = related.objects.filter(**{f'{column}__in': pks})
+        if any(field.name == 'import_batch' for field in related._meta.concrete_fields):
+            # exclude() keeps rows whose import_batch is NULL
+            rows = rows.exclude(import_batch=batch_id)
+        referenced.update(rows.order_by().values_list(column, flat=True).distinct())
+    return referenced
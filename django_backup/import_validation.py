@@ -0,0 +1,228 @@
+"""
+Bulk Import Validation
+Database-free row checks shared by the import engine and the parallel dry-run mode
+
+Nothing in this module touches models or the database, so validators can be
+pickled and run in worker processes.
+"""
+
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Rows per task sent to a worker process
+VALIDATION_CHUNK_SIZE = 5000
+
+# Transaction rows can name their activity by any of these fields
+PROJECT_KEY_FIELDS = ('project_iati_identifier', 'project_prism_id', 'project_title')
+
+
+def compile_extractor(field_mapping: Dict[str, int], sample_row) -> Callable[[Any], Dict]:
+    """
+    Build the per-row extractor for a column mapping.
+
+    The mapping is resolved once against the first row of the file: positional
+    rows (lists from CSV files or columnar payloads) are read with a single
+    itemgetter, dict rows by the column names found at the mapped positions.
+    """
+    fields = list(field_mapping)
+    if not fields:
+        return lambda row: {}
+
+    if isinstance(sample_row, dict):
+        header = list(sample_row.keys())
+        columns = [(field, header[col_index]) for field, col_index in field_mapping.items()]
+        return lambda row: {field: row.get(column_name) for field, column_name in columns}
+
+    getter = itemgetter(*field_mapping.values())
+    if len(fields) == 1:
+        field = fields[0]
+        return lambda row: {field: getter(row)}
+    return lambda row: dict(zip(fields, getter(row)))
+
+
+class RowValidator:
+    """
+    Extract, check and convert the rows of one import.
+
+    `parse` returns the converted row together with every problem found in it,
+    each as a {'field', 'message', 'value'} dict.
+    """
+
+    REQUIRED_FIELDS: Sequence[str] = ()
+    REQUIRED_MESSAGES: Dict[str, str] = {}
+    DATE_FIELDS: Sequence[str] = ()
+    DECIMAL_FIELDS: Sequence[str] = ()
+
+    def __init__(self, field_mapping: Dict[str, int]):
+        self.field_mapping = field_mapping
+        self._extractor = None
+
+    def __getstate__(self):
+        # The compiled extractor is a closure; workers rebuild it on first use
+        state = self.__dict__.copy()
+        state['_extractor'] = None
+        return state
+
+    def extract(self, row) -> Dict:
+        if self._extractor is None:
+            self._extractor = compile_extractor(self.field_mapping, row)
+        return self._extractor(row)
+
+    def parse(self, row) -> Tuple[Dict, List[Dict]]:
+        try:
+            data = self.extract(row)
+        except (IndexError, KeyError, TypeError) as e:
+            return {}, [self.error('general', f"Row does not match the column mapping: {str(e)}")]
+
+        errors = []
+        for field in self.REQUIRED_FIELDS:
+            if not data.get(field):
+                errors.append(self.error(field, self.REQUIRED_MESSAGES.get(field, f"{field} is required")))
+
+        for field in self.DATE_FIELDS:
+            if data.get(field):
+                try:
+                    data[field] = datetime.strptime(data[field], '%Y-%m-%d').date()
+                except (TypeError, ValueError) as e:
+                    errors.append(self.error(field, str(e), data[field]))
+
+        for field in self.DECIMAL_FIELDS:
+            if data.get(field):
+                try:
+                    data[field] = Decimal(str(data[field]))
+                except InvalidOperation:
+                    errors.append(self.error(field, f"{field} must be a number", data[field]))
+
+        self.check(data, errors)
+        return data, errors
+
+    def check(self, data: Dict, errors: List[Dict]):
+        """Entity-specific checks, appending to `errors`"""
+
+    @staticmethod
+    def error(field: str, message: str, value=None) -> Dict:
+        return {'field': field, 'message': message, 'value': value}
+
+    def validate_chunk(self, chunk: List[Tuple[int, Any]]) -> List[Dict]:
+        """Every error in a chunk of (row_index, row) pairs, with spreadsheet row numbers"""
+        errors = []
+        for idx, row in chunk:
+            for error in self.parse(row)[1]:
+                error['row'] = idx + 2  # +2 for header row and 0-index
+                errors.append(error)
+        return errors
+
+
+class ActivityRowValidator(RowValidator):
+    REQUIRED_FIELDS = ('title', 'donor_name', 'start_date_planned', 'end_date_planned',
+                       'total_budget', 'recipient_country_name')
+    DATE_FIELDS = ('start_date_planned', 'end_date_planned')
+    DECIMAL_FIELDS = ('total_budget',)
+
+
+class OrganizationRowValidator(RowValidator):
+    REQUIRED_FIELDS = ('name', 'organization_type')
+    REQUIRED_MESSAGES = {
+        'name': "Organization name is required",
+        'organization_type': "Organization type is required",
+    }
+
+
+class TransactionRowValidator(RowValidator):
+    REQUIRED_FIELDS = ('transaction_date', 'amount', 'transaction_type')
+    DATE_FIELDS = ('transaction_date',)
+    DECIMAL_FIELDS = ('amount',)
+
+    def __init__(self, field_mapping: Dict[str, int], transaction_types: Iterable[str] = (),
+                 currencies: Iterable[str] = ()):
+        super().__init__(field_mapping)
+        self.transaction_types = frozenset(transaction_types)
+        self.currencies = frozenset(currencies)
+
+    def check(self, data: Dict, errors: List[Dict]):
+        if not any(data.get(field) for field in PROJECT_KEY_FIELDS):
+            errors.insert(0, self.error('project_title', "project_title is required"))
+
+        if data.get('transaction_type'):
+            transaction_type = str(data['transaction_type']).lower()
+            if self.transaction_types and transaction_type not in self.transaction_types:
+                errors.append(self.error('transaction_type', f"Unknown transaction type '{data['transaction_type']}'",
+                                         data['transaction_type']))
+            data['transaction_type'] = transaction_type
+
+        currency = str(data.get('currency') or 'USD').upper()
+        if self.currencies and currency not in self.currencies:
+            errors.append(self.error('currency', f"Unsupported currency '{data['currency']}'", data['currency']))
+        data['currency'] = currency
+
+
+def chunked(rows: Iterable, size: int, start: int = 0) -> Iterator[List[Tuple[int, Any]]]:
+    """Yield lists of (row_index, row) pairs of at most `size` items"""
+    iterator = enumerate(rows, start)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def validate_rows(validator: RowValidator, rows: Iterable, workers: Optional[int] = None,
+                  chunk_size: int = VALIDATION_CHUNK_SIZE) -> Dict:
+    """
+    Validate every row without touching the database.
+
+    Chunks are spread over a process pool once there is more than one chunk of
+    work; at most two chunks per worker are in flight, so streamed uploads are
+    not read into memory ahead of the workers. Returns the dry-run summary
+    with the full error list in row order.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = chunked(rows, chunk_size)
+    first = next(chunks, [])
+
+    total_rows = 0
+    errors = []
+
+    def collect(chunk, chunk_errors):
+        nonlocal total_rows
+        total_rows += len(chunk)
+        errors.extend(chunk_errors)
+
+    second = next(chunks, None)
+    if second is None or workers == 1:
+        for chunk in filter(None, [first, second]):
+            collect(chunk, validator.validate_chunk(chunk))
+        for chunk in chunks:
+            collect(chunk, validator.validate_chunk(chunk))
+    else:
+        logger.info(f"Validating import rows across {workers} worker processes")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            in_flight = deque()
+            for chunk in [first, second]:
+                in_flight.append((chunk, executor.submit(validator.validate_chunk, chunk)))
+            for chunk in chunks:
+                if len(in_flight) >= workers * 2:
+                    done_chunk, future = in_flight.popleft()
+                    collect(done_chunk, future.result())
+                in_flight.append((chunk, executor.submit(validator.validate_chunk, chunk)))
+            while in_flight:
+                done_chunk, future = in_flight.popleft()
+                collect(done_chunk, future.result())
+
+    invalid_rows = len({error['row'] for error in errors})
+    return {
+        'dryRun': True,
+        'totalRows': total_rows,
+        'validRows': total_rows - invalid_rows,
+        'invalidRows': invalid_rows,
+        'errors': errors,
+    }
@@ -1,13 +1,21 @@
 import json
 import logging
 from datetime import datetime, timedelta
-from decimal import Decimal
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
-from .models import AidProject, Organization, FinancialTransaction, Donor, Country, Sector, ImplementingOrganization, ImportLog
+from .models import ImportJob, ImportLog
+from .import_engine import (
+    IMPORT_ENGINES, ActivityImportEngine, OrganizationImportEngine, TransactionImportEngine, build_field_mapping
+)
+from .import_jobs import claim_job, create_import_job, job_status, run_import_job
+from .import_reports import ErrorReportWriter, attach_error_report, error_report_url, iter_report_csv
+from .import_rollback import rollback_import
+from .import_streams import is_streaming_request, open_import_stream, payload_rows
+from .import_validation import validate_rows
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +41,58 @@ def check_import_permission(user):
     
     return False
 
+def read_import_payload(request):
+    """
+    Return (rows, mappings, file_name, streaming) for a bulk import request.
+
+    JSON bodies are decoded as before, either as a list of row objects in
+    `data` or in the columnar form ({"columns": [...], "rows": [[...], ...]}).
+    CSV/NDJSON bodies and multipart file uploads are parsed lazily so rows can
+    be imported chunk by chunk.
+    """
+    if is_streaming_request(request):
+        rows, mappings, file_name = open_import_stream(request)
+        return rows, mappings, file_name, True
+    
+    data = json.loads(request.body)
+    return payload_rows(data), data.get('mappings', []), data.get('fileName', 'Unknown'), False
+
+def run_as_job(request, entity_type):
+    """
+    Handle ?background=1 and ?commit=chunked imports through an ImportJob.
+
+    Background jobs are left for the process_import_jobs worker. Chunked
+    imports run inside the request but commit and checkpoint every chunk, so
+    re-posting the same file after a failure resumes from the last committed
+    chunk instead of starting over. ?mode=upsert is stored on the job and
+    applied when it runs.
+    """
+    job = create_import_job(request, entity_type)
+    if request.GET.get('background'):
+        return JsonResponse(job_status(job), status=202)
+    
+    if not claim_job(job):
+        return JsonResponse({'error': 'This file is already being imported'}, status=409)
+    run_import_job(job)
+    job.refresh_from_db()
+    
+    results = job_status(job)
+    results['errors'] = job.import_log.error_log if job.import_log else []
+    return JsonResponse(results)
+
+def validate_import(request, entity_type):
+    """
+    Handle ?dry_run=1 imports: check every row without touching the database.
+
+    Rows are validated in a process pool (IMPORT_VALIDATION_WORKERS, default
+    one per CPU) and the full error list is returned instead of the first 100.
+    """
+    rows, mappings, file_name, streaming = read_import_payload(request)
+    validator = IMPORT_ENGINES[entity_type].build_validator(build_field_mapping(mappings))
+    results = validate_rows(validator, rows, workers=getattr(settings, 'IMPORT_VALIDATION_WORKERS', None))
+    results['fileName'] = file_name
+    return JsonResponse(results)
+
 @csrf_exempt
 @login_required
 @require_POST
@@ -47,116 +107,34 @@ def import_activities(request):
         )
     
     try:
-        data = json.loads(request.body)
-        activities_data = data.get('data', [])
-        mappings = data.get('mappings', [])
+        if request.GET.get('dry_run'):
+            return validate_import(request, 'activities')
         
-        results = {
-            'successful': 0,
-            'failed': 0,
-            'errors': [],
-            'importedIds': []
-        }
+        if request.GET.get('background') or request.GET.get('commit') == 'chunked':
+            return run_as_job(request, 'activities')
         
-        # Create mapping dictionary for easier access
-        field_mapping = {}
-        for mapping in mappings:
-            if mapping['fileColumnIndex'] is not None:
-                field_mapping[mapping['systemFieldId']] = mapping['fileColumnIndex']
+        rows, mappings, file_name, streaming = read_import_payload(request)
         
+        # Streamed uploads can be very large, so imported ids are not echoed back
+        engine = ActivityImportEngine(request.user, build_field_mapping(mappings), collect_ids=not streaming,
+                                      mode=request.GET.get('mode', 'insert'), error_report=ErrorReportWriter())
         with transaction.atomic():
-            for idx, row in enumerate(activities_data):
-                try:
-                    # Extract data using mappings
-                    activity_data = {}
-                    for field_id, col_index in field_mapping.items():
-                        column_name = list(row.keys())[col_index]
-                        activity_data[field_id] = row[column_name]
-                    
-                    # Validate required fields
-                    required_fields = ['title', 'donor_name', 'start_date_planned', 'end_date_planned', 
-                                     'total_budget', 'recipient_country_name']
-                    for field in required_fields:
-                        if not activity_data.get(field):
-                            raise ValueError(f"{field} is required")
-                    
-                    # Find or create related objects
-                    donor, _ = Donor.objects.get_or_create(
-                        name=activity_data['donor_name'],
-                        defaults={'code': activity_data['donor_name'][:20].upper().replace(' ', '_')}
-                    )
-                    
-                    if activity_data.get('recipient_country_name'):
-                        country, _ = Country.objects.get_or_create(
-                            name=activity_data['recipient_country_name'],
-                            defaults={
-                                'iso_code': activity_data['recipient_country_name'][:3].upper(),
-                                'region': 'Unknown',
-                                'income_level': 'low'
-                            }
-                        )
-                    else:
-                        country = None
-                    
-                    if activity_data.get('implementing_org_name'):
-                        impl_org, _ = ImplementingOrganization.objects.get_or_create(
-                            name=activity_data['implementing_org_name'],
-                            defaults={'org_type': 'other'}
-                        )
-                    else:
-                        impl_org = None
-                    
-                    if activity_data.get('sector_name'):
-                        sector, _ = Sector.objects.get_or_create(
-                            name=activity_data['sector_name'],
-                            defaults={
-                                'code': activity_data['sector_name'][:10].upper().replace(' ', '_'),
-                                'category': 'Other'
-                            }
-                        )
-                    else:
-                        sector = None
-                    
-                    # Create activity
-                    activity = AidProject.objects.create(
-                        title=activity_data['title'],
-                        description=activity_data.get('description', ''),
-                        donor=donor,
-                        implementing_org=impl_org,
-                        activity_status=activity_data.get('activity_status', 'pipeline'),
-                        start_date_planned=datetime.strptime(activity_data['start_date_planned'], '%Y-%m-%d').date(),
-                        end_date_planned=datetime.strptime(activity_data['end_date_planned'], '%Y-%m-%d').date(),
-                        recipient_country=country,
-                        sector=sector,
-                        total_budget=Decimal(str(activity_data['total_budget'])),
-                        currency='USD',
-                        created_by=request.user
-                    )
-                    
-                    results['successful'] += 1
-                    results['importedIds'].append(str(activity.id))
-                    
-                except Exception as e:
-                    results['failed'] += 1
-                    results['errors'].append({
-                        'row': idx + 2,  # +2 for header row and 0-index
-                        'field': 'general',
-                        'message': str(e),
-                        'value': None
-                    })
-                    logger.error(f"Error importing activity row {idx}: {str(e)}")
+            results = engine.run(rows)
         
         # Log the import
-        ImportLog.objects.create(
+        import_log = ImportLog.objects.create(
             entity_type='activities',
-            file_name=data.get('fileName', 'Unknown'),
-            total_rows=len(activities_data),
+            file_name=file_name,
+            total_rows=engine.total_rows,
             successful_rows=results['successful'],
             failed_rows=results['failed'],
             user=request.user,
             field_mappings=mappings,
-            error_log=results['errors'][:100]  # Store first 100 errors
+            error_log=results['errors'][:100],  # Store first 100 errors
+            batch_id=engine.batch_id
         )
+        attach_error_report(import_log, engine.error_report)
+        results['errorReportUrl'] = error_report_url(import_log)
         
         return JsonResponse(results)
         
@@ -179,87 +157,34 @@ def import_organizations(request):
         )
     
     try:
-        data = json.loads(request.body)
-        organizations_data = data.get('data', [])
-        mappings = data.get('mappings', [])
+        if request.GET.get('dry_run'):
+            return validate_import(request, 'organizations')
         
-        results = {
-            'successful': 0,
-            'failed': 0,
-            'errors': [],
-            'importedIds': []
-        }
+        if request.GET.get('background') or request.GET.get('commit') == 'chunked':
+            return run_as_job(request, 'organizations')
         
-        # Create mapping dictionary
-        field_mapping = {}
-        for mapping in mappings:
-            if mapping['fileColumnIndex'] is not None:
-                field_mapping[mapping['systemFieldId']] = mapping['fileColumnIndex']
+        rows, mappings, file_name, streaming = read_import_payload(request)
         
+        # Streamed uploads can be very large, so imported ids are not echoed back
+        engine = OrganizationImportEngine(request.user, build_field_mapping(mappings), collect_ids=not streaming,
+                                          mode=request.GET.get('mode', 'insert'), error_report=ErrorReportWriter())
         with transaction.atomic():
-            for idx, row in enumerate(organizations_data):
-                try:
-                    # Extract data using mappings
-                    org_data = {}
-                    for field_id, col_index in field_mapping.items():
-                        column_name = list(row.keys())[col_index]
-                        org_data[field_id] = row[column_name]
-                    
-                    # Validate required fields
-                    if not org_data.get('name'):
-                        raise ValueError("Organization name is required")
-                    if not org_data.get('organization_type'):
-                        raise ValueError("Organization type is required")
-                    
-                    # Find country if provided
-                    country = None
-                    if org_data.get('country_name'):
-                        country, _ = Country.objects.get_or_create(
-                            name=org_data['country_name'],
-                            defaults={
-                                'iso_code': org_data['country_name'][:3].upper(),
-                                'region': 'Unknown',
-                                'income_level': 'low'
-                            }
-                        )
-                    
-                    # Create organization
-                    organization = Organization.objects.create(
-                        name=org_data['name'],
-                        short_name=org_data.get('short_name', ''),
-                        iati_identifier=org_data.get('iati_identifier') if org_data.get('iati_identifier') else None,
-                        organization_type=org_data['organization_type'].lower(),
-                        description=org_data.get('description', ''),
-                        website=org_data.get('website', ''),
-                        contact_email=org_data.get('contact_email', ''),
-                        country=country,
-                        created_by=request.user
-                    )
-                    
-                    results['successful'] += 1
-                    results['importedIds'].append(str(organization.id))
-                    
-                except Exception as e:
-                    results['failed'] += 1
-                    results['errors'].append({
-                        'row': idx + 2,
-                        'field': 'general',
-                        'message': str(e),
-                        'value': None
-                    })
-                    logger.error(f"Error importing organization row {idx}: {str(e)}")
+            results = engine.run(rows)
         
         # Log the import
-        ImportLog.objects.create(
+        import_log = ImportLog.objects.create(
             entity_type='organizations',
-            file_name=data.get('fileName', 'Unknown'),
-            total_rows=len(organizations_data),
+            file_name=file_name,
+            total_rows=engine.total_rows,
             successful_rows=results['successful'],
             failed_rows=results['failed'],
             user=request.user,
             field_mappings=mappings,
-            error_log=results['errors'][:100]
+            error_log=results['errors'][:100],  # Store first 100 errors
+            batch_id=engine.batch_id
         )
+        attach_error_report(import_log, engine.error_report)
+        results['errorReportUrl'] = error_report_url(import_log)
         
         return JsonResponse(results)
         
@@ -282,103 +207,34 @@ def import_transactions(request):
         )
     
     try:
-        data = json.loads(request.body)
-        transactions_data = data.get('data', [])
-        mappings = data.get('mappings', [])
+        if request.GET.get('dry_run'):
+            return validate_import(request, 'transactions')
         
-        results = {
-            'successful': 0,
-            'failed': 0,
-            'errors': [],
-            'importedIds': []
-        }
+        if request.GET.get('background') or request.GET.get('commit') == 'chunked':
+            return run_as_job(request, 'transactions')
         
-        # Create mapping dictionary
-        field_mapping = {}
-        for mapping in mappings:
-            if mapping['fileColumnIndex'] is not None:
-                field_mapping[mapping['systemFieldId']] = mapping['fileColumnIndex']
+        rows, mappings, file_name, streaming = read_import_payload(request)
         
+        # Streamed uploads can be very large, so imported ids are not echoed back
+        engine = TransactionImportEngine(request.user, build_field_mapping(mappings), collect_ids=not streaming,
+                                         mode=request.GET.get('mode', 'insert'), error_report=ErrorReportWriter())
         with transaction.atomic():
-            for idx, row in enumerate(transactions_data):
-                try:
-                    # Extract data using mappings
-                    trans_data = {}
-                    for field_id, col_index in field_mapping.items():
-                        column_name = list(row.keys())[col_index]
-                        trans_data[field_id] = row[column_name]
-                    
-                    # Validate required fields
-                    required_fields = ['project_title', 'transaction_date', 'amount', 'transaction_type']
-                    for field in required_fields:
-                        if not trans_data.get(field):
-                            raise ValueError(f"{field} is required")
-                    
-                    # Find the project
-                    try:
-                        project = AidProject.objects.get(title=trans_data['project_title'])
-                    except AidProject.DoesNotExist:
-                        raise ValueError(f"Activity '{trans_data['project_title']}' not found")
-                    
-                    # Find provider/receiver organizations if provided
-                    provider_org = None
-                    if trans_data.get('provider_organization_name'):
-                        provider_org, _ = Organization.objects.get_or_create(
-                            name=trans_data['provider_organization_name'],
-                            defaults={
-                                'organization_type': 'other',
-                                'created_by': request.user
-                            }
-                        )
-                    
-                    receiver_org = None
-                    if trans_data.get('receiver_organization_name'):
-                        receiver_org, _ = Organization.objects.get_or_create(
-                            name=trans_data['receiver_organization_name'],
-                            defaults={
-                                'organization_type': 'other',
-                                'created_by': request.user
-                            }
-                        )
-                    
-                    # Create transaction
-                    transaction = FinancialTransaction.objects.create(
-                        project=project,
-                        transaction_type=trans_data['transaction_type'].lower(),
-                        amount=Decimal(str(trans_data['amount'])),
-                        currency=trans_data.get('currency', 'USD').upper(),
-                        transaction_date=datetime.strptime(trans_data['transaction_date'], '%Y-%m-%d').date(),
-                        provider_organization=provider_org,
-                        receiver_organization=receiver_org,
-                        description=trans_data.get('description', ''),
-                        reference=trans_data.get('reference', ''),
-                        created_by=request.user
-                    )
-                    
-                    results['successful'] += 1
-                    results['importedIds'].append(str(transaction.id))
-                    
-                except Exception as e:
-                    results['failed'] += 1
-                    results['errors'].append({
-                        'row': idx + 2,
-                        'field': 'general',
-                        'message': str(e),
-                        'value': None
-                    })
-                    logger.error(f"Error importing transaction row {idx}: {str(e)}")
+            results = engine.run(rows)
         
         # Log the import
-        ImportLog.objects.create(
+        import_log = ImportLog.objects.create(
             entity_type='transactions',
-            file_name=data.get('fileName', 'Unknown'),
-            total_rows=len(transactions_data),
+            file_name=file_name,
+            total_rows=engine.total_rows,
             successful_rows=results['successful'],
             failed_rows=results['failed'],
             user=request.user,
             field_mappings=mappings,
-            error_log=results['errors'][:100]
+            error_log=results['errors'][:100],  # Store first 100 errors
+            batch_id=engine.batch_id
         )
+        attach_error_report(import_log, engine.error_report)
+        results['errorReportUrl'] = error_report_url(import_log)
         
         return JsonResponse(results)
         
@@ -386,6 +242,75 @@ def import_transactions(request):
         logger.error(f"Import transactions error: {str(e)}")
         return JsonResponse({'error': str(e)}, status=400)
 
+@login_required
+@require_GET
+def import_job_status(request, job_id):
+    """Progress of a background import job"""
+    try:
+        job = ImportJob.objects.get(id=job_id)
+    except ImportJob.DoesNotExist:
+        return JsonResponse({'error': 'Import job not found'}, status=404)
+    
+    if job.user_id != request.user.id and not request.user.is_superuser:
+        return JsonResponse({'error': 'You do not have permission to view this import job'}, status=403)
+    
+    return JsonResponse(job_status(job))
+
+@csrf_exempt
+@login_required
+@require_POST
+def rollback_import_log(request, log_id):
+    """Delete every record created by a bulk import, keeping those referenced from outside it"""
+    if not check_import_permission(request.user):
+        return JsonResponse(
+            {'error': 'You do not have permission to perform bulk imports'},
+            status=403
+        )
+    
+    try:
+        import_log = ImportLog.objects.get(id=log_id)
+    except ImportLog.DoesNotExist:
+        return JsonResponse({'error': 'Import log not found'}, status=404)
+    
+    if import_log.user_id != request.user.id and not request.user.is_superuser:
+        return JsonResponse({'error': 'You do not have permission to roll back this import'}, status=403)
+    
+    try:
+        deleted, kept = rollback_import(import_log)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'status': 'success',
+        'importLogId': import_log.id,
+        'deleted': deleted,
+        'kept': kept,
+        'rolledBackAt': import_log.rolled_back_at.isoformat()
+    })
+
+@login_required
+@require_GET
+def import_error_report(request, log_id):
+    """Download every error of an import as NDJSON, or as CSV with ?format=csv"""
+    try:
+        import_log = ImportLog.objects.get(id=log_id)
+    except ImportLog.DoesNotExist:
+        return JsonResponse({'error': 'Import log not found'}, status=404)
+    
+    if import_log.user_id != request.user.id and not request.user.is_superuser:
+        return JsonResponse({'error': 'You do not have permission to view this import'}, status=403)
+    
+    if not import_log.error_report:
+        return JsonResponse({'error': 'This import has no error report'}, status=404)
+    
+    report = import_log.error_report.open('rb')
+    if request.GET.get('format') == 'csv':
+        response = StreamingHttpResponse(iter_report_csv(report), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="import_{import_log.id}_errors.csv"'
+        return response
+    return FileResponse(report, as_attachment=True, filename=f'import_{import_log.id}_errors.ndjson',
+                        content_type='application/x-ndjson')
+
 @csrf_exempt
 @login_required
 @require_POST
@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from projects.iati_fixtures import FixtureServer, run_lookup_benchmark
+
+class Command(BaseCommand):
+    help = 'Benchmark IATI organisation lookups against recorded fixtures and write the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Fixture directory recorded with iati_fixture_server --record')
+        parser.add_argument('identifiers', help='Comma-separated organisation identifiers to look up')
+        parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+        parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra seconds, chosen at random')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of requests answered with a 503')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for reproducible latency and failures')
+        parser.add_argument('--output', default='iati_lookup_benchmark.json', help='File the JSON results are written to')
+
+    def handle(self, *args, **options):
+        identifiers = [identifier.strip() for identifier in options['identifiers'].split(',') if identifier.strip()]
+        if not identifiers:
+            raise CommandError('Give at least one identifier')
+
+        with FixtureServer(options['directory'], latency=options['latency'], jitter=options['jitter'],
+                           failure_rate=options['failure_rate'], seed=options['seed']) as server:
+            results = run_lookup_benchmark(server, identifiers)
+
+        for phase in ('cold', 'warm'):
+            result = results[phase]
+            self.stdout.write(
+                f"{phase:<10} {result['wallTime']:>8.3f}s  {result['msPerLookup']:>8.1f} ms/lookup  "
+                f"{result['upstreamRequests']:>5} requests  cache hit rate {result['cacheHitRate']}"
+            )
+        self.stdout.write(f"{'concurrent':<10} {results['concurrent']['wallTime']:>8.3f}s  "
+                          f"{results['concurrent']['speedup']}x faster than cold")
+        self.stdout.write(f"{'parse':<10} {results['parse']['organisationsPerSec']} organisations/s  "
+                          f"{results['parse']['megabytesPerSec']} MB/s")
+
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote results to {options['output']}"))
@@ -0,0 +1,57 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from projects.import_benchmark import (
+    DEFAULT_URL_PREFIX, ENTITY_ORDER, parse_size, run_benchmarks
+)
+
+class Command(BaseCommand):
+    help = 'Benchmark the bulk import endpoints with synthetic files and write the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1k,10k', help='Comma-separated row counts, e.g. 1k,10k,100k,1m')
+        parser.add_argument('--entities', default=','.join(ENTITY_ORDER), help='Comma-separated entity types to import')
+        parser.add_argument('--formats', default='csv', help='Comma-separated payload formats: csv, json')
+        parser.add_argument('--output', default='import_benchmark.json', help='File the JSON results are written to')
+        parser.add_argument('--data-dir', help='Directory for the generated files (reused between runs); a temporary directory by default')
+        parser.add_argument('--url-prefix', default=DEFAULT_URL_PREFIX, help='Path the projects app is mounted at')
+
+    def handle(self, *args, **options):
+        sizes = [parse_size(size) for size in options['sizes'].split(',')]
+        entity_types = options['entities'].split(',')
+        formats = options['formats'].split(',')
+        if set(entity_types) - set(ENTITY_ORDER):
+            raise CommandError(f"Unknown entity type; choose from {', '.join(ENTITY_ORDER)}")
+        if set(formats) - {'csv', 'json'}:
+            raise CommandError('Formats must be csv or json')
+
+        data_dir = options['data_dir'] or tempfile.mkdtemp(prefix='import_benchmark_')
+        os.makedirs(data_dir, exist_ok=True)
+
+        # Imports run against a throwaway test database, never the real one
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = User.objects.create_superuser('benchmark', 'benchmark@example.org', None)
+
+            def report(result):
+                self.stdout.write(
+                    f"{result['entityType']:<14} {result['format']:<5} {result['rows']:>8} rows  "
+                    f"{result['wallTime']:>8.2f}s  {result['rowsPerSec']:>9.0f} rows/s  "
+                    f"{result['queriesPerRow']:.4f} queries/row  peak RSS {result['peakRssMb']} MB"
+                )
+
+            results = run_benchmarks(user, sizes, entity_types, formats, data_dir,
+                                     url_prefix=options['url_prefix'], on_result=report)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results['results'])} results to {options['output']}"))
@@ -0,0 +1,56 @@
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from projects.iati_downloads import DEFAULT_DOWNLOAD_WORKERS, ResourceDownloader, get_resource_store, tracked_urls
+from projects.iati_mirror import LOAD_CHUNK_SIZE, load_organizations
+from projects.iati_service import IATIRegistryService
+
+class Command(BaseCommand):
+    help = 'Download or refresh IATI organisation XML files into the local resource store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='*', help='Resource URLs to download')
+        parser.add_argument('--registry', action='store_true', help='Add every organisation file listed in the IATI Registry')
+        parser.add_argument('--tracked', action='store_true', help='Refresh every file downloaded before')
+        parser.add_argument('--workers', type=int, default=DEFAULT_DOWNLOAD_WORKERS, help='Downloads in flight at once')
+        parser.add_argument('--load', action='store_true', help='Load new and changed files into the organisation mirror')
+        parser.add_argument('--chunk-size', type=int, default=LOAD_CHUNK_SIZE, help='Mirror records written per statement')
+
+    def handle(self, *args, **options):
+        service = IATIRegistryService()
+        store = get_resource_store()
+        urls = list(options['urls'])
+        if options['tracked']:
+            urls += tracked_urls(store)
+        if options['registry']:
+            try:
+                urls += service.list_organization_resources()
+            except (ValueError, requests.exceptions.RequestException) as e:
+                raise CommandError(f'Could not list registry resources: {e}')
+        if not urls:
+            raise CommandError('Give resource URLs, --tracked or --registry')
+
+        def report(result):
+            line = f"{result['status']:<10} {result['bytes']:>12} bytes  {result['url']}"
+            if result['error']:
+                self.stderr.write(self.style.WARNING(f"{line}  ({result['error']})"))
+            else:
+                self.stdout.write(line)
+
+        summary = ResourceDownloader(store, max_workers=options['workers']).download_all(urls, on_result=report)
+        totals = summary['totals']
+
+        if options['load']:
+            # Unchanged files are already in the mirror
+            for result in summary['results']:
+                if result['status'] not in ('downloaded', 'resumed'):
+                    continue
+                with store.open_object(result['sha256']) as source:
+                    counts = load_organizations(service.iter_organization_xml(source), source=result['url'],
+                                                chunk_size=options['chunk_size'])
+                self.stdout.write(f"{result['url']}: {counts['loaded']} loaded, {counts['skipped']} skipped")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals.get('downloaded', 0)} downloaded, {totals.get('resumed', 0)} resumed, "
+            f"{totals.get('unchanged', 0)} unchanged, {totals.get('failed', 0)} failed "
+            f"({totals.get('bytes', 0)} bytes transferred)"
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from projects.iati_fixtures import FixtureServer
+
+class Command(BaseCommand):
+    help = 'Serve captured IATI Registry, Datastore and organisation XML responses from a local HTTP server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Fixture directory')
+        parser.add_argument('--record', action='store_true', help='Forward requests without a fixture upstream and keep the responses')
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+        parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra seconds, chosen at random')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of requests answered with --failure-status')
+        parser.add_argument('--failure-status', type=int, default=503)
+        parser.add_argument('--seed', type=int, help='Seed for reproducible latency and failures')
+
+    def handle(self, *args, **options):
+        server = FixtureServer(
+            options['directory'], record=options['record'], latency=options['latency'],
+            jitter=options['jitter'], failure_rate=options['failure_rate'],
+            failure_status=options['failure_status'], seed=options['seed'],
+            host=options['host'], port=options['port'],
+        )
+        self.stdout.write(f"{'Recording' if options['record'] else 'Replaying'} IATI fixtures from {options['directory']}")
+        self.stdout.write(f"Set IATI_REGISTRY_BASE_URL = '{server.registry_url}'")
+        self.stdout.write(f"Set IATI_DATASTORE_BASE_URL = '{server.datastore_url}'")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.httpd.server_close()
+            self.stdout.write(self.style.SUCCESS(f"Served {dict(server.stats)}"))
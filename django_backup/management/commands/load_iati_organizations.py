@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+import requests
+from projects.iati_mirror import LOAD_CHUNK_SIZE, iter_xml_paths, load_organizations
+from projects.iati_service import IATIRegistryService
+
+class Command(BaseCommand):
+    help = 'Load IATI organisation XML files, registry dump directories or URLs into the local organisation mirror'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='+', help='Organisation XML files, directories of them, or http(s) URLs')
+        parser.add_argument('--chunk-size', type=int, default=LOAD_CHUNK_SIZE, help='Records written per statement')
+
+    def handle(self, *args, **options):
+        service = IATIRegistryService()
+        totals = {'loaded': 0, 'skipped': 0}
+
+        for source in iter_xml_paths(options['sources']):
+            try:
+                if source.startswith(('http://', 'https://')):
+                    stream = service.session.open(source, timeout=service.REQUEST_TIMEOUT)
+                else:
+                    stream = open(source, 'rb')
+            except (OSError, requests.exceptions.RequestException) as e:
+                self.stderr.write(self.style.WARNING(f'Skipping {source}: {e}'))
+                continue
+
+            with stream:
+                counts = load_organizations(service.iter_organization_xml(stream), source=source,
+                                            chunk_size=options['chunk_size'])
+            self.stdout.write(f"{source}: {counts['loaded']} loaded, {counts['skipped']} skipped")
+            for key in totals:
+                totals[key] += counts[key]
+
+        if not totals['loaded'] and not totals['skipped']:
+            raise CommandError('No organisations found in the given sources')
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {totals['loaded']} organisations into the mirror ({totals['skipped']} without an identifier or name)"
+        ))
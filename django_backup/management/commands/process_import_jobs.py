@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from projects.import_jobs import claim_next_job, run_import_job
+
+class Command(BaseCommand):
+    help = 'Run queued bulk import jobs outside the web workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the queue once and exit instead of polling')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait between polls of an empty queue')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Waiting for import jobs...' if not options['once'] else 'Processing queued import jobs...')
+
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'Running {job.entity_type} import job {job.id} ({job.file_name})')
+            run_import_job(job)
+            job.refresh_from_db()
+            if job.status == 'completed':
+                self.stdout.write(self.style.SUCCESS(
+                    f'Job {job.id} completed: {job.rows_processed} rows, {job.rows_failed} failed, '
+                    f'{job.throughput:.0f} rows/s'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f'Job {job.id} failed: {job.error_message}'))
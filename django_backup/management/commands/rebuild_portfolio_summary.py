@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from projects.portfolio_summary import rebuild_portfolio_summary
+
+class Command(BaseCommand):
+    help = 'Recompute the PortfolioSummary table the home page reads from AidProject and Donor'
+
+    def handle(self, *args, **options):
+        rows = rebuild_portfolio_summary()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt portfolio summary ({rows} rows)'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from projects.import_rollback import ROLLBACK_CHUNK_SIZE, rollback_import
+from projects.models import ImportLog
+
+class Command(BaseCommand):
+    help = 'Delete the records created by a bulk import'
+
+    def add_arguments(self, parser):
+        parser.add_argument('import_log_id', type=int, help='ID of the ImportLog to roll back')
+        parser.add_argument('--chunk-size', type=int, default=ROLLBACK_CHUNK_SIZE, help='Rows deleted per transaction')
+
+    def handle(self, *args, **options):
+        try:
+            import_log = ImportLog.objects.get(id=options['import_log_id'])
+        except ImportLog.DoesNotExist:
+            raise CommandError(f"Import log {options['import_log_id']} not found")
+
+        self.stdout.write(f'Rolling back {import_log.entity_type} import {import_log.id} ({import_log.file_name})')
+        try:
+            deleted, kept = rollback_import(import_log, chunk_size=options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            'Deleted ' + ', '.join(f'{count} {label}' for label, count in deleted.items())
+        ))
+        for label, ids in kept.items():
+            if ids:
+                self.stdout.write(self.style.WARNING(
+                    f'Kept {len(ids)} {label} referenced by records outside the import: '
+                    + ', '.join(str(pk) for pk in ids)
+                ))
@@ -0,0 +1,18 @@
+# Generated manually for indexing AidProject.title, used to match imported transactions
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0013_add_import_job_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='aidproject',
+            name='title',
+            field=models.CharField(db_index=True, max_length=300),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated manually for upsert imports keyed on a per-row content hash
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0014_aidproject_title_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aidproject',
+            name='import_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='import_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='import_mode',
+            field=models.CharField(choices=[('insert', 'Insert'), ('upsert', 'Insert or update')], default='insert', max_length=10),
+        ),
+    ]
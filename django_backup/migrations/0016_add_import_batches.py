@@ -0,0 +1,57 @@
+# Generated manually for tagging imported records with their import batch
+
+from django.db import migrations, models
+import uuid
+
+
+def set_job_batch_ids(apps, schema_editor):
+    # A callable default is evaluated once for existing rows; give each job its own id
+    ImportJob = apps.get_model('projects', 'ImportJob')
+    for job in ImportJob.objects.only('id'):
+        ImportJob.objects.filter(pk=job.pk).update(batch_id=uuid.uuid4())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0015_add_import_upsert'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aidproject',
+            name='import_batch',
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='import_batch',
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='financialtransaction',
+            name='import_batch',
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='batch_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='rolled_back_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='batch_id',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(set_job_batch_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='importjob',
+            name='batch_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+    ]
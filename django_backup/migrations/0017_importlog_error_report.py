@@ -0,0 +1,18 @@
+# Generated manually for storing full import error reports
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0016_add_import_batches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importlog',
+            name='error_report',
+            field=models.FileField(blank=True, upload_to='import_reports/'),
+        ),
+    ]
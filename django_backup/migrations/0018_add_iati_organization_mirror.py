@@ -0,0 +1,36 @@
+# Generated manually for the local mirror of IATI organisations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0017_importlog_error_report'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IATIOrganization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('iati_identifier', models.CharField(max_length=200, unique=True)),
+                ('name', models.CharField(max_length=500)),
+                ('search_name', models.CharField(db_index=True, max_length=500)),
+                ('acronym', models.CharField(blank=True, db_index=True, max_length=50)),
+                ('organization_type', models.CharField(blank=True, max_length=20)),
+                ('website', models.CharField(blank=True, max_length=500)),
+                ('contact_email', models.CharField(blank=True, max_length=254)),
+                ('contact_phone', models.CharField(blank=True, max_length=50)),
+                ('address', models.TextField(blank=True)),
+                ('country', models.CharField(blank=True, max_length=100)),
+                ('description', models.TextField(blank=True)),
+                ('source', models.CharField(blank=True, max_length=500)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'IATI Organization',
+                'ordering': ['name'],
+            },
+        ),
+    ]
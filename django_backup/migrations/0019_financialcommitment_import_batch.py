@@ -0,0 +1,18 @@
+# Generated manually for rolling back commitments created by IATI XML imports
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0018_add_iati_organization_mirror'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='financialcommitment',
+            name='import_batch',
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
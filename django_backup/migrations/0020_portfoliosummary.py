@@ -0,0 +1,52 @@
+# Generated manually for the precomputed home page summary
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def build_summary(apps, schema_editor):
+    """Fill the summary from existing projects; later changes are applied by signal handlers"""
+    AidProject = apps.get_model('projects', 'AidProject')
+    Donor = apps.get_model('projects', 'Donor')
+    PortfolioSummary = apps.get_model('projects', 'PortfolioSummary')
+    projects = AidProject.objects.order_by()
+    totals = projects.aggregate(count=Count('id'), funding=Sum('funding_amount'))
+    rows = [
+        PortfolioSummary(dimension='total', key='', item_count=totals['count'], total_funding=totals['funding'] or 0),
+        PortfolioSummary(dimension='donors', key='', item_count=Donor.objects.count()),
+    ]
+    for dimension, key_field, label_field in [('status', 'activity_status', 'activity_status'),
+                                              ('donor', 'donor_id', 'donor__name'),
+                                              ('country', 'recipient_country_id', 'recipient_country__name')]:
+        for group in projects.values(key_field, label_field).annotate(count=Count('id'), funding=Sum('funding_amount')):
+            rows.append(PortfolioSummary(dimension=dimension, key=str(group[key_field] or ''),
+                                         label=group[label_field] or None,
+                                         item_count=group['count'], total_funding=group['funding'] or 0))
+    PortfolioSummary.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0019_financialcommitment_import_batch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('total', 'All projects'), ('status', 'Projects by activity status'), ('donor', 'Projects by donor'), ('country', 'Projects by recipient country'), ('donors', 'Donor directory')], max_length=20)),
+                ('key', models.CharField(blank=True, max_length=50)),
+                ('label', models.CharField(blank=True, max_length=200, null=True)),
+                ('item_count', models.BigIntegerField(default=0)),
+                ('total_funding', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+            ],
+            options={
+                'verbose_name': 'Portfolio Summary',
+                'verbose_name_plural': 'Portfolio Summary',
+                'unique_together': {('dimension', 'key')},
+            },
+        ),
+        migrations.RunPython(build_summary, migrations.RunPython.noop),
+    ]
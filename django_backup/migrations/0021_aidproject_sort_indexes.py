@@ -0,0 +1,33 @@
+# Generated manually for keyset pagination of the project dashboard
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0020_portfoliosummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aidproject',
+            index=models.Index(fields=['submitted_at', 'id'], name='project_submitted_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aidproject',
+            index=models.Index(fields=['title', 'id'], name='project_title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aidproject',
+            index=models.Index(fields=['start_date_planned', 'id'], name='project_start_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aidproject',
+            index=models.Index(fields=['funding_amount', 'id'], name='project_funding_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aidproject',
+            index=models.Index(fields=['activity_status', 'id'], name='project_status_id_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated manually for rolling back budgets and locations created by IATI XML imports
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0021_aidproject_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectbudget',
+            name='import_batch',
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='projectlocation',
+            name='import_batch',
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
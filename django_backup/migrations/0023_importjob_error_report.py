@@ -0,0 +1,18 @@
+# Generated manually for keeping the error report of resumed import jobs
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0022_budget_location_import_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='error_report',
+            field=models.FileField(blank=True, upload_to='import_jobs/'),
+        ),
+    ]
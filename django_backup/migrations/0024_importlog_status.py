@@ -0,0 +1,19 @@
+# Generated manually for logging IATI XML imports before they run
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0023_importjob_error_report'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importlog',
+            name='status',
+            field=models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')],
+                                   default='completed', max_length=20),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated manually for expiring mirrored IATI organisations
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0025_importjob_upsert_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='iatiorganization',
+            name='fetched_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
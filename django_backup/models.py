@@ -4,6 +4,7 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from decimal import Decimal
 import json
+import uuid
 
 class Donor(models.Model):
     """Donor organization model"""
@@ -78,7 +79,7 @@ class AidProject(models.Model):
     # Basic Information
     prism_id = models.CharField(max_length=20, unique=True, null=True, blank=True)
     iati_identifier = models.CharField(max_length=100, unique=True, null=True, blank=True)
-    title = models.CharField(max_length=300)
+    title = models.CharField(max_length=300, db_index=True)
     description = models.TextField(null=True, blank=True)
     
     # Organizations
@@ -175,10 +176,25 @@ class AidProject(models.Model):
     submitted_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Hash of the bulk import row this activity was last written from, so
+    # re-imports can skip unchanged rows
+    import_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+    # Batch of the bulk import that created this activity, used for rollback
+    import_batch = models.UUIDField(null=True, blank=True, db_index=True, editable=False)
+    
     class Meta:
         ordering = ['-submitted_at']
         verbose_name = "Aid Project"
         verbose_name_plural = "Aid Projects"
+        # (column, id) for each dashboard sort column, so keyset pages seek instead of
+        # scanning; descending sorts read the same index backwards
+        indexes = [
+            models.Index(fields=['submitted_at', 'id'], name='project_submitted_id_idx'),
+            models.Index(fields=['title', 'id'], name='project_title_id_idx'),
+            models.Index(fields=['start_date_planned', 'id'], name='project_start_id_idx'),
+            models.Index(fields=['funding_amount', 'id'], name='project_funding_id_idx'),
+            models.Index(fields=['activity_status', 'id'], name='project_status_id_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -248,6 +264,9 @@ class ProjectBudget(models.Model):
     actual_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     currency = models.CharField(max_length=10, default='USD')
     
+    # Batch of the IATI import that created this budget line, used for rollback
+    import_batch = models.UUIDField(null=True, blank=True, db_index=True, editable=False)
+    
     def __str__(self):
         return f"{self.project.title} - {self.category}"
 
@@ -309,6 +328,9 @@ class FinancialTransaction(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     
+    # Batch of the bulk import that created this transaction, used for rollback
+    import_batch = models.UUIDField(null=True, blank=True, db_index=True, editable=False)
+    
     class Meta:
         ordering = ['-transaction_date', '-created_at']
     
@@ -371,6 +393,9 @@ class FinancialCommitment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     
+    # Batch of the bulk import that created this commitment, used for rollback
+    import_batch = models.UUIDField(null=True, blank=True, db_index=True, editable=False)
+    
     class Meta:
         ordering = ['-commitment_date', '-created_at']
     
@@ -571,6 +596,11 @@ class Organization(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     
+    # Hash of the bulk import row this organization was last written from
+    import_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+    # Batch of the bulk import that created this organization, used for rollback
+    import_batch = models.UUIDField(null=True, blank=True, db_index=True, editable=False)
+    
     class Meta:
         ordering = ['name']
     
@@ -776,6 +806,8 @@ class ProjectLocation(models.Model):
     # System fields
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Batch of the IATI import that created this location, used for rollback
+    import_batch = models.UUIDField(null=True, blank=True, db_index=True, editable=False)
     
     class Meta:
         ordering = ['location_type', 'name']
@@ -821,6 +853,12 @@ class ProjectLocation(models.Model):
 
 class ImportLog(models.Model):
     """Log of all bulk import activities"""
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
     entity_type = models.CharField(max_length=50, choices=[
         ('activities', 'Activities'),
         ('organizations', 'Organizations'),
@@ -832,15 +870,176 @@ class ImportLog(models.Model):
     failed_rows = models.PositiveIntegerField()
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     import_date = models.DateTimeField(auto_now_add=True)
+    # Imports that commit chunk by chunk are logged before they start, so the
+    # rows of one that stops half way can still be found and rolled back
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='completed')
     
     # Store mapping configuration for rollback
     field_mappings = models.JSONField(null=True, blank=True)
     
-    # Store error details
+    # Store error details; error_log keeps the first 100 errors and
+    # error_report every error, one JSON object per line
     error_log = models.JSONField(null=True, blank=True)
+    error_report = models.FileField(upload_to='import_reports/', blank=True)
+    
+    # Every record created by the import is tagged with this batch id
+    batch_id = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+    rolled_back_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-import_date']
     
     def __str__(self):
-        return f"{self.entity_type} import by {self.user} on {self.import_date}"
\ No newline at end of file
+        return f"{self.entity_type} import by {self.user} on {self.import_date}"
+
+
+class ImportJob(models.Model):
+    """Bulk import queued to run outside the request/response cycle"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    FILE_FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('ndjson', 'Newline-delimited JSON'),
+    ]
+    
+    IMPORT_MODE_CHOICES = [
+        ('insert', 'Insert'),
+        ('upsert', 'Insert or update'),
+    ]
+    
+    entity_type = models.CharField(max_length=50, choices=[
+        ('activities', 'Activities'),
+        ('organizations', 'Organizations'),
+        ('transactions', 'Transactions'),
+    ])
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    file = models.FileField(upload_to='import_jobs/')
+    file_name = models.CharField(max_length=255)
+    file_format = models.CharField(max_length=10, choices=FILE_FORMAT_CHOICES, default='csv')
+    import_mode = models.CharField(max_length=10, choices=IMPORT_MODE_CHOICES, default='insert')
+    field_mappings = models.JSONField(null=True, blank=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    
+    # Records created by the job are tagged with this id, which is kept
+    # across resumed runs and copied to the job's ImportLog
+    batch_id = models.UUIDField(default=uuid.uuid4, editable=False)
+    
+    # SHA-256 of the stored file, used to resume re-uploads of the same file
+    file_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    
+    # Progress, saved in the same transaction as each chunk so rows_processed
+    # is also the checkpoint an interrupted job resumes from
+    rows_processed = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    # Upsert outcomes of the successful rows, carried over when resuming
+    rows_created = models.PositiveIntegerField(default=0)
+    rows_updated = models.PositiveIntegerField(default=0)
+    rows_unchanged = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    # Errors of the rows committed so far, appended to by every run of the
+    # job and moved to the ImportLog once it completes
+    error_report = models.FileField(upload_to='import_jobs/', blank=True)
+    
+    import_log = models.OneToOneField(ImportLog, on_delete=models.SET_NULL, null=True, blank=True, related_name='job')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.entity_type} import job {self.id} ({self.status})"
+    
+    @property
+    def throughput(self):
+        """Rows processed per second since the job started"""
+        if not self.started_at:
+            return 0
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return self.rows_processed / elapsed if elapsed > 0 else 0
+
+
+class IATIOrganization(models.Model):
+    """Local mirror of organisations published to IATI, answering lookups without the network"""
+    iati_identifier = models.CharField(max_length=200, unique=True)
+    name = models.CharField(max_length=500)
+    # normalize_name(name) and its acronym, indexed for prefix search and autocomplete
+    search_name = models.CharField(max_length=500, db_index=True)
+    acronym = models.CharField(max_length=50, blank=True, db_index=True)
+    organization_type = models.CharField(max_length=20, blank=True)
+    website = models.CharField(max_length=500, blank=True)
+    contact_email = models.CharField(max_length=254, blank=True)
+    contact_phone = models.CharField(max_length=50, blank=True)
+    address = models.TextField(blank=True)
+    country = models.CharField(max_length=100, blank=True)
+    description = models.TextField(blank=True)
+    
+    # File, dump or lookup the record was last loaded from, and when; lookups
+    # refresh records older than IATI_MIRROR_TTL
+    source = models.CharField(max_length=500, blank=True)
+    fetched_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name = "IATI Organization"
+    
+    def __str__(self):
+        return f"{self.name} ({self.iati_identifier})"
+    
+    def to_org_info(self):
+        """The dict IATIRegistryService.get_organization_info returns"""
+        return {
+            'iati_identifier': self.iati_identifier,
+            'name': self.name,
+            'organization_type': self.organization_type,
+            'website': self.website,
+            'contact_email': self.contact_email,
+            'contact_phone': self.contact_phone,
+            'address': self.address,
+            'country': self.country,
+            'description': self.description,
+        }
+
+
+class PortfolioSummary(models.Model):
+    """
+    Precomputed home page figures, one row per (dimension, key).
+
+    Kept current by the AidProject and Donor signal handlers in
+    portfolio_summary; rebuild it with `manage.py rebuild_portfolio_summary`.
+    """
+    TOTAL = 'total'
+    STATUS = 'status'
+    DONOR = 'donor'
+    COUNTRY = 'country'
+    DONORS = 'donors'
+    DIMENSION_CHOICES = [
+        (TOTAL, 'All projects'),
+        (STATUS, 'Projects by activity status'),
+        (DONOR, 'Projects by donor'),
+        (COUNTRY, 'Projects by recipient country'),
+        (DONORS, 'Donor directory'),
+    ]
+    
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    # Status code or donor/country id; empty for projects without one
+    key = models.CharField(max_length=50, blank=True)
+    label = models.CharField(max_length=200, blank=True, null=True)
+    item_count = models.BigIntegerField(default=0)
+    total_funding = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    
+    class Meta:
+        unique_together = ['dimension', 'key']
+        verbose_name = "Portfolio Summary"
+        verbose_name_plural = "Portfolio Summary"
+    
+    def __str__(self):
+        return f"{self.dimension} {self.label or self.key}: {self.item_count}"
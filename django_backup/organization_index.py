@@ -0,0 +1,195 @@
+"""
+Organization Name Index
+In-memory matching of free-text organization names against existing organizations
+"""
+
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Dice similarity over character trigrams at which a fuzzy match is suggested
+# for review (it is never linked automatically), and below which it is not
+# worth reporting
+FUZZY_MATCH_THRESHOLD = 0.9
+CANDIDATE_THRESHOLD = 0.6
+MAX_CANDIDATES = 5
+# Shortest acronym of a full name looked up among names and short names;
+# two-letter acronyms ("SC", "MH") collide too often to be trusted
+MIN_ACRONYM_LENGTH = 3
+
+# Entries sharing the most trigrams with a name are scored in full; the rest
+# are skipped
+BLOCK_SIZE = 50
+# Trigrams shared by more entries than this (" mi", "of ", "ion") are too
+# common to narrow a lookup down and are not used for blocking
+MAX_POSTINGS = 1000
+
+STOPWORDS = {'the', 'of', 'and', 'for', 'in', 'on', 'de', 'la', 'le', 'du', 'des', 'et', 'y'}
+
+AMBIGUOUS = object()
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase, strip accents and punctuation, and collapse whitespace"""
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    name = name.lower().replace('&', ' and ')
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', name).split())
+
+
+def acronym(normalized: str) -> str:
+    """Initials of the significant words, e.g. 'undp' for United Nations Development Programme"""
+    words = [word for word in normalized.split() if word not in STOPWORDS]
+    return ''.join(word[0] for word in words) if len(words) > 1 else ''
+
+
+def trigrams(normalized: str) -> Set[str]:
+    padded = f'  {normalized} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: Set[str], b: Set[str]) -> float:
+    """Dice coefficient of two trigram sets"""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class OrganizationIndex:
+    """
+    Normalized lookup of organizations by name, short name and IATI identifier.
+
+    Exact keys (normalized name, short name, spacing-insensitive forms and the
+    IATI identifier) resolve directly. Acronyms resolve in both directions
+    when no exact key matches: "UNDP" finds United Nations Development
+    Programme, and the full name finds an organization named or short-named
+    "UNDP". Keys shared by several organizations are ambiguous and never
+    resolved. Anything else is only matched fuzzily, as suggestions: entries
+    are blocked on the name's rarest trigrams so only the closest few are
+    scored.
+    """
+
+    def __init__(self):
+        self.exact: Dict[str, object] = {}
+        self.acronyms: Dict[str, object] = {}
+        # (organization id, display name, trigram set) per indexed name
+        self.entries: List[Tuple[int, str, Set[str]]] = []
+        self.blocks: Dict[str, List[int]] = defaultdict(list)
+
+    @classmethod
+    def load(cls, queryset=None) -> 'OrganizationIndex':
+        """Build the index from the organizations table (or a queryset of it) with one query"""
+        if queryset is None:
+            from .models import Organization
+            queryset = Organization.objects.all()
+        index = cls()
+        for org_id, name, short_name, iati_identifier in queryset.values_list(
+                'id', 'name', 'short_name', 'iati_identifier').order_by('id'):
+            index.add(org_id, name, short_name, iati_identifier)
+        logger.info(f"Loaded {len(index.entries)} organization names into the name index")
+        return index
+
+    def add(self, org_id: int, name: str, short_name: str = '', iati_identifier: Optional[str] = None):
+        if iati_identifier:
+            self._add_key(self.exact, iati_identifier.strip().lower(), org_id)
+        for value in (name, short_name):
+            normalized = normalize_name(value or '')
+            if not normalized:
+                continue
+            self._add_key(self.exact, normalized, org_id)
+            self._add_key(self.exact, normalized.replace(' ', ''), org_id)
+            if value == name and acronym(normalized):
+                self._add_key(self.acronyms, acronym(normalized), org_id)
+
+            grams = trigrams(normalized)
+            position = len(self.entries)
+            self.entries.append((org_id, value, grams))
+            for gram in grams:
+                self.blocks[gram].append(position)
+
+    @staticmethod
+    def _add_key(keys: Dict[str, object], key: str, org_id: int):
+        if keys.get(key, org_id) != org_id:
+            keys[key] = AMBIGUOUS
+        else:
+            keys[key] = org_id
+
+    def lookup(self, name: str) -> Optional[int]:
+        """Organization id for an exact (normalized) or acronym match"""
+        org_id, _ = self._find(name)
+        return None if org_id is AMBIGUOUS else org_id
+
+    def _find(self, name: str) -> Tuple[object, str]:
+        """(organization id, AMBIGUOUS or None; 'exact' or 'acronym') for a name"""
+        org_id = self._exact(name)
+        if org_id is not None:
+            return org_id, 'exact'
+        normalized = normalize_name(name)
+        org_id = self.acronyms.get(normalized.replace(' ', ''))
+        if org_id is None and len(acronym(normalized)) >= MIN_ACRONYM_LENGTH:
+            org_id = self.exact.get(acronym(normalized))
+        return org_id, 'acronym'
+
+    def _exact(self, name: str) -> object:
+        """Organization id, AMBIGUOUS or None for the first exact key of a name"""
+        normalized = normalize_name(name)
+        for key in (name.strip().lower(), normalized, normalized.replace(' ', '')):
+            org_id = self.exact.get(key)
+            if org_id is not None:
+                return org_id
+        return None
+
+    def candidates(self, name: str, limit: int = MAX_CANDIDATES,
+                   threshold: float = CANDIDATE_THRESHOLD) -> List[Dict]:
+        """Closest organizations to a name as {'id', 'name', 'score'} dicts, best first"""
+        grams = trigrams(normalize_name(name))
+        shared = Counter()
+        for gram in self._probe(grams, threshold):
+            shared.update(self.blocks.get(gram, ()))
+
+        best: Dict[int, Dict] = {}
+        for position, _ in shared.most_common(BLOCK_SIZE):
+            org_id, display_name, entry_grams = self.entries[position]
+            score = round(similarity(grams, entry_grams), 3)
+            if score >= threshold and score > best.get(org_id, {}).get('score', 0):
+                best[org_id] = {'id': org_id, 'name': display_name, 'score': score}
+        return sorted(best.values(), key=lambda candidate: (-candidate['score'], candidate['id']))[:limit]
+
+    def _probe(self, grams: Set[str], threshold: float) -> List[str]:
+        """
+        The rarest trigrams of a name, enough to find every entry at `threshold`.
+
+        An entry with a Dice score of t shares at least t/(2-t) of the name's
+        trigrams, so it shares one of any len(grams) minus that many plus one.
+        Only those rarest posting lists are read, and lists longer than
+        MAX_POSTINGS are skipped unless nothing rarer is left.
+        """
+        needed = len(grams) - math.ceil(len(grams) * threshold / (2 - threshold)) + 1
+        rarest = sorted(grams, key=lambda gram: len(self.blocks.get(gram, ())))[:max(needed, 1)]
+        return [gram for gram in rarest if len(self.blocks.get(gram, ())) <= MAX_POSTINGS] or rarest[:1]
+
+    def match(self, name: str) -> Tuple[Optional[int], str, List[Dict]]:
+        """
+        Return (organization id, match type, candidates) for a name.
+
+        The match type is 'exact' or 'acronym' for the only matches resolved
+        to an organization, 'ambiguous' when the name's key is shared by
+        several organizations, 'fuzzy' when the best candidate clears
+        FUZZY_MATCH_THRESHOLD (a suggestion, never resolved), or 'none';
+        candidates are only computed when nothing was resolved.
+        """
+        org_id, match_type = self._find(name)
+        if org_id is AMBIGUOUS:
+            return None, 'ambiguous', self.candidates(name)
+        if org_id is not None:
+            return org_id, match_type, []
+        found = self.candidates(name)
+        return None, 'fuzzy' if found and found[0]['score'] >= FUZZY_MATCH_THRESHOLD else 'none', found
+
+    def resolve(self, names: Iterable[str]) -> Dict[str, Tuple[Optional[int], str, List[Dict]]]:
+        """`match` every distinct name of a batch"""
+        return {name: self.match(name) for name in set(names) if name}
@@ -0,0 +1,268 @@
+"""
+Portfolio Summary
+Maintains the PortfolioSummary rollup that the home page reads instead of aggregating AidProject
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import AidProject, Country, Donor, PortfolioSummary
+
+logger = logging.getLogger(__name__)
+
+TRACKED_FIELDS = ['activity_status', 'funding_amount', 'donor_id', 'recipient_country_id']
+# Names a save(update_fields=...) may use for them
+TRACKED_NAMES = set(TRACKED_FIELDS) | {'donor', 'recipient_country'}
+ACTIVE_STATUS = 'implementation'
+TOP_DONORS = 5
+TOP_COUNTRIES = 10
+
+_suspended = threading.local()
+
+
+def _amount(value) -> Decimal:
+    if value in (None, ''):
+        return Decimal('0')
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _tracked(values: Dict) -> Dict:
+    return {**values, 'funding_amount': _amount(values['funding_amount'])}
+
+
+def _project_rows(values: Dict) -> List[Tuple[str, str]]:
+    """The (dimension, key) rows a project with these field values counts towards"""
+    return [
+        (PortfolioSummary.TOTAL, ''),
+        (PortfolioSummary.STATUS, values['activity_status'] or ''),
+        (PortfolioSummary.DONOR, str(values['donor_id'] or '')),
+        (PortfolioSummary.COUNTRY, str(values['recipient_country_id'] or '')),
+    ]
+
+
+def _adjust(dimension: str, key: str, count: int, funding: Decimal, label: Optional[str] = None):
+    """Add to one summary row with an UPDATE ... SET x = x + n, creating it when missing"""
+    changes = {'item_count': F('item_count') + count, 'total_funding': F('total_funding') + funding}
+    if label is not None:
+        changes['label'] = label
+    rows = PortfolioSummary.objects.filter(dimension=dimension, key=key)
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            PortfolioSummary.objects.create(dimension=dimension, key=key, label=label,
+                                            item_count=count, total_funding=funding)
+    except IntegrityError:
+        # Created by a concurrent request in the meantime
+        rows.update(**changes)
+
+
+def _labels(project: AidProject) -> Dict[str, Optional[str]]:
+    return {
+        PortfolioSummary.TOTAL: None,
+        PortfolioSummary.STATUS: project.activity_status or None,
+        PortfolioSummary.DONOR: project.donor.name if project.donor_id else None,
+        PortfolioSummary.COUNTRY: project.recipient_country.name if project.recipient_country_id else None,
+    }
+
+
+def is_suspended() -> bool:
+    return getattr(_suspended, 'depth', 0) > 0
+
+
+@contextmanager
+def summary_suspended():
+    """
+    Skip the per-row summary signals inside the block.
+
+    For bulk writes, which move the summary themselves once per chunk with
+    `apply_project_changes` and `donors_added`, and for bulk_create and
+    queryset.update(), which send no signals at all.
+    """
+    _suspended.depth = getattr(_suspended, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _suspended.depth -= 1
+
+
+def project_values(project: AidProject) -> Dict:
+    """The tracked field values of a project instance"""
+    return _tracked({field: getattr(project, field) for field in TRACKED_FIELDS})
+
+
+def stored_project_values(pks: Iterable[int]) -> Dict[int, Dict]:
+    """{project id: tracked field values} as stored, with one query"""
+    rows = AidProject.objects.filter(pk__in=list(pks)).values('pk', *TRACKED_FIELDS)
+    return {values.pop('pk'): _tracked(values) for values in rows}
+
+
+def apply_project_changes(removed: Iterable[Dict] = (), added: Iterable[Dict] = ()):
+    """
+    Move the summary by the projects a bulk write removed and added.
+
+    Both are dicts of TRACKED_FIELDS; an updated project is removed with its
+    old values and added with its new ones. Changes are summed per summary
+    row and each row is moved with one `_adjust`, in key order so that
+    concurrent imports lock rows in the same order. Call it in the
+    transaction of the write, so both commit or roll back together.
+    """
+    deltas = defaultdict(lambda: [0, Decimal('0')])
+    for sign, projects in ((-1, removed), (1, added)):
+        for values in projects:
+            for row in _project_rows(values):
+                deltas[row][0] += sign
+                deltas[row][1] += sign * values['funding_amount']
+    changed = {row: delta for row, delta in deltas.items() if any(delta)}
+    if not changed:
+        return
+
+    labels = {(PortfolioSummary.STATUS, key): key for dimension, key in changed
+              if dimension == PortfolioSummary.STATUS and key}
+    for dimension, model in ((PortfolioSummary.DONOR, Donor), (PortfolioSummary.COUNTRY, Country)):
+        keys = [key for row_dimension, key in changed if row_dimension == dimension and key]
+        if keys:
+            labels.update(((dimension, str(pk)), name)
+                          for pk, name in model.objects.filter(pk__in=keys).values_list('pk', 'name'))
+    for (dimension, key), (count, funding) in sorted(changed.items()):
+        _adjust(dimension, key, count, funding, labels.get((dimension, key)))
+
+
+def donors_added(count: int):
+    """Count donors created in bulk in the donor directory row"""
+    if count:
+        _adjust(PortfolioSummary.DONORS, '', count, Decimal('0'))
+
+
+def rebuild_portfolio_summary() -> int:
+    """Recompute every summary row from AidProject and Donor; returns the number of rows written"""
+    projects = AidProject.objects.order_by()
+    rows = []
+
+    totals = projects.aggregate(count=Count('id'), funding=Sum('funding_amount'))
+    rows.append(PortfolioSummary(dimension=PortfolioSummary.TOTAL, key='',
+                                 item_count=totals['count'], total_funding=totals['funding'] or 0))
+    for group in projects.values('activity_status').annotate(count=Count('id'), funding=Sum('funding_amount')):
+        rows.append(PortfolioSummary(dimension=PortfolioSummary.STATUS, key=group['activity_status'] or '',
+                                     label=group['activity_status'] or None,
+                                     item_count=group['count'], total_funding=group['funding'] or 0))
+    for group in projects.values('donor_id', 'donor__name').annotate(count=Count('id'), funding=Sum('funding_amount')):
+        rows.append(PortfolioSummary(dimension=PortfolioSummary.DONOR, key=str(group['donor_id'] or ''),
+                                     label=group['donor__name'],
+                                     item_count=group['count'], total_funding=group['funding'] or 0))
+    for group in projects.values('recipient_country_id', 'recipient_country__name').annotate(
+            count=Count('id'), funding=Sum('funding_amount')):
+        rows.append(PortfolioSummary(dimension=PortfolioSummary.COUNTRY, key=str(group['recipient_country_id'] or ''),
+                                     label=group['recipient_country__name'],
+                                     item_count=group['count'], total_funding=group['funding'] or 0))
+    rows.append(PortfolioSummary(dimension=PortfolioSummary.DONORS, key='', item_count=Donor.objects.count()))
+
+    with transaction.atomic():
+        PortfolioSummary.objects.all().delete()
+        PortfolioSummary.objects.bulk_create(rows)
+    logger.info(f"Rebuilt portfolio summary: {totals['count']} projects, {len(rows)} rows")
+    return len(rows)
+
+
+def portfolio_summary() -> Dict:
+    """
+    Home page figures from the summary table in one query.
+
+    The keys and list shapes match the aggregates home() used to run, so the
+    template is unchanged. The table is filled by its migration and kept
+    current from then on.
+    """
+    rows = list(PortfolioSummary.objects.filter(item_count__gt=0))
+
+    by_dimension = {dimension: [] for dimension, _ in PortfolioSummary.DIMENSION_CHOICES}
+    for row in rows:
+        by_dimension[row.dimension].append(row)
+    total = by_dimension[PortfolioSummary.TOTAL][0] if by_dimension[PortfolioSummary.TOTAL] else None
+    donors = by_dimension[PortfolioSummary.DONORS][0] if by_dimension[PortfolioSummary.DONORS] else None
+    by_funding = lambda row: row.total_funding
+
+    return {
+        'total_projects': total.item_count if total else 0,
+        'total_funding': total.total_funding if total else 0,
+        'active_projects': sum(row.item_count for row in by_dimension[PortfolioSummary.STATUS]
+                               if row.key == ACTIVE_STATUS),
+        'total_donors': donors.item_count if donors else 0,
+        'total_countries': sum(1 for row in by_dimension[PortfolioSummary.COUNTRY] if row.key),
+        'status_data': [{'activity_status': row.key, 'count': row.item_count}
+                        for row in by_dimension[PortfolioSummary.STATUS]],
+        'top_donors': [{'donor__name': row.label, 'total_funding': row.total_funding}
+                       for row in sorted(by_dimension[PortfolioSummary.DONOR], key=by_funding, reverse=True)[:TOP_DONORS]],
+        'country_data': [{'recipient_country__name': row.label, 'count': row.item_count,
+                          'total_funding': row.total_funding}
+                         for row in sorted(by_dimension[PortfolioSummary.COUNTRY], key=by_funding, reverse=True)[:TOP_COUNTRIES]],
+    }
+
+
+@receiver(pre_save, sender=AidProject)
+def remember_project_summary_fields(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Keep the stored values a save is about to overwrite, so post_save can move them"""
+    instance._summary_before = None
+    if raw or is_suspended() or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and not TRACKED_NAMES & set(update_fields):
+        return
+    before = AidProject.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS).first()
+    instance._summary_before = _tracked(before) if before is not None else None
+
+
+@receiver(post_save, sender=AidProject)
+def update_summary_on_project_save(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw or is_suspended():
+        return
+    before = getattr(instance, '_summary_before', None)
+    if not created and before is None:
+        return
+    after = _tracked({field: getattr(instance, field) for field in TRACKED_FIELDS})
+    if before == after:
+        return
+    if before is not None:
+        for dimension, key in _project_rows(before):
+            _adjust(dimension, key, -1, -before['funding_amount'])
+    labels = _labels(instance)
+    for dimension, key in _project_rows(after):
+        _adjust(dimension, key, 1, after['funding_amount'], labels[dimension])
+
+
+@receiver(post_delete, sender=AidProject)
+def update_summary_on_project_delete(sender, instance, **kwargs):
+    if is_suspended():
+        return
+    values = _tracked({field: getattr(instance, field) for field in TRACKED_FIELDS})
+    for dimension, key in _project_rows(values):
+        _adjust(dimension, key, -1, -values['funding_amount'])
+
+
+@receiver(post_save, sender=Donor)
+def update_summary_on_donor_save(sender, instance, created, raw=False, **kwargs):
+    if raw or is_suspended():
+        return
+    if created:
+        _adjust(PortfolioSummary.DONORS, '', 1, Decimal('0'))
+    else:
+        PortfolioSummary.objects.filter(dimension=PortfolioSummary.DONOR, key=str(instance.pk)).update(label=instance.name)
+
+
+@receiver(post_delete, sender=Donor)
+def update_summary_on_donor_delete(sender, instance, **kwargs):
+    if not is_suspended():
+        _adjust(PortfolioSummary.DONORS, '', -1, Decimal('0'))
+
+
+@receiver(post_save, sender=Country)
+def update_summary_on_country_save(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw and not is_suspended():
+        PortfolioSummary.objects.filter(dimension=PortfolioSummary.COUNTRY, key=str(instance.pk)).update(label=instance.name)
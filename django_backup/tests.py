@@ -1,3 +1,717 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import tempfile
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.contrib.auth.models import User
+from django.db import DatabaseError
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .analytics import analytics_series
+from .dashboard_queries import DEFAULT_SORT, SORT_FIELDS, KeysetPaginator, parse_sort
+from .http_cache import CachingSession, ResponseCache
+from .http_client import CircuitBreaker, CircuitOpenError, ResilientSession
+from .iati_activity_import import IATIActivityImportEngine
+from .iati_downloads import ResourceDownloader, ResourceStore
+from .iati_fixtures import DATASTORE_PREFIX, FixtureServer, FixtureStore
+from .iati_mirror import remember_organization
+from .iati_service import IATIRegistryService
+from .import_engine import ActivityImportEngine, OrganizationImportEngine, TransactionImportEngine
+from .import_jobs import run_import_job
+from .import_rollback import rollback_import
+from .models import (
+    AidProject, Country, Donor, FinancialTransaction, IATIOrganization, ImportJob, ImportLog, Organization,
+    PortfolioSummary, ProjectBudget
+)
+from .organization_index import OrganizationIndex
+from .portfolio_summary import rebuild_portfolio_summary
+from .views import run_iati_xml_import
+
+
+def activity_xml(count):
+    activities = ''.join(f"""
+    <iati-activity>
+        <iati-identifier>XM-{i}</iati-identifier>
+        <title><narrative>Activity {i}</narrative></title>
+        <budget type="1">
+            <period-start iso-date="2024-01-01"/>
+            <period-end iso-date="2024-12-31"/>
+            <value currency="USD">1000</value>
+        </budget>
+    </iati-activity>""" for i in range(count))
+    return io.BytesIO(f'<iati-activities>{activities}</iati-activities>'.encode('utf-8'))
+
+
+class IATIActivityImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('importer')
+
+    def test_failed_chunk_is_replayed_per_activity(self):
+        bulk_create = ProjectBudget.objects.bulk_create
+        calls = []
+
+        def fail_once(objs, *args, **kwargs):
+            calls.append(len(objs))
+            if len(calls) == 1:
+                raise DatabaseError('transient failure')
+            return bulk_create(objs, *args, **kwargs)
+
+        with mock.patch.object(ProjectBudget.objects, 'bulk_create', side_effect=fail_once):
+            results = IATIActivityImportEngine(self.user).run(activity_xml(3))
+
+        self.assertEqual(calls, [3, 1, 1, 1])
+        self.assertEqual(results['successful'], 3)
+        self.assertEqual(results['failed'], 0)
+        self.assertEqual(results['errors'], [])
+        self.assertEqual(AidProject.objects.filter(iati_identifier__startswith='XM-').count(), 3)
+        self.assertEqual(ProjectBudget.objects.count(), 3)
+
+    def test_truncated_file_leaves_a_failed_log_that_can_be_rolled_back(self):
+        body = activity_xml(1100).getvalue()
+        request = RequestFactory().post('/import/activities/')
+        request.user = self.user
+
+        with self.assertRaises(Exception):
+            run_iati_xml_import(request, SimpleUploadedFile('activities.xml', body[:len(body) * 19 // 20]), 'activities')
+
+        import_log = ImportLog.objects.get()
+        self.assertEqual(import_log.status, 'failed')
+        self.assertEqual(import_log.total_rows, 1000)
+        self.assertEqual(import_log.successful_rows, 1000)
+        self.assertEqual(AidProject.objects.filter(import_batch=import_log.batch_id).count(), 1000)
+
+        rollback_import(import_log)
+        self.assertFalse(AidProject.objects.exists())
+        self.assertFalse(ProjectBudget.objects.exists())
+
+    def test_completed_import_is_logged(self):
+        request = RequestFactory().post('/import/activities/')
+        request.user = self.user
+
+        results = run_iati_xml_import(request, SimpleUploadedFile('activities.xml', activity_xml(3).getvalue()),
+                                      'activities')
+
+        import_log = ImportLog.objects.get()
+        self.assertEqual(results['successful'], 3)
+        self.assertEqual((import_log.status, import_log.total_rows, import_log.successful_rows), ('completed', 3, 3))
+
+    def test_duplicate_activities_are_still_reported(self):
+        source = io.BytesIO(activity_xml(2).getvalue().replace(b'XM-1', b'XM-0'))
+        results = IATIActivityImportEngine(self.user).run(source)
+
+        self.assertEqual(results['successful'], 1)
+        self.assertEqual(results['failed'], 1)
+        self.assertIn("Duplicate activity 'XM-0'", results['errors'][0]['message'])
+
+
+class UpstreamTestCase(SimpleTestCase):
+    """Requests against a local FixtureServer holding one JSON response"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        store = FixtureStore(directory.name)
+        store.put(store.key(DATASTORE_PREFIX + '/organisations'),
+                  {'status': 200, 'content_type': 'application/json'}, b'{"count": 1}')
+        self.server = FixtureServer(directory.name).start()
+        self.addCleanup(self.server.stop)
+        self.url = self.server.datastore_url + '/organisations'
+
+
+class ResilientSessionTests(UpstreamTestCase):
+    def test_retries_with_backoff_until_upstream_recovers(self):
+        session = ResilientSession(max_retries=3, backoff_base=0.5)
+        self.server.failure_rate = 1
+        delays = []
+
+        def sleep(seconds):
+            delays.append(seconds)
+            if len(delays) == 2:
+                self.server.failure_rate = 0
+
+        with mock.patch('time.sleep', side_effect=sleep):
+            response = session.get(self.url, timeout=5)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.stats['requests'], 3)
+        self.assertEqual(len(delays), 2)
+        self.assertTrue(0 <= delays[0] <= 0.5)
+        self.assertTrue(0 <= delays[1] <= 1.0)
+        self.assertEqual(session.breaker(self.url).state, CircuitBreaker.CLOSED)
+
+    def test_gives_up_after_max_retries(self):
+        session = ResilientSession(max_retries=2)
+        self.server.failure_rate = 1
+        with mock.patch('time.sleep'):
+            response = session.get(self.url, timeout=5)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.server.stats['requests'], 3)
+
+    def test_circuit_opens_half_opens_and_closes(self):
+        session = ResilientSession(max_retries=0, failure_threshold=2, reset_timeout=0.1)
+        breaker = session.breaker(self.url)
+        self.server.failure_rate = 1
+        for _ in range(2):
+            self.assertEqual(session.get(self.url, timeout=5).status_code, 503)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        with self.assertRaises(CircuitOpenError):
+            session.get(self.url, timeout=5)
+        self.assertEqual(self.server.stats['requests'], 2)
+
+        # A failed trial request opens the circuit again
+        time.sleep(0.15)
+        self.assertEqual(session.get(self.url, timeout=5).status_code, 503)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        # Only one trial request is let through while half-open
+        time.sleep(0.15)
+        breaker.before_request()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request()
+        breaker.record_failure()
+
+        time.sleep(0.15)
+        self.server.failure_rate = 0
+        self.assertEqual(session.get(self.url, timeout=5).status_code, 200)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.status()['rejected_requests'], 2)
+
+
+class CachingSessionTests(UpstreamTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # Entries expire at once, so every request goes upstream
+        self.session = CachingSession(ResponseCache(directory.name), ttls=[], default_ttl=0, max_retries=0)
+
+    def test_serves_stale_entry_on_upstream_error(self):
+        self.assertEqual(self.session.get(self.url, timeout=5).json(), {'count': 1})
+        self.server.failure_rate = 1
+
+        response = self.session.get(self.url, timeout=5)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'count': 1})
+        self.assertTrue(response.from_cache)
+        self.assertEqual(self.session.stats['stale'], 1)
+
+    def test_serves_stale_entry_when_upstream_is_down(self):
+        self.session.get(self.url, timeout=5)
+        # Drop the kept-alive connection so the next request has to reconnect
+        self.session.close()
+        self.server.stop()
+
+        response = self.session.get(self.url, timeout=5)
+
+        self.assertEqual(response.json(), {'count': 1})
+        self.assertEqual(self.session.stats['stale'], 1)
+
+    def test_upstream_error_without_entry_is_raised(self):
+        self.server.stop()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.session.get(self.url, timeout=5)
+
+
+class KeysetPaginatorTests(TestCase):
+    def setUp(self):
+        for i in range(23):
+            AidProject.objects.create(
+                title=f'Project {i % 4}',
+                activity_status=['pipeline', 'implementation'][i % 2],
+                start_date_planned=None if i % 4 == 0 else datetime.date(2024, 1, 1 + i % 5),
+                funding_amount=None if i % 3 == 0 else Decimal(i % 6) * Decimal('10.50'),
+            )
+
+    def expected(self, sort_by):
+        """Ids in sort order: ties broken by id, NULLs last in both directions"""
+        field = sort_by.lstrip('-')
+        descending = sort_by.startswith('-')
+        projects = list(AidProject.objects.all())
+        values = [p for p in projects if getattr(p, field) is not None]
+        nulls = [p for p in projects if getattr(p, field) is None]
+        values.sort(key=lambda p: (getattr(p, field), p.pk), reverse=descending)
+        nulls.sort(key=lambda p: p.pk, reverse=descending)
+        return [p.pk for p in values + nulls]
+
+    def test_pages_forward_and_back_through_every_sort(self):
+        for sort_by in SORT_FIELDS + [f'-{field}' for field in SORT_FIELDS]:
+            with self.subTest(sort_by=sort_by):
+                paginator = KeysetPaginator(AidProject.objects.all(), sort_by, per_page=4)
+                page = paginator.page()
+                pages = [[p.pk for p in page]]
+                while page.has_next():
+                    page = paginator.page(page.next_cursor)
+                    pages.append([p.pk for p in page])
+                self.assertEqual(sum(pages, []), self.expected(sort_by))
+
+                previous = []
+                while page.has_previous():
+                    page = paginator.page(page.previous_cursor)
+                    previous.append([p.pk for p in page])
+                self.assertEqual(previous, pages[-2::-1])
+
+    def test_cursor_of_another_sort_returns_first_page(self):
+        page = KeysetPaginator(AidProject.objects.all(), 'title', per_page=4).page()
+        other = KeysetPaginator(AidProject.objects.all(), '-funding_amount', per_page=4)
+        self.assertEqual([p.pk for p in other.page(page.next_cursor)], self.expected('-funding_amount')[:4])
+
+
+TRANSACTION_COLUMNS = ['project_title', 'transaction_date', 'amount', 'transaction_type', 'currency',
+                       'provider_organization_name', 'receiver_organization_name']
+
+
+def transaction_row(provider='', receiver='', project='Water Project'):
+    return [project, '2024-03-01', '1000', 'disbursement', 'USD', provider, receiver]
+
+
+class ParseSortTests(SimpleTestCase):
+    def test_cursor_sorts_are_restricted_to_indexed_columns(self):
+        self.assertEqual(parse_sort('-funding_amount'), '-funding_amount')
+        self.assertEqual(parse_sort('donor__name'), DEFAULT_SORT)
+
+    def test_page_sorts_accept_any_field_of_the_queryset(self):
+        projects = AidProject.objects.all()
+
+        self.assertEqual(parse_sort('donor__name', projects), 'donor__name')
+        self.assertEqual(parse_sort('-funding_amount', projects), '-funding_amount')
+        self.assertEqual(parse_sort('no_such_field', projects), DEFAULT_SORT)
+        self.assertEqual(parse_sort('', projects), DEFAULT_SORT)
+
+
+class OrganizationIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = OrganizationIndex()
+        self.index.add(1, 'United Nations Development Programme')
+        self.index.add(2, 'Save the Children UK')
+        self.index.add(3, 'World Health Organization', 'WHO')
+        self.index.add(4, 'Sight Care', 'SC')
+        self.index.add(5, 'Swiss Cooperation', 'SC')
+
+    def test_exact_and_acronym_matches_resolve_in_both_directions(self):
+        self.assertEqual(self.index.match('united nations development programme')[:2], (1, 'exact'))
+        self.assertEqual(self.index.match('U.N.D.P.')[:2], (1, 'acronym'))
+        index = OrganizationIndex()
+        index.add(7, 'UNICEF')
+        index.add(8, 'DFAT', 'DFAT')
+        self.assertEqual(index.match('Department of Foreign Affairs and Trade')[:2], (8, 'acronym'))
+
+    def test_fuzzy_matches_are_only_suggested(self):
+        org_id, match_type, candidates = self.index.match('Save the Children')
+        self.assertIsNone(org_id)
+        self.assertEqual(match_type, 'fuzzy')
+        self.assertEqual(candidates[0]['id'], 2)
+
+    def test_shared_key_is_ambiguous(self):
+        org_id, match_type, candidates = self.index.match('SC')
+        self.assertIsNone(org_id)
+        self.assertEqual(match_type, 'ambiguous')
+        self.assertEqual({candidate['id'] for candidate in candidates}, {4, 5})
+
+
+class OrganizationResolutionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('importer')
+        AidProject.objects.create(title='Water Project')
+
+    def run_import(self, *rows):
+        mapping = {field: index for index, field in enumerate(TRANSACTION_COLUMNS)}
+        return TransactionImportEngine(self.user, mapping).run(list(rows))
+
+    def test_fuzzy_match_creates_organization_with_suggestion(self):
+        existing = Organization.objects.create(name='Save the Children UK', organization_type='ngo')
+
+        results = self.run_import(transaction_row(provider='Save the Children'))
+
+        self.assertEqual(results['successful'], 1)
+        transaction = FinancialTransaction.objects.get()
+        self.assertNotEqual(transaction.provider_organization_id, existing.pk)
+        self.assertEqual(transaction.provider_organization.name, 'Save the Children')
+        match = results['organizationMatches'][0]
+        self.assertEqual(match['status'], 'created')
+        self.assertEqual(match['candidates'][0]['id'], existing.pk)
+
+    def test_acronym_and_full_name_in_one_chunk_create_one_organization(self):
+        results = self.run_import(
+            transaction_row(provider='UNDP', receiver='Ministry of Health'),
+            transaction_row(provider='United Nations Development Programme', receiver='Ministry of Heath'),
+        )
+
+        self.assertEqual(results['successful'], 2)
+        undp = Organization.objects.get(name='United Nations Development Programme')
+        self.assertEqual(undp.short_name, 'UNDP')
+        self.assertFalse(Organization.objects.filter(name='UNDP').exists())
+        self.assertEqual(set(FinancialTransaction.objects.values_list('provider_organization_id', flat=True)),
+                         {undp.pk})
+        # Spelling variants are distinct names: nothing is merged on a fuzzy score
+        self.assertEqual(Organization.objects.filter(name__startswith='Ministry of').count(), 2)
+
+    def test_ambiguous_name_fails_the_row(self):
+        Organization.objects.create(name='Sight Care', short_name='SC', organization_type='ngo')
+        Organization.objects.create(name='Swiss Cooperation', short_name='SC', organization_type='bilateral')
+
+        results = self.run_import(transaction_row(provider='SC'), transaction_row(provider='Sight Care'))
+
+        self.assertEqual(results['successful'], 1)
+        self.assertEqual(results['failed'], 1)
+        self.assertEqual(results['errors'][0]['row'], 2)
+        self.assertIn("Organization 'SC' matches more than one organization", results['errors'][0]['message'])
+        self.assertEqual(results['organizationMatches'][0]['status'], 'ambiguous')
+        self.assertEqual(Organization.objects.count(), 2)
+
+
+ACTIVITY_COLUMNS = ('iati_identifier', 'title', 'donor_name', 'recipient_country_name', 'activity_status',
+                    'start_date_planned', 'end_date_planned', 'total_budget')
+
+
+def activity_row(identifier, donor='World Bank', country='Kenya', status='implementation'):
+    return [identifier, f'Activity {identifier}', donor, country, status, '2024-01-01', '2025-12-31', '1000']
+
+
+class ActivityImportTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('importer')
+
+    def run_import(self, *rows, **options):
+        mapping = {field: index for index, field in enumerate(ACTIVITY_COLUMNS)}
+        return ActivityImportEngine(self.user, mapping, **options).run(list(rows))
+
+
+class PortfolioSummaryTests(ActivityImportTestCase):
+    def summary(self):
+        return sorted(PortfolioSummary.objects.filter(item_count__gt=0).values_list(
+            'dimension', 'key', 'label', 'item_count', 'total_funding'))
+
+    def assertSummaryCurrent(self):
+        incremental = self.summary()
+        rebuild_portfolio_summary()
+        self.assertEqual(incremental, self.summary())
+
+    def test_bulk_import_and_rollback_move_the_summary_per_chunk(self):
+        donor = Donor.objects.create(name='World Bank', code='WB')
+        AidProject.objects.create(title='Existing', donor=donor, activity_status='pipeline',
+                                  recipient_country=Country.objects.create(name='Kenya', iso_code='KE'),
+                                  funding_amount=Decimal('500'))
+        self.assertSummaryCurrent()
+
+        results = self.run_import(
+            activity_row('XM-1'), activity_row('XM-2', donor='UNICEF', country='Uganda'),
+            activity_row('XM-3', status='completion'), chunk_size=2
+        )
+        self.assertEqual(results['successful'], 3)
+        self.assertSummaryCurrent()
+        self.assertEqual(PortfolioSummary.objects.get(dimension=PortfolioSummary.DONORS).item_count, 2)
+
+        self.run_import(activity_row('XM-1', status='completion', donor='UNICEF'), mode='upsert')
+        self.assertSummaryCurrent()
+
+        batch = AidProject.objects.get(iati_identifier='XM-2').import_batch
+        log = ImportLog.objects.create(user=self.user, entity_type='activities', file_name='a.csv',
+                                       total_rows=3, successful_rows=3, failed_rows=0, batch_id=batch)
+        rollback_import(log)
+        self.assertEqual(list(AidProject.objects.values_list('title', flat=True)), ['Existing'])
+        self.assertSummaryCurrent()
+
+
+class UpsertImportTests(ActivityImportTestCase):
+    def test_upsert_creates_updates_and_skips_unchanged_rows(self):
+        self.run_import(activity_row('XM-1'), activity_row('XM-2'))
+
+        results = self.run_import(activity_row('XM-1'), activity_row('XM-2', status='completion'),
+                                  activity_row('XM-3'), mode='upsert')
+
+        self.assertEqual((results['created'], results['updated'], results['unchanged']), (1, 1, 1))
+        self.assertEqual(AidProject.objects.count(), 3)
+        self.assertEqual(AidProject.objects.get(iati_identifier='XM-2').activity_status, 'completion')
+
+    def test_row_without_key_is_an_error_in_upsert_mode(self):
+        results = self.run_import(activity_row(''), activity_row('XM-1'), mode='upsert')
+
+        self.assertEqual((results['successful'], results['failed']), (1, 1))
+        self.assertEqual(results['errors'][0]['row'], 2)
+        self.assertEqual(results['errors'][0]['message'], "IATI identifier or PRISM ID is required in upsert mode")
+        self.assertEqual(AidProject.objects.count(), 1)
+
+    def test_resume_carries_upsert_counts_over(self):
+        self.run_import(activity_row('XM-1'))
+        mapping = {field: index for index, field in enumerate(ACTIVITY_COLUMNS)}
+        engine = ActivityImportEngine(self.user, mapping, mode='upsert')
+        engine.resume(2, 0, created=1, updated=0, unchanged=1)
+
+        results = engine.run([activity_row('XM-0'), activity_row('XM-9'), activity_row('XM-1', status='completion')],
+                             start_row=2)
+
+        self.assertEqual(results['successful'], 3)
+        self.assertEqual((results['created'], results['updated'], results['unchanged']), (1, 1, 1))
+
+
+class OrganizationUpsertTests(TestCase):
+    COLUMNS = ('name', 'iati_identifier', 'organization_type', 'description')
+
+    def setUp(self):
+        self.user = User.objects.create_user('importer')
+
+    def run_import(self, *rows):
+        mapping = {field: index for index, field in enumerate(self.COLUMNS)}
+        return OrganizationImportEngine(self.user, mapping, mode='upsert').run(list(rows))
+
+    def test_matches_on_iati_identifier_before_name(self):
+        renamed = Organization.objects.create(name='DFID', iati_identifier='GB-GOV-1', organization_type='bilateral')
+        unidentified = Organization.objects.create(name='Health Trust', organization_type='ngo')
+
+        results = self.run_import(['FCDO', 'GB-GOV-1', 'bilateral', ''],
+                                  ['Health Trust', 'XM-HT', 'ngo', 'Updated'],
+                                  ['Water Aid', 'XM-WA', 'ngo', ''])
+
+        self.assertEqual((results['created'], results['updated']), (1, 2))
+        renamed.refresh_from_db()
+        unidentified.refresh_from_db()
+        self.assertEqual(renamed.name, 'FCDO')
+        self.assertEqual((unidentified.iati_identifier, unidentified.description), ('XM-HT', 'Updated'))
+
+    def test_identifier_and_name_of_different_organizations_are_ambiguous(self):
+        Organization.objects.create(name='Health Trust', iati_identifier='XM-HT', organization_type='ngo')
+        Organization.objects.create(name='Water Aid', organization_type='ngo')
+
+        results = self.run_import(['Water Aid', 'XM-HT', 'ngo', 'Updated'])
+
+        self.assertEqual(results['failed'], 1)
+        self.assertEqual(results['errors'][0]['message'],
+                         "IATI identifier 'XM-HT' and name 'Water Aid' match more than one organization")
+        self.assertFalse(Organization.objects.filter(description='Updated').exists())
+
+
+class ActivityBulkImportTests(ActivityImportTestCase):
+    def test_lookups_are_resolved_once_and_row_errors_reported(self):
+        donor = Donor.objects.create(name='World Bank', code='WB')
+        invalid = activity_row('XM-9')
+        invalid[1] = ''
+
+        results = self.run_import(activity_row('XM-1'), activity_row('XM-2', donor='UNICEF'), invalid,
+                                  activity_row('XM-3', donor='UNICEF', country='Uganda'))
+
+        self.assertEqual((results['successful'], results['failed']), (3, 1))
+        self.assertEqual(results['errors'][0]['row'], 4)
+        self.assertEqual(results['errors'][0]['field'], 'title')
+        self.assertEqual(AidProject.objects.get(iati_identifier='XM-1').donor_id, donor.pk)
+        self.assertEqual(Donor.objects.count(), 2)
+        self.assertEqual(sorted(Country.objects.values_list('name', flat=True)), ['Kenya', 'Uganda'])
+
+    def test_query_count_does_not_grow_with_rows(self):
+        queries = []
+        for count, donor, country in ((5, 'World Bank', 'Kenya'), (50, 'UNICEF', 'Uganda')):
+            rows = [activity_row(f'{donor}-{i}', donor=donor, country=country) for i in range(count)]
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(self.run_import(*rows)['successful'], count)
+            queries.append(len(context))
+
+        self.assertLessEqual(queries[1], queries[0])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImportJobResumeTests(ActivityImportTestCase):
+    def test_every_chunk_is_checkpointed(self):
+        progress = []
+        mapping = {field: index for index, field in enumerate(ACTIVITY_COLUMNS)}
+        engine = ActivityImportEngine(self.user, mapping, chunk_size=2)
+
+        engine.run([activity_row(f'XM-{i}') for i in range(5)],
+                   on_chunk=lambda engine: progress.append(engine.total_rows))
+
+        self.assertEqual(progress, [2, 4, 5])
+
+    def test_resumed_job_skips_committed_rows(self):
+        rows = [activity_row(f'XM-{i}') for i in range(4)]
+        csv = '\n'.join(','.join(row) for row in [list(ACTIVITY_COLUMNS)] + rows)
+        job = ImportJob(entity_type='activities', file_name='activities.csv', user=self.user, status='running',
+                        rows_processed=2, field_mappings=[{'systemFieldId': field, 'fileColumnIndex': index}
+                                                          for index, field in enumerate(ACTIVITY_COLUMNS)])
+        job.file.save('activities.csv', ContentFile(csv.encode('utf-8')), save=False)
+        job.save()
+        self.run_import(*rows[:2], batch_id=job.batch_id)
+
+        run_import_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual((job.import_log.total_rows, job.import_log.successful_rows), (4, 4))
+        self.assertEqual(AidProject.objects.filter(import_batch=job.batch_id).count(), 4)
+
+
+class ImportRollbackTests(ActivityImportTestCase):
+    def import_log(self, entity_type, batch_id):
+        return ImportLog.objects.create(user=self.user, entity_type=entity_type, file_name='import.csv',
+                                        total_rows=0, successful_rows=0, failed_rows=0, batch_id=batch_id)
+
+    def test_rollback_keeps_records_referenced_outside_the_batch(self):
+        self.run_import(activity_row('XM-1'), activity_row('XM-2'), activity_row('XM-3'))
+        first, second, third = AidProject.objects.order_by('iati_identifier')
+        ProjectBudget.objects.create(project=first, category='Staff', description='Added by hand',
+                                     planned_amount=Decimal('100'))
+        mapping = {field: index for index, field in enumerate(TRANSACTION_COLUMNS)}
+        TransactionImportEngine(self.user, mapping).run([transaction_row('Donor', 'Ministry', project='Activity XM-2')])
+
+        deleted, kept = rollback_import(self.import_log('activities', first.import_batch))
+
+        self.assertEqual(deleted['activities'], 1)
+        self.assertEqual(kept['activities'], [first.pk, second.pk])
+        self.assertFalse(AidProject.objects.filter(pk=third.pk).exists())
+        self.assertEqual(FinancialTransaction.objects.count(), 1)
+
+        transactions = self.import_log('transactions', FinancialTransaction.objects.get().import_batch)
+        deleted, kept = rollback_import(transactions, chunk_size=1)
+        self.assertEqual((deleted['transactions'], deleted['organizations']), (1, 2))
+        self.assertIsNotNone(transactions.rolled_back_at)
+        with self.assertRaises(ValueError):
+            rollback_import(transactions)
+
+
+class AnalyticsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        AidProject.objects.create(title='Existing', activity_status='pipeline')
+
+    def test_series_are_cached_until_projects_change(self):
+        first = analytics_series(['projects_by_status'])
+        with self.assertNumQueries(0):
+            self.assertEqual(analytics_series(['projects_by_status']), first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AidProject.objects.create(title='New', activity_status='pipeline')
+
+        self.assertEqual(analytics_series(['projects_by_status'])['projects_by_status'],
+                         [{'activity_status': 'pipeline', 'count': 2}])
+        self.assertEqual(first['projects_by_status'], [{'activity_status': 'pipeline', 'count': 1}])
+
+
+class DatasetSearchTests(SimpleTestCase):
+    def search(self, results):
+        def search_registry(query, deadline):
+            if query not in results:
+                time.sleep(2)
+                return [{'id': f'slow-{query}'}]
+            return results[query]
+
+        service = IATIRegistryService(session=requests.Session())
+        with mock.patch.object(service, '_search_registry', side_effect=search_registry):
+            started = time.monotonic()
+            datasets = service.search_organization_datasets('XM-1')
+        return datasets, time.monotonic() - started
+
+    def test_exact_match_is_used_without_waiting_for_broader_searches(self):
+        datasets, elapsed = self.search({'XM-1': [{'id': 'exact'}]})
+
+        self.assertEqual(datasets, [{'id': 'exact'}])
+        self.assertLess(elapsed, 1)
+
+    def test_broader_searches_are_merged_when_exact_match_is_empty(self):
+        datasets, _ = self.search({'XM-1': [], '*XM-1*': [{'id': 'a'}, {'id': 'b'}],
+                                   'organisation_identifier:XM-1': [{'id': 'b'}]})
+
+        self.assertEqual(datasets, [{'id': 'a'}, {'id': 'b'}])
+
+
+def download_response(status, body, **headers):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers)
+    response.raw = io.BytesIO(body)
+    return response
+
+
+class ResourceDownloadTests(SimpleTestCase):
+    URL = 'https://publisher.example/activities.xml'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = ResourceStore(directory.name)
+        self.session = mock.Mock()
+        self.downloader = ResourceDownloader(self.store, session=self.session)
+
+    def test_resumes_from_the_partial_file_without_content_encoding(self):
+        self.store.start_partial(self.URL, {'etag': '"v1"'})
+        with open(self.store.partial_path(self.URL), 'wb') as f:
+            f.write(b'<iati')
+        self.session.get.return_value = download_response(206, b'-activities/>', **{
+            'Content-Range': 'bytes 5-17/18', 'Content-Length': '13'
+        })
+
+        result = self.downloader.download(self.URL)
+
+        headers = self.session.get.call_args.kwargs['headers']
+        self.assertEqual((headers['Accept-Encoding'], headers['Range']), ('identity', 'bytes=5-'))
+        self.assertEqual(result['status'], 'resumed')
+        with open(self.store.path_for(self.URL), 'rb') as f:
+            self.assertEqual(f.read(), b'<iati-activities/>')
+
+    def test_short_body_is_kept_as_partial_instead_of_committed(self):
+        self.session.get.return_value = download_response(200, b'<iati-act', **{
+            'Content-Length': '18', 'ETag': '"v1"'
+        })
+
+        result = self.downloader.download(self.URL)
+
+        self.assertEqual(result['status'], 'failed')
+        self.assertEqual(result['error'], "Incomplete download: 9 of 18 bytes")
+        self.assertIsNone(self.store.ref(self.URL))
+        self.assertEqual(os.path.getsize(self.store.partial_path(self.URL)), 9)
+
+
+class MirrorExpiryTests(TestCase):
+    def setUp(self):
+        remember_organization({'iati_identifier': 'XM-1', 'name': 'Mirrored Name'})
+        self.service = IATIRegistryService(session=requests.Session())
+
+    def expire(self):
+        IATIOrganization.objects.update(fetched_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+
+    def lookup(self, found):
+        with mock.patch.object(self.service, '_lookup_organization', return_value=found) as lookup:
+            return self.service.get_organization_info('XM-1'), lookup.called
+
+    def test_fresh_record_is_answered_locally(self):
+        org_info, looked_up = self.lookup({'iati_identifier': 'XM-1', 'name': 'Network Name'})
+
+        self.assertFalse(looked_up)
+        self.assertEqual(org_info['name'], 'Mirrored Name')
+
+    def test_expired_record_is_refreshed(self):
+        self.expire()
+
+        org_info, looked_up = self.lookup({'iati_identifier': 'XM-1', 'name': 'Network Name'})
+
+        self.assertTrue(looked_up)
+        self.assertEqual(org_info['name'], 'Network Name')
+        mirrored = IATIOrganization.objects.get()
+        self.assertEqual(mirrored.name, 'Network Name')
+        self.assertGreater(mirrored.fetched_at.year, 2020)
+
+    def test_expired_record_is_used_when_refresh_fails(self):
+        self.expire()
+
+        org_info, looked_up = self.lookup(None)
+
+        self.assertTrue(looked_up)
+        self.assertEqual(org_info['name'], 'Mirrored Name')
+
+    def test_batch_resolution_refreshes_expired_records(self):
+        self.expire()
+        with mock.patch.object(self.service, '_lookup_organization',
+                               return_value={'iati_identifier': 'XM-1', 'name': 'Network Name'}):
+            results = self.service.resolve_organizations(['XM-1'])
+
+        self.assertEqual(results['XM-1']['status'], 'registry')
+        self.assertEqual(IATIOrganization.objects.get().name, 'Network Name')
@@ -23,6 +23,9 @@ urlpatterns = [
     path('api/stats/', views.api_project_stats, name='api_project_stats'),
     path('api/funding-by-country/', views.api_funding_by_country, name='api_funding_by_country'),
     path('api/countries/', views.api_countries, name='api_countries'),
+    path('api/iati/status/', views.api_iati_status, name='api_iati_status'),
+    path('api/organizations/resolve/', views.api_resolve_organizations, name='api_resolve_organizations'),
+    path('api/organizations/autocomplete/', views.api_organization_autocomplete, name='api_organization_autocomplete'),
     path('api/transactions/add/', views.api_add_transaction, name='api_add_transaction'),
     path('api/commitments/add/', views.api_add_commitment, name='api_add_commitment'),
     path('api/transactions/<int:transaction_id>/delete/', views.api_delete_transaction, name='api_delete_transaction'),
@@ -57,5 +60,8 @@ urlpatterns = [
     path('api/import/activities/', import_views.import_activities, name='import_activities'),
     path('api/import/organizations/', import_views.import_organizations, name='import_organizations'),
     path('api/import/transactions/', import_views.import_transactions, name='import_transactions'),
+    path('api/import/jobs/<int:job_id>/', import_views.import_job_status, name='import_job_status'),
     path('api/import-logs/', import_views.import_logs, name='import_logs'),
+    path('api/import-logs/<int:log_id>/errors/', import_views.import_error_report, name='import_error_report'),
+    path('api/import-logs/<int:log_id>/rollback/', import_views.rollback_import_log, name='rollback_import_log'),
 ]
\ No newline at end of file
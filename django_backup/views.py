@@ -3,11 +3,10 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum, Count, Avg
+from django.db.models import Q, Sum
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.http import require_http_methods
-from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
 import csv
 import random
@@ -26,49 +25,30 @@ from .models import (
     AidProject, Donor, Country, Sector, ImplementingOrganization,
     ProjectBudget, ProjectMilestone, ProjectDocument,
     UserProfile, Organization, Role, UserRole, AdminUnit, ProjectLocation,
-    FinancialTransaction, FinancialCommitment
+    FinancialTransaction, FinancialCommitment, ImportLog
 )
+from .iati_activity_import import IATIActivityImportEngine, IATITransactionImportEngine
 from .iati_service import IATIRegistryService
+from .http_cache import get_iati_session
+from .iati_mirror import AUTOCOMPLETE_LIMIT, autocomplete
+from .import_reports import ErrorReportWriter, attach_error_report
+from .portfolio_summary import portfolio_summary
+from .analytics import analytics_series, parse_filters
+from .dashboard_queries import (
+    PAGE_SIZE, SORT_FIELDS, CountedPaginator, KeysetPaginator, parse_sort, project_statistics
+)
+
+logger = logging.getLogger(__name__)
 
 @login_required
 def home(request):
     """Enhanced home page with key statistics"""
-    # Key statistics
-    total_projects = AidProject.objects.count()
-    total_funding = AidProject.objects.aggregate(Sum('funding_amount'))['funding_amount__sum'] or 0
-    active_projects = AidProject.objects.filter(activity_status='implementation').count()
-    total_donors = Donor.objects.count()
-    total_countries = Country.objects.filter(projects__isnull=False).distinct().count()
+    # Key statistics, projects by status, top donors and projects by country
+    # come precomputed from PortfolioSummary in one query
+    context = portfolio_summary()
     
     # Recent projects
-    recent_projects = AidProject.objects.select_related('donor', 'recipient_country').order_by('-submitted_at')[:5]
-    
-    # Projects by status
-    status_data = AidProject.objects.values('activity_status').annotate(count=Count('id'))
-    
-    # Top donors by funding
-    top_donors = (AidProject.objects
-                  .values('donor__name')
-                  .annotate(total_funding=Sum('funding_amount'))
-                  .order_by('-total_funding')[:5])
-    
-    # Projects by country
-    country_data = (AidProject.objects
-                    .values('recipient_country__name')
-                    .annotate(count=Count('id'), total_funding=Sum('funding_amount'))
-                    .order_by('-total_funding')[:10])
-    
-    context = {
-        'total_projects': total_projects,
-        'total_funding': total_funding,
-        'active_projects': active_projects,
-        'total_donors': total_donors,
-        'total_countries': total_countries,
-        'recent_projects': recent_projects,
-        'status_data': list(status_data),
-        'top_donors': list(top_donors),
-        'country_data': list(country_data),
-    }
+    context['recent_projects'] = AidProject.objects.select_related('donor', 'recipient_country').order_by('-submitted_at')[:5]
     
     return render(request, 'home.html', context)
 
@@ -195,24 +175,26 @@ def project_dashboard(request):
     if sector_filter:
         projects = projects.filter(sector_id=sector_filter)
     
-    # Sorting
-    sort_by = request.GET.get('sort', '-submitted_at')
-    projects = projects.order_by(sort_by)
+    # Statistics for current filtered results, in one query
+    stats = project_statistics(projects)
     
-    # Pagination
-    paginator = Paginator(projects, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination: page numbers by default, ?pagination=cursor to seek by keyset
+    pagination = 'cursor' if request.GET.get('pagination') == 'cursor' else 'page'
+    if pagination == 'cursor':
+        # Seeking needs an index on (column, id), so only the indexed sort columns
+        sort_by = parse_sort(request.GET.get('sort'))
+        page_obj = KeysetPaginator(projects, sort_by, PAGE_SIZE).page(request.GET.get('cursor'))
+    else:
+        sort_by = parse_sort(request.GET.get('sort'), projects)
+        projects = projects.order_by(sort_by, '-pk' if sort_by.startswith('-') else 'pk')
+        paginator = CountedPaginator(projects, PAGE_SIZE, count=stats['count'])
+        page_obj = paginator.get_page(request.GET.get('page'))
     
     # Get filter options
     donors = Donor.objects.all().order_by('name')
     countries = Country.objects.all().order_by('name')
     sectors = Sector.objects.all().order_by('name')
     
-    # Statistics for current filtered results
-    total_funding = projects.aggregate(Sum('funding_amount'))['funding_amount__sum'] or 0
-    avg_funding = projects.aggregate(Avg('funding_amount'))['funding_amount__avg'] or 0
-    
     context = {
         'page_obj': page_obj,
         'search_query': search_query,
@@ -221,12 +203,14 @@ def project_dashboard(request):
         'country_filter': country_filter,
         'sector_filter': sector_filter,
         'sort_by': sort_by,
+        'sort_fields': SORT_FIELDS,
+        'pagination': pagination,
         'donors': donors,
         'countries': countries,
         'sectors': sectors,
-        'total_funding': total_funding,
-        'avg_funding': avg_funding,
-        'total_projects': projects.count(),
+        'total_funding': stats['total_funding'],
+        'avg_funding': stats['avg_funding'],
+        'total_projects': stats['count'],
         'status_choices': AidProject._meta.get_field('activity_status').choices,
     }
     
@@ -350,60 +334,10 @@ def edit_project(request, project_id):
 
 @login_required
 def analytics_dashboard(request):
-    """Analytics and reporting dashboard"""
-    # Time-based analysis
-    current_year = timezone.now().year
-    projects_by_year = (AidProject.objects
-                       .extra(select={'year': "strftime('%%Y', start_date_planned)"})
-                       .values('year')
-                       .annotate(count=Count('id'), total_funding=Sum('funding_amount'))
-                       .order_by('year'))
-    
-    # Funding by sector
-    funding_by_sector = (AidProject.objects
-                        .values('sector__name')
-                        .annotate(total_funding=Sum('funding_amount'))
-                        .order_by('-total_funding'))
-    
-    # Projects by status
-    projects_by_status = (AidProject.objects
-                         .values('activity_status')
-                         .annotate(count=Count('id'))
-                         .order_by('activity_status'))
-    
-    # Geographic distribution
-    geographic_data = (AidProject.objects
-                      .values('recipient_country__name', 'recipient_country__region')
-                      .annotate(count=Count('id'), total_funding=Sum('funding_amount'))
-                      .order_by('-total_funding'))
-    
-    # Donor analysis
-    donor_analysis = (AidProject.objects
-                     .values('donor__name', 'donor__donor_type')
-                     .annotate(
-                         project_count=Count('id'),
-                         total_funding=Sum('funding_amount'),
-                         avg_funding=Avg('funding_amount')
-                     )
-                     .order_by('-total_funding'))
-    
-    # Monthly trends (last 12 months)
-    twelve_months_ago = timezone.now() - timedelta(days=365)
-    monthly_trends = (AidProject.objects
-                     .filter(submitted_at__gte=twelve_months_ago)
-                     .extra(select={'month': "strftime('%%Y-%%m', submitted_at)"})
-                     .values('month')
-                     .annotate(count=Count('id'), total_funding=Sum('funding_amount'))
-                     .order_by('month'))
-    
-    context = {
-        'projects_by_year': list(projects_by_year),
-        'funding_by_sector': list(funding_by_sector),
-        'projects_by_status': list(projects_by_status),
-        'geographic_data': list(geographic_data),
-        'donor_analysis': list(donor_analysis),
-        'monthly_trends': list(monthly_trends),
-    }
+    """Analytics and reporting dashboard, served from the analytics cache"""
+    filters = parse_filters(request.GET)
+    context = analytics_series(filters=filters)
+    context['filters'] = filters
     
     return render(request, 'projects/analytics.html', context)
 
@@ -468,6 +402,55 @@ def api_countries(request):
     countries = list(Country.objects.values('id', 'name').order_by('name'))
     return JsonResponse(countries, safe=False)
 
+@login_required
+def api_iati_status(request):
+    """API endpoint reporting the circuit breaker state of each IATI host"""
+    return JsonResponse({'circuit_breakers': get_iati_session().breaker_states()})
+
+@login_required
+@require_http_methods(["POST"])
+def api_resolve_organizations(request):
+    """API endpoint resolving a batch of IATI organization identifiers"""
+    try:
+        identifiers = json.loads(request.body).get('identifiers')
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    if not isinstance(identifiers, list) or not all(isinstance(identifier, str) for identifier in identifiers):
+        return JsonResponse({'error': 'identifiers must be a list of strings'}, status=400)
+    
+    try:
+        results = IATIRegistryService().resolve_organizations(identifiers)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'results': results})
+
+@login_required
+def api_organization_autocomplete(request):
+    """API endpoint for organization suggestions from the local IATI organization mirror"""
+    query = request.GET.get('q', '').strip()
+    if len(query) < 2:
+        return JsonResponse([], safe=False)
+    
+    try:
+        limit = min(int(request.GET.get('limit', AUTOCOMPLETE_LIMIT)), 50)
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
+    
+    matches = autocomplete(query, limit)
+    # Link suggestions to organizations already in the directory
+    existing = dict(Organization.objects.filter(
+        iati_identifier__in=[match.iati_identifier for match in matches]
+    ).values_list('iati_identifier', 'id'))
+    
+    suggestions = [{
+        'iati_identifier': match.iati_identifier,
+        'name': match.name,
+        'organization_type': match.organization_type,
+        'country': match.country,
+        'organization_id': existing.get(match.iati_identifier),
+    } for match in matches]
+    return JsonResponse(suggestions, safe=False)
+
 @login_required
 @require_http_methods(["POST"])
 def api_add_transaction(request):
@@ -1096,6 +1079,49 @@ def import_organizations(request):
     
     return render(request, 'imports/import_form.html', context)
 
+def run_iati_xml_import(request, uploaded_file, entity_type):
+    """
+    Stream an uploaded IATI activity file through its import engine and log the import.
+
+    Every chunk of activities commits on its own, so the ImportLog is created
+    before the run and its counts are updated with each chunk. A file that
+    fails part way (e.g. truncated XML) leaves a 'failed' log whose batch can
+    be rolled back, and the error is raised again.
+    """
+    engine_class = IATIActivityImportEngine if entity_type == 'activities' else IATITransactionImportEngine
+    engine = engine_class(request.user, collect_ids=False, error_report=ErrorReportWriter())
+    import_log = ImportLog.objects.create(
+        entity_type=entity_type,
+        file_name=uploaded_file.name,
+        total_rows=0,
+        successful_rows=0,
+        failed_rows=0,
+        user=request.user,
+        status='running',
+        batch_id=engine.batch_id
+    )
+    
+    def record_progress(engine):
+        # Runs inside the chunk's transaction, so the counts match the committed rows
+        import_log.total_rows = engine.total_rows
+        import_log.successful_rows = engine.results['successful']
+        import_log.failed_rows = engine.results['failed']
+        import_log.save(update_fields=['total_rows', 'successful_rows', 'failed_rows'])
+    
+    import_log.status = 'failed'
+    try:
+        results = engine.run(uploaded_file, on_chunk=record_progress)
+        import_log.status = 'completed'
+    finally:
+        import_log.refresh_from_db(fields=['total_rows', 'successful_rows', 'failed_rows'])
+        import_log.error_log = engine.error_report.preview(100)  # Store first 100 errors
+        import_log.save(update_fields=['status', 'error_log'])
+        attach_error_report(import_log, engine.error_report)
+    
+    logger.info(f"IATI {entity_type} import of {uploaded_file.name}: {results['successful']} imported, "
+                f"{results['failed']} failed")
+    return results
+
 @login_required
 def import_activities(request):
     """Import activity data from IATI XML files"""
@@ -1113,9 +1139,10 @@ def import_activities(request):
             return redirect('import_activities')
         
         try:
-            # Process the IATI activity file
-            # This is a placeholder for actual IATI processing logic
-            messages.success(request, f'Successfully processed {uploaded_file.name}. Activity data import initiated.')
+            results = run_iati_xml_import(request, uploaded_file, 'activities')
+            messages.success(request, f"Imported {results['successful']} activities from {uploaded_file.name}.")
+            if results['failed']:
+                messages.warning(request, f"{results['failed']} problems were found; see the import log for details.")
             return redirect('import_activities')
         except Exception as e:
             messages.error(request, f'Error processing file: {str(e)}')
@@ -1148,9 +1175,10 @@ def import_transactions(request):
             return redirect('import_transactions')
         
         try:
-            # Process the IATI transaction file
-            # This is a placeholder for actual IATI processing logic
-            messages.success(request, f'Successfully processed {uploaded_file.name}. Transaction data import initiated.')
+            results = run_iati_xml_import(request, uploaded_file, 'transactions')
+            messages.success(request, f"Imported {results['successful']} transactions from {uploaded_file.name}.")
+            if results['failed']:
+                messages.warning(request, f"{results['failed']} problems were found; see the import log for details.")
             return redirect('import_transactions')
         except Exception as e:
             messages.error(request, f'Error processing file: {str(e)}')